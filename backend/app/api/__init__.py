@@ -2,6 +2,7 @@
 from fastapi import APIRouter
 from .collections import router as collections_router
 from .chat import router as chat_router
+from .jobs import router as jobs_router
 
 # Create main API router
 api_router = APIRouter()
@@ -9,3 +10,4 @@ api_router = APIRouter()
 # Include all sub-routers
 api_router.include_router(collections_router)
 api_router.include_router(chat_router)
+api_router.include_router(jobs_router)
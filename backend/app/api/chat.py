@@ -1,7 +1,11 @@
 from fastapi import APIRouter, HTTPException
+from fastapi.concurrency import run_in_threadpool
 from pydantic import BaseModel
-from typing import Optional
-from app.services.rag_service import rag_service
+from typing import List, Optional
+from app.services.lazy import rag_service
+from app.api.streaming import ndjson_response
+from app.core.config import settings
+from app.core.metrics import span
 from app.models.database import SessionLocal, DocumentCollection
 from sqlalchemy.orm import Session
 from fastapi import Depends
@@ -16,42 +20,106 @@ def get_db():
         db.close()
 
 class ChatRequest(BaseModel):
-    collection_id: int
+    # Uma coleção (collection_id) ou várias (collection_ids) numa única consulta
+    collection_id: Optional[int] = None
+    collection_ids: Optional[List[int]] = None
     message: str
     top_k: Optional[int] = 3
 
 class ChatResponse(BaseModel):
     response: str
     collection_name: str
+    collection_names: List[str] = []
     sources_count: int
 
+def get_request_collections(request: ChatRequest, db: Session) -> List[DocumentCollection]:
+    """Coleções da requisição, na ordem pedida e sem repetições
+
+    Consulta o banco (bloqueante): as rotas async a chamam via run_in_threadpool.
+    """
+    ids = list(dict.fromkeys(
+        ([request.collection_id] if request.collection_id is not None else [])
+        + (request.collection_ids or [])
+    ))
+    if not ids:
+        raise HTTPException(status_code=400, detail="Informe collection_id ou collection_ids")
+    
+    collections = db.query(DocumentCollection).filter(
+        DocumentCollection.id.in_(ids)
+    ).all()
+    by_id = {collection.id: collection for collection in collections}
+    
+    missing = [collection_id for collection_id in ids if collection_id not in by_id]
+    if missing:
+        detail = "Coleção não encontrada" if len(ids) == 1 else f"Coleções não encontradas: {missing}"
+        raise HTTPException(status_code=404, detail=detail)
+    
+    return [by_id[collection_id] for collection_id in ids]
+
 @router.post("/", response_model=ChatResponse)
-def chat_with_collection(
+async def chat_with_collection(
     request: ChatRequest,
     db: Session = Depends(get_db)
 ):
-    """Conversar com uma coleção de documentos"""
-    # Verificar se a coleção existe
-    collection = db.query(DocumentCollection).filter(
-        DocumentCollection.id == request.collection_id
-    ).first()
-    
-    if not collection:
-        raise HTTPException(status_code=404, detail="Coleção não encontrada")
+    """Conversar com uma ou mais coleções de documentos
+
+    Com várias coleções, os trechos são buscados em paralelo em todas e a
+    resposta é gerada uma única vez sobre o top-k global.
+    """
+    with span("db"):
+        collections = await run_in_threadpool(get_request_collections, request, db)
+    collection_names = [collection.name for collection in collections]
     
     # Realizar consulta RAG
-    response = rag_service.query_collection(
-        collection_name=collection.name,
+    response = await rag_service.aquery_collections(
+        collection_names=collection_names,
         query=request.message,
         top_k=request.top_k
     )
     
     return ChatResponse(
         response=response,
-        collection_name=collection.name,
+        collection_name=", ".join(collection_names),
+        collection_names=collection_names,
         sources_count=request.top_k
     )
 
+@router.post("/stream")
+async def stream_chat_with_collection(
+    request: ChatRequest,
+    db: Session = Depends(get_db)
+):
+    """Conversar com uma ou mais coleções recebendo a resposta em streaming (NDJSON)
+
+    Eventos: "start", "sources" (nós recuperados), vários "token" e, por
+    fim, "done" ou "error".
+    """
+    with span("db"):
+        collections = await run_in_threadpool(get_request_collections, request, db)
+    collection_names = [collection.name for collection in collections]
+    
+    # Reservar a vaga antes de responder, para poder devolver 429 se a fila estiver cheia
+    stream = await rag_service.astream_query_collections(
+        collection_names=collection_names,
+        query=request.message,
+        top_k=request.top_k
+    )
+    
+    async def events():
+        try:
+            yield {
+                "type": "start",
+                "collection_name": ", ".join(collection_names),
+                "collection_names": collection_names
+            }
+            async for event in stream:
+                yield event
+        finally:
+            # Cliente desconectado no meio: devolver a vaga já
+            await stream.aclose()
+    
+    return ndjson_response(events())
+
 @router.get("/health")
 def health_check():
     """Verificar se o serviço de chat está funcionando"""
@@ -70,12 +138,38 @@ def get_collection_status(
     if not collection:
         raise HTTPException(status_code=404, detail="Coleção não encontrada")
     
-    # Verificar se o índice existe
-    index = rag_service.load_collection_index(collection.name)
+    # Verificar se o índice existe (pelo disco, sem carregá-lo no cache)
+    is_indexed = rag_service.is_collection_indexed(collection.name)
     
     return {
         "collection_name": collection.name,
-        "is_indexed": index is not None,
+        "is_indexed": is_indexed,
         "document_count": collection.document_count,
-        "ready_for_chat": index is not None
+        "ready_for_chat": is_indexed
     }
+
+@router.get("/cache/stats")
+def get_cache_stats():
+    """Estatísticas do cache de índices carregados"""
+    return rag_service.indexes.stats()
+
+@router.get("/cache/embeddings/stats")
+def get_embedding_cache_stats():
+    """Estatísticas do cache persistente de embeddings"""
+    if not settings.embedding_cache_enabled:
+        return {"enabled": False}
+    from app.services.embedding_cache import get_embedding_cache
+    cache = get_embedding_cache(settings.embedding_cache_path, settings.embedding_cache_max_bytes)
+    return {"enabled": True, **cache.stats()}
+
+@router.get("/cache/responses/stats")
+def get_response_cache_stats():
+    """Estatísticas do cache de respostas (taxa de acerto e tempo poupado)"""
+    if rag_service.responses is None:
+        return {"enabled": False}
+    return {"enabled": True, **rag_service.responses.stats()}
+
+@router.get("/queue/stats")
+def get_queue_stats():
+    """Estatísticas da fila de geração (concorrência com o Ollama)"""
+    return rag_service.limiter.stats()
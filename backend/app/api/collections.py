@@ -1,10 +1,15 @@
 from fastapi import APIRouter, Depends, HTTPException, UploadFile, File
 from fastapi.responses import JSONResponse
+from fastapi.concurrency import run_in_threadpool
 from sqlalchemy.orm import Session
-from typing import List
-import os, shutil, uuid
+from typing import List, Literal
+import os, shutil, time, uuid
 from app.models.database import SessionLocal, DocumentCollection, Document
-from app.services.rag_service import rag_service
+from app.services.lazy import rag_service
+from app.services.indexing_jobs import job_manager, job_to_dict
+from app.services.uploads import UploadTooLarge, stage_upload
+from app.services.index_manifest import file_sha256
+from app.api.streaming import ndjson_response
 from app.core.config import settings
 
 router = APIRouter(prefix="/collections", tags=["Collections"])
@@ -60,6 +65,9 @@ def delete_collection(collection_id: int, db: Session = Depends(get_db)):
     if not collection:
         raise HTTPException(status_code=404, detail="Coleção não encontrada")
     
+    if job_manager.active_job(db, collection_id):
+        raise HTTPException(status_code=409, detail="Cancele a indexação em andamento antes de deletar a coleção")
+    
     # Deletar documentos do banco
     db.query(Document).filter(Document.collection_id == collection_id).delete()
     
@@ -77,13 +85,37 @@ def delete_collection(collection_id: int, db: Session = Depends(get_db)):
     
     return {"message": "Coleção deletada com sucesso"}
 
+def backfill_content_hashes(db: Session, collection_id: int):
+    """Calcular o hash de documentos enviados antes da deduplicação existir"""
+    documents = db.query(Document).filter(
+        Document.collection_id == collection_id,
+        Document.content_hash.is_(None)
+    ).all()
+    
+    for document in documents:
+        if os.path.exists(document.file_path):
+            document.content_hash = file_sha256(document.file_path)
+    
+    if documents:
+        db.commit()
+
 @router.post("/{collection_id}/documents")
 async def upload_documents(
     collection_id: int,
     files: List[UploadFile] = File(...),
+    on_duplicate: str = "skip",
     db: Session = Depends(get_db)
 ):
-    """Upload de documentos"""
+    """Upload de documentos
+
+    Arquivos com conteúdo idêntico a um documento da coleção (mesmo SHA-256)
+    não são gravados de novo. Com ``on_duplicate=skip`` (padrão) são apenas
+    reportados; com ``on_duplicate=link`` ganham um registro próprio que
+    aponta para o arquivo já existente, sem nova indexação.
+    """
+    if on_duplicate not in ("skip", "link"):
+        raise HTTPException(status_code=400, detail="on_duplicate deve ser 'skip' ou 'link'")
+    
     collection = db.query(DocumentCollection).filter(
         DocumentCollection.id == collection_id
     ).first()
@@ -92,46 +124,115 @@ async def upload_documents(
         raise HTTPException(status_code=404, detail="Coleção não encontrada")
     
     collection_path = os.path.join(settings.DOCUMENTS_PATH, collection.name)
+    os.makedirs(collection_path, exist_ok=True)
+    await run_in_threadpool(backfill_content_hashes, db, collection_id)
+    
     uploaded_files = []
+    duplicates = []
+    stored_files = []
+    # Hash -> documento, incluindo os arquivos deste mesmo lote
+    seen = {}
+    staged = None
     
-    for file in files:
-        # Gerar nome único
-        file_extension = os.path.splitext(file.filename)[1]
-        unique_filename = f"{uuid.uuid4()}{file_extension}"
-        file_path = os.path.join(collection_path, unique_filename)
+    try:
+        for file in files:
+            # Salvar em arquivo temporário, calculando hash e tamanho na mesma passada
+            try:
+                staged = await stage_upload(
+                    file,
+                    collection_path,
+                    max_size=settings.max_upload_size,
+                    chunk_size=settings.upload_chunk_size
+                )
+            except UploadTooLarge as e:
+                raise HTTPException(
+                    status_code=413,
+                    detail=f"Arquivo {file.filename} excede o tamanho máximo de {e.max_size} bytes"
+                )
+            
+            existing = seen.get(staged.sha256) or db.query(Document).filter(
+                Document.collection_id == collection_id,
+                Document.content_hash == staged.sha256
+            ).first()
+            
+            if existing:
+                await staged.discard()
+                duplicates.append({
+                    "file": file.filename,
+                    "duplicate_of": existing.original_name,
+                    "document_id": existing.id,
+                    "action": on_duplicate
+                })
+                if on_duplicate == "skip":
+                    continue
+            
+                # Novo registro apontando para o arquivo já armazenado
+                document = Document(
+                    collection_id=collection_id,
+                    filename=existing.filename,
+                    original_name=file.filename,
+                    file_path=existing.file_path,
+                    file_size=existing.file_size,
+                    content_type=file.content_type,
+                    content_hash=existing.content_hash,
+                    is_indexed=existing.is_indexed
+                )
+            else:
+                # Gerar nome único
+                file_extension = os.path.splitext(file.filename)[1]
+                unique_filename = f"{uuid.uuid4()}{file_extension}"
+                file_path = await staged.commit(os.path.join(collection_path, unique_filename))
+                stored_files.append(file_path)
+            
+                document = Document(
+                    collection_id=collection_id,
+                    filename=unique_filename,
+                    original_name=file.filename,
+                    file_path=file_path,
+                    file_size=staged.size,
+                    content_type=file.content_type,
+                    content_hash=staged.sha256
+                )
+            
+            # Salvar no banco
+            db.add(document)
+            db.flush()
+            seen.setdefault(staged.sha256, document)
+            uploaded_files.append(file.filename)
+            
+        # Atualizar contador
+        collection.document_count = db.query(Document).filter(
+            Document.collection_id == collection_id
+        ).count()
         
-        # Salvar arquivo
-        with open(file_path, "wb") as buffer:
-            content = await file.read()
-            buffer.write(content)
+        db.commit()
         
-        # Salvar no banco
-        document = Document(
-            collection_id=collection_id,
-            filename=unique_filename,
-            original_name=file.filename,
-            file_path=file_path,
-            file_size=len(content),
-            content_type=file.content_type
-        )
-        db.add(document)
-        uploaded_files.append(file.filename)
-    
-    # Atualizar contador
-    collection.document_count = db.query(Document).filter(
-        Document.collection_id == collection_id
-    ).count()
-    
-    db.commit()
+    except BaseException:
+        # Não deixar arquivos do lote fora do banco, qualquer que seja a falha
+        db.rollback()
+        if staged is not None:
+            await staged.discard()
+        for path in stored_files:
+            if os.path.exists(path):
+                os.remove(path)
+        raise
     
     return {
-        "message": f"{len(uploaded_files)} arquivos enviados",
-        "files": uploaded_files
+        "message": f"{len(uploaded_files)} arquivos enviados, {len(duplicates)} duplicados",
+        "files": uploaded_files,
+        "duplicates": duplicates
     }
 
-@router.post("/{collection_id}/index")
-def create_index(collection_id: int, db: Session = Depends(get_db)):
-    """Criar índice para coleção"""
+@router.post("/{collection_id}/index", status_code=202)
+def create_index(
+    collection_id: int,
+    full_rebuild: bool = False,
+    db: Session = Depends(get_db)
+):
+    """Enfileirar a criação ou atualização do índice (incremental por padrão)
+
+    A indexação roda em segundo plano; acompanhe o progresso em /jobs/{id}.
+    """
     collection = db.query(DocumentCollection).filter(
         DocumentCollection.id == collection_id
     ).first()
@@ -139,32 +240,53 @@ def create_index(collection_id: int, db: Session = Depends(get_db)):
     if not collection:
         raise HTTPException(status_code=404, detail="Coleção não encontrada")
     
-    collection_path = os.path.join(settings.DOCUMENTS_PATH, collection.name)
+    if job_manager.active_job(db, collection_id):
+        raise HTTPException(status_code=409, detail="Já existe uma indexação em andamento para esta coleção")
     
-    success = rag_service.create_collection_index(
-        collection.name, 
-        collection_path
-    )
+    job = job_manager.enqueue(db, collection, full_rebuild=full_rebuild)
+    return job_to_dict(job)
+
+def get_collection_or_404(db: Session, collection_id: int) -> DocumentCollection:
+    """Coleção pelo id; 404 se não existir (bloqueante: em rotas async, via run_in_threadpool)"""
+    collection = db.query(DocumentCollection).filter(
+        DocumentCollection.id == collection_id
+    ).first()
     
-    if success:
-        # Marcar documentos como indexados
-        db.query(Document).filter(
-            Document.collection_id == collection_id
-        ).update({"is_indexed": True})
-        db.commit()
-        
-        return {"message": "Índice criado com sucesso"}
-    else:
-        raise HTTPException(status_code=500, detail="Erro ao criar índice")
+    if not collection:
+        raise HTTPException(status_code=404, detail="Coleção não encontrada")
+    return collection
 
 @router.post("/{collection_id}/query")
-def query_collection(
+async def query_collection(
     collection_id: int, 
     query: str, 
     top_k: int = 3,
     db: Session = Depends(get_db)
 ):
     """Fazer consulta na coleção"""
+    collection = await run_in_threadpool(get_collection_or_404, db, collection_id)
+    
+    response = await rag_service.aquery_collection(collection.name, query, top_k)
+    
+    return {
+        "collection": collection.name,
+        "query": query,
+        "response": response
+    }
+
+@router.post("/{collection_id}/search")
+def search_collection(
+    collection_id: int,
+    query: str,
+    top_k: int = 5,
+    mode: Literal["vector", "keyword", "hybrid"] = "vector",
+    db: Session = Depends(get_db)
+):
+    """Buscar os trechos mais relevantes da coleção, sem gerar resposta
+
+    ``mode``: "vector" (similaridade), "keyword" (BM25) ou "hybrid" (fusão
+    dos dois, melhor para códigos de erro, números de peça etc.).
+    """
     collection = db.query(DocumentCollection).filter(
         DocumentCollection.id == collection_id
     ).first()
@@ -172,10 +294,29 @@ def query_collection(
     if not collection:
         raise HTTPException(status_code=404, detail="Coleção não encontrada")
     
-    response = rag_service.query_collection(collection.name, query, top_k)
+    started = time.perf_counter()
+    result = rag_service.search_collection(collection.name, query, top_k, mode)
+    if result is None:
+        raise HTTPException(status_code=404, detail="Coleção não indexada")
     
     return {
         "collection": collection.name,
         "query": query,
-        "response": response
+        "mode": result["mode"],
+        "took_ms": (time.perf_counter() - started) * 1000,
+        "sources": result["sources"]
     }
+
+@router.post("/{collection_id}/query/stream")
+async def stream_query_collection(
+    collection_id: int, 
+    query: str, 
+    top_k: int = 3,
+    db: Session = Depends(get_db)
+):
+    """Fazer consulta na coleção com resposta em streaming (NDJSON)"""
+    collection = await run_in_threadpool(get_collection_or_404, db, collection_id)
+    
+    return ndjson_response(
+        await rag_service.astream_query_collection(collection.name, query, top_k)
+    )
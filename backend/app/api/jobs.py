@@ -0,0 +1,48 @@
+from fastapi import APIRouter, Depends, HTTPException
+from sqlalchemy.orm import Session
+from typing import Optional
+from app.models.database import SessionLocal, IndexingJob
+from app.services.indexing_jobs import ACTIVE_STATUSES, job_manager, job_to_dict
+
+router = APIRouter(prefix="/jobs", tags=["Jobs"])
+
+def get_db():
+    db = SessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+
+def get_job_or_404(job_id: int, db: Session) -> IndexingJob:
+    job = db.get(IndexingJob, job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job não encontrado")
+    return job
+
+@router.get("/")
+def list_jobs(
+    collection_id: Optional[int] = None,
+    limit: int = 50,
+    db: Session = Depends(get_db)
+):
+    """Listar jobs de indexação (mais recentes primeiro)"""
+    query = db.query(IndexingJob)
+    if collection_id is not None:
+        query = query.filter(IndexingJob.collection_id == collection_id)
+    jobs = query.order_by(IndexingJob.id.desc()).limit(limit).all()
+    return [job_to_dict(job) for job in jobs]
+
+@router.get("/{job_id}")
+def get_job(job_id: int, db: Session = Depends(get_db)):
+    """Progresso de um job: arquivos processados, chunks embedados e ETA"""
+    return job_to_dict(get_job_or_404(job_id, db))
+
+@router.post("/{job_id}/cancel")
+def cancel_job(job_id: int, db: Session = Depends(get_db)):
+    """Cancelar um job; o trabalho já feito fica salvo no último checkpoint"""
+    job = get_job_or_404(job_id, db)
+    
+    if job.status not in ACTIVE_STATUSES:
+        raise HTTPException(status_code=409, detail=f"Job já finalizado ({job.status})")
+    
+    return job_to_dict(job_manager.cancel(db, job))
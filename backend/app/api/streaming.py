@@ -0,0 +1,22 @@
+import json
+from typing import Any, AsyncIterable, Dict
+from fastapi.responses import StreamingResponse
+
+def ndjson_response(events: AsyncIterable[Dict[str, Any]]) -> StreamingResponse:
+    """Enviar eventos como NDJSON (um objeto JSON por linha) em streaming"""
+    async def lines():
+        try:
+            async for event in events:
+                yield json.dumps(event, ensure_ascii=False) + "\n"
+        finally:
+            # Fechar também em desconexões, para liberar a vaga do limitador
+            aclose = getattr(events, "aclose", None)
+            if aclose is not None:
+                await aclose()
+    
+    return StreamingResponse(
+        lines(),
+        media_type="application/x-ndjson",
+        # Evitar buffering em proxies (nginx) para não atrasar o primeiro token
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
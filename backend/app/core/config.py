@@ -20,15 +20,100 @@ class Settings(BaseSettings):
     llm_provider: str = "ollama"
     ollama_base_url: str = "http://localhost:11434"
     default_model: str = "llama2"
+    ollama_max_connections: int = 20  # shared async HTTP connection pool
+    llm_max_concurrency: int = 8  # generations running against Ollama at once
+    llm_max_queue: int = 32  # requests waiting for a slot before answering 429
+    llm_queue_timeout: float = 30.0  # seconds a request may wait for a slot
+    index_load_workers: int = 4  # threads dedicated to loading indexes
+    embed_batch_size: int = 32  # chunks per embedding request
+    embed_concurrency: int = 4  # embedding requests in flight
+    embed_max_retries: int = 3  # retries of transient embedding failures (with backoff)
+    local_embed_model: str = "BAAI/bge-small-en-v1.5"  # HuggingFace model of the services-package RAGService
+    local_embed_device: Optional[str] = None  # "cpu", "cuda", ... (None = auto-detect)
+    embed_dynamic_batching: bool = True  # group concurrent single embeds into one forward pass (CPU only)
+    embed_batch_max_size: int = 32  # texts per dynamic batch
+    embed_batch_max_wait_ms: float = 5.0  # how long a batch waits for concurrent requests
     
     # Vector Store
     vector_store_path: str = "./data/vector_store"
     chunk_size: int = 1024
     chunk_overlap: int = 20
+    vector_store_backend: str = "mmap"  # "mmap" (binary, memory-mapped) or "simple" (JSON)
+    vector_store_dtype: str = "float32"  # "float32" or "float16" (mmap backend only)
+    docstore_backend: str = "mmap"  # "mmap" (node texts memory-mapped, shared by workers) or "simple" (JSON)
+
+    # Approximate nearest-neighbour (IVF) search for large collections
+    ann_enabled: bool = True
+    ann_min_vectors: int = 200_000  # collections at least this large use the IVF index
+    ann_nlist: int = 0  # number of inverted lists; 0 = sqrt(number of vectors)
+    ann_nprobe: int = 16  # lists scanned per query (higher = better recall, slower)
+
+    # Quantized vector codes: queries are scored on the codes and the best
+    # candidates re-ranked on their float vectors
+    vector_quantization: str = "none"  # "none", "int8" (scalar, 4x smaller) or "pq" (product quantization)
+    quantization_pq_subvectors: int = 0  # PQ sub-vectors (one byte each); 0 = one per 8 dimensions
+    quantization_rerank: int = 100  # candidates re-scored exactly on float vectors (vector_store_dtype=float16 halves them)
+    quantization_keep_vectors: bool = True  # False = codes only on disk (mmap backend): no float vectors, no re-rank
+
+    # Incremental re-indexing reuses the trained IVF centroids and quantizer
+    # and only assigns/encodes the new rows until one of these is exceeded
+    index_retrain_changed_ratio: float = 0.5  # rows added or deleted since training, as a share of all rows
+    index_retrain_drift: float = 0.5  # relative increase of the new rows' distance/error over the training rows'
+
+    # Persistent embedding cache shared by all collections; 0 = unlimited
+    embedding_cache_enabled: bool = True
+    embedding_cache_path: str = "./data/embedding_cache.sqlite3"
+    embedding_cache_max_bytes: int = 2 * 1024 * 1024 * 1024  # 2GB, estimated
+
+    # Keyword (BM25) index built with every collection, for hybrid search
+    bm25_enabled: bool = True
+    bm25_k1: float = 1.2
+    bm25_b: float = 0.75
+    hybrid_candidates: int = 50  # candidates taken from each ranking before fusion
+    hybrid_rrf_k: int = 60  # reciprocal rank fusion constant
+
+    # Cache of generated answers, per collection index version
+    response_cache_enabled: bool = True
+    response_cache_max_entries: int = 1024
+    response_cache_ttl: float = 3600.0  # seconds (0 = until evicted or re-indexed)
+    # Similar-question tier, opt-in (e.g. RESPONSE_CACHE_SEMANTIC_THRESHOLD=0.97 in .env):
+    # questions differing in one word ("price of plan A"/"plan B") can score above 0.95
+    response_cache_semantic_threshold: float = 0.0  # cosine to reuse a similar question's answer (0 = exact match only)
+
+    # Loaded index cache (LRU); 0 = unlimited
+    index_cache_max_entries: int = 32
+    index_cache_max_bytes: int = 4 * 1024 * 1024 * 1024  # 4GB, estimated
+    
+    # Startup warm-up; /health/ready answers 503 until it finishes
+    warmup_enabled: bool = True
+    warmup_collections: list[str] = []  # collections to preload (empty = most recently used)
+    warmup_max_collections: int = 4  # most recently used collections preloaded when none are listed
+    warmup_timeout: float = 300.0  # report ready after this many seconds even if still warming
+    recent_collections_path: str = "./data/recent_collections.json"
+    recent_collections_save_interval: float = 60.0  # seconds between saves of the recent collections (0 = only at shutdown)
+    ollama_keep_alive: str = "30m"  # how long Ollama keeps the models loaded ("-1" = forever)
+    
+    # Background indexing jobs
+    parse_workers: int = 4  # processes parsing documents in parallel (0 = parse inline)
+    parse_timeout: float = 300.0  # seconds before a file's parser is killed (0 = no limit)
+    ingest_queue_size: int = 4  # batches buffered between ingestion stages
+    ingest_checkpoint_chunks: int = 20000  # also persist after this many chunks (between files)
+    indexing_workers: int = 2  # worker processes running indexing jobs
+    indexing_job_lease_seconds: float = 60.0  # a running job whose heartbeat is older than this is taken over
+    index_checkpoint_files: int = 50  # persist index + manifest every N files (0 = only at the end)
+    index_versions_keep: int = 2  # published index versions kept on disk (older ones unless in use)
+    index_version_check_interval: float = 2.0  # seconds between checks for a version published by another process (0 = never)
+    
+    # Observability
+    log_level: str = "INFO"
+    metrics_enabled: bool = True  # stage/request histograms and /metrics
+    server_timing_enabled: bool = False  # per-request stage timings in a Server-Timing header
     
     # API Settings
     cors_origins: list[str] = ["http://localhost:3000", "http://localhost:8080"]
     max_upload_size: int = 50 * 1024 * 1024  # 50MB
+    max_upload_request_size: int = 200 * 1024 * 1024  # whole multipart request, rejected from Content-Length before the body is read (0 = no limit)
+    upload_chunk_size: int = 1024 * 1024  # uploads are streamed to disk in chunks of this size
     
     # Storage
     upload_path: str = "./data/uploads"
@@ -0,0 +1,17 @@
+"""Logging setup for the DocuChat API and its indexing workers."""
+
+import logging
+
+from app.core.config import settings
+
+LOG_FORMAT = "%(asctime)s %(levelname)s [%(name)s] %(message)s"
+
+
+def configure_logging(level: str = None) -> None:
+    """Send application logs to stderr at ``level`` (default: ``settings.log_level``).
+
+    Safe to call more than once; handlers installed earlier (e.g. by uvicorn)
+    are left in place.
+    """
+    logging.basicConfig(level=(level or settings.log_level).upper(), format=LOG_FORMAT)
+    logging.getLogger("app").setLevel((level or settings.log_level).upper())
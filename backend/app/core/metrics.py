@@ -0,0 +1,283 @@
+"""Latency and usage metrics in the Prometheus text exposition format.
+
+The query and indexing paths wrap each step in ``span("stage")``; durations
+go to the ``docuchat_stage_duration_seconds`` histogram and, when the request
+opted in, to its ``Server-Timing`` header (see ``collect_timings``). Counters
+and histograms are updated in place; gauges read their value from a callback
+when ``/metrics`` is scraped, so caches and indexes need no bookkeeping of
+their own.
+
+With ``metrics_enabled`` off and no timings being collected, ``span``
+returns a shared no-op context manager and nothing is recorded.
+"""
+
+import bisect
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+from contextvars import ContextVar
+from typing import Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from app.core.config import settings
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+Labels = Tuple[str, ...]
+Sample = Tuple[str, Dict[str, str], float]
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value))
+
+
+def _format_labels(labels: Dict[str, str]) -> str:
+    if not labels:
+        return ""
+    escaped = (
+        (name, str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"'))
+        for name, value in labels.items()
+    )
+    return "{" + ",".join(f'{name}="{value}"' for name, value in escaped) + "}"
+
+
+class _Metric:
+    type = "untyped"
+
+    def __init__(
+        self,
+        name: str,
+        help: str,
+        labelnames: Sequence[str] = (),
+        fn: Optional[Callable[[], object]] = None,
+    ):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.fn = fn
+        self._values: Dict[Labels, float] = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> Labels:
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def _collected(self) -> Dict[Labels, float]:
+        """Values from the callback: a number, or a dict keyed by label values."""
+        value = self.fn()
+        if isinstance(value, dict):
+            return {
+                key if isinstance(key, tuple) else (key,): float(item)
+                for key, item in value.items()
+            }
+        return {(): float(value)}
+
+    def samples(self) -> List[Sample]:
+        if self.fn is not None:
+            values = self._collected()
+        else:
+            with self._lock:
+                values = dict(self._values)
+        return [
+            (self.name, dict(zip(self.labelnames, key)), value)
+            for key, value in sorted(values.items())
+        ]
+
+
+class Counter(_Metric):
+    """Monotonic total, incremented in place or read from ``fn``."""
+
+    type = "counter"
+
+    def inc(self, amount: float = 1.0, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+
+class Gauge(_Metric):
+    """Current value, set in place or read from ``fn`` at scrape time."""
+
+    type = "gauge"
+
+    def set(self, value: float, **labels: str) -> None:
+        with self._lock:
+            self._values[self._key(labels)] = float(value)
+
+
+class Histogram(_Metric):
+    """Cumulative bucket counts plus sum and count, per label set."""
+
+    type = "histogram"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._series: Dict[Labels, list] = {}
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                # Bucket counts (last one is +Inf), sum, count
+                series = self._series[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def samples(self) -> List[Sample]:
+        with self._lock:
+            series = {key: (list(counts), total, count) for key, (counts, total, count) in self._series.items()}
+
+        samples = []
+        for key, (counts, total, count) in sorted(series.items()):
+            labels = dict(zip(self.labelnames, key))
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += bucket_count
+                samples.append((f"{self.name}_bucket", dict(labels, le=_format_value(bound)), cumulative))
+            samples.append((f"{self.name}_sum", labels, total))
+            samples.append((f"{self.name}_count", labels, count))
+        return samples
+
+
+class MetricsRegistry:
+    """Named metrics rendered together for ``/metrics``."""
+
+    def __init__(self, enabled: bool = True):
+        self.enabled = enabled
+        self._metrics: Dict[str, _Metric] = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric: _Metric) -> _Metric:
+        """Add ``metric``, replacing one of the same name (e.g. a new callback)."""
+        with self._lock:
+            self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, help: str, labelnames: Sequence[str] = (), fn=None) -> Counter:
+        return self.register(Counter(name, help, labelnames, fn))
+
+    def gauge(self, name: str, help: str, labelnames: Sequence[str] = (), fn=None) -> Gauge:
+        return self.register(Gauge(name, help, labelnames, fn))
+
+    def histogram(self, name: str, help: str, labelnames: Sequence[str] = (), buckets=DEFAULT_BUCKETS) -> Histogram:
+        return self.register(Histogram(name, help, labelnames, buckets))
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics.values())
+
+        lines = []
+        for metric in metrics:
+            try:
+                samples = metric.samples()
+            except Exception:
+                # A failing callback (e.g. cache file gone) must not break the scrape
+                continue
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.type}")
+            for name, labels, value in samples:
+                lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+
+# Global metrics registry
+metrics = MetricsRegistry(enabled=settings.metrics_enabled)
+
+REQUEST_SECONDS = metrics.histogram(
+    "docuchat_http_request_duration_seconds",
+    "HTTP request latency (until the response headers are sent).",
+    ("method", "route", "status"),
+)
+STAGE_SECONDS = metrics.histogram(
+    "docuchat_stage_duration_seconds",
+    "Time spent in each step of querying and indexing.",
+    ("stage",),
+)
+LLM_TOKENS = metrics.counter(
+    "docuchat_llm_tokens_total",
+    "Tokens evaluated by the LLM, by kind (prompt or completion).",
+    ("kind",),
+)
+LLM_TOKENS_PER_SECOND = metrics.histogram(
+    "docuchat_llm_tokens_per_second",
+    "Generation throughput reported by Ollama per response.",
+    buckets=(1, 2, 5, 10, 15, 20, 30, 50, 75, 100, 150, 200, 300),
+)
+
+
+# ---------------------------------------------------------------------- #
+# Timing spans and Server-Timing
+# ---------------------------------------------------------------------- #
+
+# Stage timings of the current request, when it asked for Server-Timing
+_timings: ContextVar[Optional[List[Tuple[str, float]]]] = ContextVar("server_timings", default=None)
+
+_NOOP = nullcontext()
+
+
+def record_stage(stage: str, seconds: float) -> None:
+    """Record a stage duration in the histogram and the request timings."""
+    if metrics.enabled:
+        STAGE_SECONDS.observe(seconds, stage=stage)
+    timings = _timings.get()
+    if timings is not None:
+        timings.append((stage, seconds))
+
+
+class _Span:
+    __slots__ = ("stage", "started")
+
+    def __init__(self, stage: str):
+        self.stage = stage
+
+    def __enter__(self) -> "_Span":
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        record_stage(self.stage, time.perf_counter() - self.started)
+
+
+def span(stage: str):
+    """Context manager timing one stage (e.g. ``"retrieve"``)."""
+    if not metrics.enabled and _timings.get() is None:
+        return _NOOP
+    return _Span(stage)
+
+
+def record_llm_usage(raw: Optional[dict]) -> None:
+    """Token counts and throughput from the final Ollama response chunk."""
+    if not metrics.enabled or not raw:
+        return
+    prompt_tokens = raw.get("prompt_eval_count")
+    tokens = raw.get("eval_count")
+    if prompt_tokens:
+        LLM_TOKENS.inc(prompt_tokens, kind="prompt")
+    if tokens:
+        LLM_TOKENS.inc(tokens, kind="completion")
+        eval_ns = raw.get("eval_duration")
+        if eval_ns:
+            LLM_TOKENS_PER_SECOND.observe(tokens / (eval_ns / 1e9))
+
+
+@contextmanager
+def collect_timings() -> Iterator[List[Tuple[str, float]]]:
+    """Collect the stage timings recorded while the block runs (same context)."""
+    timings: List[Tuple[str, float]] = []
+    token = _timings.set(timings)
+    try:
+        yield timings
+    finally:
+        _timings.reset(token)
+
+
+def server_timing_header(timings: Sequence[Tuple[str, float]]) -> str:
+    """``Server-Timing`` value; stages repeated (e.g. per collection) are summed."""
+    totals: Dict[str, float] = {}
+    for stage, seconds in timings:
+        totals[stage] = totals.get(stage, 0.0) + seconds
+    return ", ".join(f"{stage};dur={seconds * 1000:.1f}" for stage, seconds in totals.items())
@@ -1,10 +1,22 @@
-from fastapi import FastAPI
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import JSONResponse, PlainTextResponse
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
 from app.core.config import settings
+from app.core.logging_config import configure_logging
+from app.core.metrics import REQUEST_SECONDS, collect_timings, metrics, server_timing_header
 from app.api import api_router
 from app.models.database import Base, engine
+from app.services.concurrency import QueueFullError
+from app.services.ollama_pool import close_async_client
+from app.services.indexing_jobs import job_manager
+from app.services.warmup import warmup
+import asyncio
 import os
+import time
+from contextlib import nullcontext
+
+configure_logging()
 
 # Create database tables
 Base.metadata.create_all(bind=engine)
@@ -28,6 +40,92 @@ app.add_middleware(
 # Include API routes
 app.include_router(api_router, prefix=settings.API_PREFIX)
 
+@app.middleware("http")
+async def limit_upload_size(request: Request, call_next):
+    """Answer 413 from Content-Length, before an oversized upload is received
+
+    The multipart body is spooled to disk while FastAPI parses the form, i.e.
+    before the endpoint (and its per-file limit) runs.
+    """
+    limit = settings.max_upload_request_size
+    content_length = request.headers.get("content-length", "")
+    if (
+        limit
+        and request.headers.get("content-type", "").startswith("multipart/form-data")
+        and content_length.isdigit()
+        and int(content_length) > limit
+    ):
+        return JSONResponse(
+            status_code=413,
+            content={"detail": f"Envio excede o tamanho máximo de {limit} bytes"}
+        )
+    return await call_next(request)
+
+@app.middleware("http")
+async def observe_request(request: Request, call_next):
+    """Request latency histogram and, when enabled, the Server-Timing header"""
+    if not metrics.enabled and not settings.server_timing_enabled:
+        return await call_next(request)
+    
+    started = time.perf_counter()
+    with collect_timings() if settings.server_timing_enabled else nullcontext() as timings:
+        response = await call_next(request)
+    elapsed = time.perf_counter() - started
+    
+    if metrics.enabled:
+        # Route template (e.g. /api/v1/collections/{collection_id}) keeps label cardinality low
+        route = request.scope.get("route")
+        REQUEST_SECONDS.observe(
+            elapsed,
+            method=request.method,
+            route=getattr(route, "path", "unmatched"),
+            status=str(response.status_code)
+        )
+    if timings is not None:
+        # Streamed responses only report the stages before the first byte
+        response.headers["Server-Timing"] = server_timing_header(timings + [("total", elapsed)])
+    return response
+
+@app.exception_handler(QueueFullError)
+async def queue_full_handler(request: Request, exc: QueueFullError):
+    """Answer 429 when the LLM queue is saturated"""
+    return JSONResponse(
+        status_code=429,
+        content={"detail": "Servidor ocupado, tente novamente em instantes"},
+        headers={"Retry-After": str(exc.retry_after)}
+    )
+
+@app.on_event("startup")
+def resume_indexing_jobs():
+    """Resubmit indexing jobs interrupted by a previous shutdown or crash"""
+    job_manager.resume_interrupted()
+
+@app.on_event("startup")
+async def start_warmup():
+    """Preload hot collections and the Ollama models in the background"""
+    if settings.warmup_enabled:
+        app.state.warmup_task = asyncio.create_task(warmup.run())
+    else:
+        warmup.disable()
+
+@app.on_event("startup")
+async def start_saving_recent():
+    """Save the recently used collections periodically, so a crash keeps them"""
+    if settings.recent_collections_save_interval > 0:
+        app.state.recent_task = asyncio.create_task(
+            warmup.save_recent_periodically(settings.recent_collections_save_interval)
+        )
+
+@app.on_event("shutdown")
+async def shutdown():
+    """Close the shared Ollama connection pool and stop indexing workers"""
+    recent_task = getattr(app.state, "recent_task", None)
+    if recent_task is not None:
+        recent_task.cancel()
+    warmup.save_recent()
+    await close_async_client()
+    job_manager.shutdown()
+
 # Create necessary directories
 os.makedirs(settings.DOCUMENTS_PATH, exist_ok=True)
 os.makedirs(settings.INDEX_STORAGE_PATH, exist_ok=True)
@@ -44,13 +142,27 @@ def read_root():
 
 @app.get("/health")
 def health_check():
-    """Health check endpoint"""
+    """Liveness check; readiness is reported separately on /health/ready"""
     return {
         "status": "healthy",
+        "ready": warmup.ready,
         "app": settings.APP_NAME,
         "version": settings.VERSION
     }
 
+@app.get("/health/ready")
+def readiness_check():
+    """Readiness check: 503 until the startup warm-up has finished"""
+    status = warmup.status()
+    return JSONResponse(status_code=200 if status["ready"] else 503, content=status)
+
+@app.get("/metrics", include_in_schema=False)
+def metrics_endpoint():
+    """Prometheus metrics: stage and request latency, tokens, caches and indexes"""
+    if not metrics.enabled:
+        raise HTTPException(status_code=404, detail="Métricas desativadas")
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(
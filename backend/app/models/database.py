@@ -32,7 +32,53 @@ class Document(Base):
     file_path = Column(String(500))
     file_size = Column(Integer)
     content_type = Column(String(100))
+    content_hash = Column(String(64), index=True)  # SHA-256, usado para deduplicar uploads
     created_at = Column(DateTime, default=datetime.utcnow)
     is_indexed = Column(Boolean, default=False)
 
+class IndexingJob(Base):
+    __tablename__ = "indexing_jobs"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    collection_id = Column(Integer, index=True)
+    status = Column(String(20), default="queued", index=True)  # queued, running, completed, failed, cancelled
+    full_rebuild = Column(Boolean, default=False)
+    cancel_requested = Column(Boolean, default=False)
+    files_total = Column(Integer, default=0)
+    files_done = Column(Integer, default=0)
+    chunks_embedded = Column(Integer, default=0)
+    error = Column(Text)
+    owner = Column(String(100))  # processo que reivindicou o job (host:pid)
+    heartbeat = Column(DateTime)  # renovado pelo worker; expirado = job abandonado
+    created_at = Column(DateTime, default=datetime.utcnow)
+    started_at = Column(DateTime)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    finished_at = Column(DateTime)
+
 Base.metadata.create_all(bind=engine)
+
+def ensure_schema():
+    """Adicionar colunas novas a bancos criados por versões anteriores
+
+    create_all só cria tabelas que não existem; colunas acrescentadas depois
+    são adicionadas aqui com ALTER TABLE.
+    """
+    added_columns = {
+        "documents": [
+            ("content_hash", "VARCHAR(64)", "CREATE INDEX IF NOT EXISTS ix_documents_content_hash ON documents (content_hash)"),
+        ],
+        "indexing_jobs": [
+            ("owner", "VARCHAR(100)", None),
+            ("heartbeat", "DATETIME", None),
+        ],
+    }
+    with engine.begin() as conn:
+        for table, columns in added_columns.items():
+            existing = {row[1] for row in conn.exec_driver_sql(f"PRAGMA table_info({table})")}
+            for name, column_type, index_sql in columns:
+                if name not in existing:
+                    conn.exec_driver_sql(f"ALTER TABLE {table} ADD COLUMN {name} {column_type}")
+                    if index_sql:
+                        conn.exec_driver_sql(index_sql)
+
+ensure_schema()
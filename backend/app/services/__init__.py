@@ -1,21 +1,88 @@
-"""Services module for DocuChat RAG application."""
+"""Services module for DocuChat RAG application.
+
+This package is imported by every ``app.services.*`` module, so it must stay
+cheap to import: LlamaIndex, the Ollama client and HuggingFace embeddings
+(torch/transformers) are imported inside the methods that use them.
+
+``RAGService`` is built per request, but the models behind it are not: the
+LLM client and the embedding model are created once per process and shared
+by every instance, and loaded collection indexes are kept in a process-wide
+LRU cache instead of being read from disk on every query. A cached index is
+never modified: writers load their own copy from disk, add to it and swap
+the cached reference, so queries running on the previous one are unaffected.
+"""
 
 from typing import List, Optional, Dict, Any
 import os
-import hashlib
+import threading
 from pathlib import Path
-from llama_index.core import (
-    VectorStoreIndex,
-    SimpleDirectoryReader,
-    StorageContext,
-    load_index_from_storage,
-    Settings
-)
-from llama_index.llms.ollama import Ollama
-from llama_index.embeddings.huggingface import HuggingFaceEmbedding
 from sqlalchemy.orm import Session
 from ..models import Collection, Document
 from ..core.config import settings
+from .index_manifest import file_sha256
+from .index_cache import IndexCache, estimate_index_bytes
+
+# Process-wide models, built by the first RAGService
+_models_lock = threading.Lock()
+_models_ready = False
+
+# Loaded collection indexes shared by all RAGService instances
+_indexes = IndexCache(
+    max_entries=settings.index_cache_max_entries,
+    max_bytes=settings.index_cache_max_bytes,
+)
+_index_locks: Dict[str, threading.Lock] = {}
+_index_locks_guard = threading.Lock()
+
+
+def _index_lock(collection_id: str) -> threading.Lock:
+    """Lock serializing loads and writes of one collection's index."""
+    with _index_locks_guard:
+        return _index_locks.setdefault(collection_id, threading.Lock())
+
+
+def _discard_index_lock(collection_id: str) -> None:
+    """Forget the lock of a deleted collection."""
+    with _index_locks_guard:
+        _index_locks.pop(collection_id, None)
+
+
+def _build_embed_model():
+    """HuggingFace embedding model, behind the embedding cache and, on CPU,
+    the dynamic batcher."""
+    from llama_index.embeddings.huggingface import HuggingFaceEmbedding
+    from llama_index.embeddings.huggingface.utils import format_query
+    from .embedding_cache import CachedEmbedding, get_embedding_cache
+    from .dynamic_batching import DynamicBatchingEmbedding
+    
+    hf_model = HuggingFaceEmbedding(
+        model_name=settings.local_embed_model,
+        device=settings.local_embed_device
+    )
+    embed_model = hf_model
+    if settings.embedding_cache_enabled:
+        embed_model = CachedEmbedding(
+            embed_model,
+            get_embedding_cache(settings.embedding_cache_path, settings.embedding_cache_max_bytes)
+        )
+    
+    # On a GPU a single query is already cheap; batching only pays off on CPU
+    if settings.embed_dynamic_batching and hf_model._device == "cpu":
+        # Queries bypass the embedding cache, so they are batched on the
+        # HuggingFace model itself, each with its query instruction
+        def embed_queries(queries: List[str]) -> List[List[float]]:
+            return hf_model._embed([
+                format_query(query, hf_model.model_name, hf_model.query_instruction)
+                for query in queries
+            ])
+        
+        embed_model = DynamicBatchingEmbedding(
+            embed_model,
+            query_batch_fn=embed_queries,
+            max_batch_size=settings.embed_batch_max_size,
+            max_wait=settings.embed_batch_max_wait_ms / 1000
+        )
+    return embed_model
 
 
 class RAGService:
@@ -26,22 +93,62 @@ class RAGService:
         self._setup_llama_index()
     
     def _setup_llama_index(self):
-        """Configure LlamaIndex settings."""
-        # Setup LLM
-        Settings.llm = Ollama(
-            model=settings.default_model,
-            base_url=settings.ollama_base_url,
-            temperature=0.1
-        )
+        """Configure LlamaIndex settings (once per process)."""
+        global _models_ready
+        if _models_ready:
+            return
         
-        # Setup embedding model
-        Settings.embed_model = HuggingFaceEmbedding(
-            model_name="BAAI/bge-small-en-v1.5"
-        )
+        with _models_lock:
+            if _models_ready:
+                return
+            
+            from llama_index.core import Settings
+            from llama_index.llms.ollama import Ollama
+            
+            # Setup LLM
+            Settings.llm = Ollama(
+                model=settings.default_model,
+                base_url=settings.ollama_base_url,
+                temperature=0.1
+            )
+            
+            # Setup embedding model, consulting the shared embedding cache first
+            Settings.embed_model = _build_embed_model()
+            
+            # Create directories
+            os.makedirs(settings.vector_store_path, exist_ok=True)
+            os.makedirs(settings.upload_path, exist_ok=True)
+            _models_ready = True
+    
+    def _load_index(self, collection_id: str):
+        """Loaded index of a collection, from the shared cache or disk.
+        
+        Returns None when the collection has no documents indexed yet.
+        Callers hold ``_index_lock(collection_id)``.
+        """
+        index = _indexes.get(collection_id)
+        if index is not None:
+            return index
+        
+        index = self._read_index(collection_id)
+        if index is not None:
+            storage_path = Path(settings.vector_store_path) / collection_id
+            _indexes.put(collection_id, index, estimate_index_bytes(str(storage_path)))
+        return index
+    
+    def _read_index(self, collection_id: str):
+        """Index of a collection read from disk, not shared with the cache.
+        
+        Returns None when the collection has no documents indexed yet.
+        """
+        storage_path = Path(settings.vector_store_path) / collection_id
+        if not (storage_path / "docstore.json").exists():
+            return None
+        
+        from llama_index.core import StorageContext, load_index_from_storage
         
-        # Create directories
-        os.makedirs(settings.vector_store_path, exist_ok=True)
-        os.makedirs(settings.upload_path, exist_ok=True)
+        storage_context = StorageContext.from_defaults(persist_dir=str(storage_path))
+        return load_index_from_storage(storage_context)
     
     def create_collection(self, name: str, description: str = None) -> Collection:
         """Create a new document collection."""
@@ -87,21 +194,35 @@ class RAGService:
         
         # Remove vector store directory
         import shutil
-        collection_path = Path(settings.vector_store_path) / collection_id
-        if collection_path.exists():
-            shutil.rmtree(collection_path)
+        with _index_lock(collection_id):
+            _indexes.pop(collection_id)
+            collection_path = Path(settings.vector_store_path) / collection_id
+            if collection_path.exists():
+                shutil.rmtree(collection_path)
+        _discard_index_lock(collection_id)
         
         return True
     
-    def add_document(self, collection_id: str, file_path: str, filename: str) -> Optional[Document]:
-        """Add a document to a collection and process it."""
+    def add_document(
+        self,
+        collection_id: str,
+        file_path: str,
+        filename: str,
+        content_hash: Optional[str] = None
+    ) -> Optional[Document]:
+        """Add a document to a collection and process it.
+        
+        Pass ``content_hash`` when it was already computed while storing the
+        upload (see ``app.services.uploads.stage_upload``) to avoid reading the
+        file again.
+        """
         collection = self.get_collection(collection_id)
         if not collection:
             return None
         
-        # Calculate file hash
-        with open(file_path, 'rb') as f:
-            content_hash = hashlib.sha256(f.read()).hexdigest()
+        # Calculate file hash, reading in chunks
+        if content_hash is None:
+            content_hash = file_sha256(file_path)
         
         # Create document record
         document = Document(
@@ -136,26 +257,28 @@ class RAGService:
     
     def _process_document(self, collection_id: str, file_path: str):
         """Process a document and add it to the vector store."""
+        from llama_index.core import VectorStoreIndex, SimpleDirectoryReader
+        
         # Load documents
         documents = SimpleDirectoryReader(input_files=[file_path]).load_data()
         
         # Collection vector store path
         storage_path = Path(settings.vector_store_path) / collection_id
         
-        # Create or load index
-        if (storage_path / "docstore.json").exists():
-            # Load existing index
-            storage_context = StorageContext.from_defaults(persist_dir=str(storage_path))
-            index = load_index_from_storage(storage_context)
-            # Add new documents
-            for doc in documents:
-                index.insert(doc)
-        else:
-            # Create new index
-            index = VectorStoreIndex.from_documents(documents)
-        
-        # Persist index
-        index.storage_context.persist(persist_dir=str(storage_path))
+        with _index_lock(collection_id):
+            # Work on a copy: queries may be running on the cached index
+            index = self._read_index(collection_id)
+            if index is not None:
+                # Add new documents
+                for doc in documents:
+                    index.insert(doc)
+            else:
+                # Create new index
+                index = VectorStoreIndex.from_documents(documents)
+            
+            # Persist index and swap it in for new queries
+            index.storage_context.persist(persist_dir=str(storage_path))
+            _indexes.put(collection_id, index, estimate_index_bytes(str(storage_path)))
     
     def query_collection(self, collection_id: str, query: str, top_k: int = 5) -> Dict[str, Any]:
         """Query a collection's documents."""
@@ -163,15 +286,13 @@ class RAGService:
         if not collection:
             return {"error": "Collection not found"}
         
-        storage_path = Path(settings.vector_store_path) / collection_id
-        
-        if not (storage_path / "docstore.json").exists():
-            return {"error": "No documents in collection"}
-        
         try:
-            # Load index
-            storage_context = StorageContext.from_defaults(persist_dir=str(storage_path))
-            index = load_index_from_storage(storage_context)
+            # Load index (cached across requests). Writers swap in a new
+            # index instead of modifying this one, so no lock is needed below
+            with _index_lock(collection_id):
+                index = self._load_index(collection_id)
+            if index is None:
+                return {"error": "No documents in collection"}
             
             # Create query engine
             query_engine = index.as_query_engine(
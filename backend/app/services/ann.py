@@ -0,0 +1,260 @@
+"""Approximate nearest-neighbour search with an inverted-file (IVF) index.
+
+The rows of a collection's ``EmbeddingMatrix`` are clustered with spherical
+k-means into ``nlist`` lists. A query is compared against the centroids, the
+``nprobe`` closest lists are scanned exactly and the best rows returned, so
+only about ``nprobe / nlist`` of the matrix is touched per query. Raising
+``nprobe`` trades latency for recall.
+
+The index only stores centroids and row numbers (``ann/`` inside the
+collection's storage directory); vectors are read from the embedding matrix
+itself, so it adds little memory on top of it.
+
+Rows appended by an incremental re-index are assigned to the existing
+centroids (``extend``). The centroids are retrained only once too many rows
+were added or deleted since training, or once the new rows sit clearly
+farther from their centroids than the training rows did.
+"""
+
+import json
+import math
+import os
+import shutil
+from typing import Optional, Tuple
+
+import numpy as np
+
+from app.services.embedding_matrix import EmbeddingMatrix, normalize
+
+ANN_DIRNAME = "ann"
+META_FILENAME = "ivf.meta.json"
+CENTROIDS_FILENAME = "ivf_centroids.npy"
+ROWS_FILENAME = "ivf_rows.npy"
+OFFSETS_FILENAME = "ivf_offsets.npy"
+IVF_FORMAT = 1
+
+KMEANS_ITERATIONS = 10
+ASSIGN_BLOCK_ROWS = 65536
+
+
+def _assign(vectors: np.ndarray, centroids: np.ndarray) -> np.ndarray:
+    """Index of the closest centroid for every row, in blocks."""
+    return _closest(vectors, centroids)[0]
+
+
+def _closest(vectors: np.ndarray, centroids: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Closest centroid of every row and the cosine similarity to it, in blocks."""
+    labels = np.empty(vectors.shape[0], dtype=np.int32)
+    similarities = np.empty(vectors.shape[0], dtype=np.float32)
+    for start in range(0, vectors.shape[0], ASSIGN_BLOCK_ROWS):
+        block_scores = np.asarray(vectors[start:start + ASSIGN_BLOCK_ROWS], dtype=np.float32) @ centroids.T
+        end = start + len(block_scores)
+        labels[start:end] = np.argmax(block_scores, axis=1)
+        similarities[start:end] = block_scores[np.arange(len(block_scores)), labels[start:end]]
+    return labels, similarities
+
+
+def _lists(labels: np.ndarray, nlist: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Rows grouped by list (``rows``) and where each list starts (``offsets``)."""
+    rows = np.argsort(labels, kind="stable").astype(np.int64)
+    offsets = np.concatenate([[0], np.cumsum(np.bincount(labels, minlength=nlist))]).astype(np.int64)
+    return rows, offsets
+
+
+def train_centroids(
+    vectors: np.ndarray,
+    nlist: int,
+    iterations: int = KMEANS_ITERATIONS,
+    seed: int = 0,
+) -> np.ndarray:
+    """Spherical k-means on (a sample of) normalized ``vectors``."""
+    rng = np.random.default_rng(seed)
+    centroids = np.asarray(vectors[np.sort(rng.choice(len(vectors), nlist, replace=False))], dtype=np.float32)
+
+    for _ in range(iterations):
+        labels = _assign(vectors, centroids)
+        sums = np.zeros_like(centroids)
+        for start in range(0, vectors.shape[0], ASSIGN_BLOCK_ROWS):
+            block = np.asarray(vectors[start:start + ASSIGN_BLOCK_ROWS], dtype=np.float32)
+            block_labels = labels[start:start + len(block)]
+            order = np.argsort(block_labels, kind="stable")
+            present, starts = np.unique(block_labels[order], return_index=True)
+            sums[present] += np.add.reduceat(block[order], starts, axis=0)
+
+        counts = np.bincount(labels, minlength=nlist)
+        empty = counts == 0
+        if empty.any():
+            # Re-seed empty lists with random rows
+            sums[empty] = vectors[rng.choice(len(vectors), int(empty.sum()), replace=False)]
+        centroids = normalize(sums)
+
+    return centroids
+
+
+class IVFIndex:
+    """Inverted-file index over the rows of an embedding matrix."""
+
+    def __init__(
+        self,
+        centroids: np.ndarray,
+        rows: np.ndarray,
+        offsets: np.ndarray,
+        num_vectors: int,
+        trained_vectors: Optional[int] = None,
+        distance: Optional[float] = None,
+    ):
+        self.centroids = centroids
+        self.rows = rows
+        self.offsets = offsets
+        self.num_vectors = num_vectors
+        # Rows the centroids were trained for and their mean cosine distance
+        # to them; None for indexes saved before these were recorded
+        self.trained_vectors = trained_vectors
+        self.distance = distance
+
+    @property
+    def nlist(self) -> int:
+        return self.centroids.shape[0]
+
+    @classmethod
+    def build(
+        cls,
+        matrix: EmbeddingMatrix,
+        nlist: Optional[int] = None,
+        train_sample: int = 100000,
+        seed: int = 0,
+    ) -> "IVFIndex":
+        """Cluster the rows of ``matrix`` into ``nlist`` lists (default √n)."""
+        vectors = matrix.vectors
+        num_vectors = vectors.shape[0]
+        nlist = min(nlist or max(1, int(math.sqrt(num_vectors))), num_vectors)
+
+        rng = np.random.default_rng(seed)
+        if num_vectors > train_sample:
+            sample = np.asarray(vectors[np.sort(rng.choice(num_vectors, train_sample, replace=False))])
+        else:
+            sample = vectors
+        centroids = train_centroids(sample, nlist, seed=seed)
+
+        labels, similarities = _closest(vectors, centroids)
+        rows, offsets = _lists(labels, nlist)
+        distance = float(1.0 - similarities.mean())
+        return cls(centroids, rows, offsets, num_vectors, trained_vectors=num_vectors, distance=distance)
+
+    def extend(
+        self,
+        matrix: EmbeddingMatrix,
+        max_changed: float,
+        max_drift: float,
+    ) -> Optional["IVFIndex"]:
+        """Index over ``matrix`` with only the rows after ``num_vectors`` assigned.
+
+        The first ``num_vectors`` rows of ``matrix`` must be the rows this
+        index was built over. Returns None when the centroids should be
+        retrained instead: when the rows added or deleted since training
+        exceed ``max_changed`` of the matrix, or when the new rows are on
+        average more than ``max_drift`` (relative) farther from their
+        centroids than the training rows were.
+        """
+        vectors = matrix.vectors
+        num_vectors = vectors.shape[0]
+        if self.trained_vectors is None or self.distance is None or num_vectors < self.num_vectors:
+            return None
+
+        deleted = 0 if matrix.deleted is None else len(matrix.deleted)
+        if abs(num_vectors - self.trained_vectors) + deleted > max_changed * num_vectors:
+            return None
+
+        new_labels, similarities = _closest(vectors[self.num_vectors:], self.centroids)
+        if len(similarities) and 1.0 - float(similarities.mean()) > self.distance * (1.0 + max_drift):
+            return None
+
+        labels = np.empty(num_vectors, dtype=np.int32)
+        labels[self.rows] = np.repeat(np.arange(self.nlist, dtype=np.int32), np.diff(self.offsets))
+        labels[self.num_vectors:] = new_labels
+        rows, offsets = _lists(labels, self.nlist)
+        return IVFIndex(
+            self.centroids, rows, offsets, num_vectors,
+            trained_vectors=self.trained_vectors, distance=self.distance,
+        )
+
+    def matches(self, matrix: EmbeddingMatrix) -> bool:
+        """Whether this index was built over the current rows of ``matrix``."""
+        return (
+            self.num_vectors == matrix.vectors.shape[0]
+            and self.centroids.shape[1] == matrix.dim
+        )
+
+    def candidates(self, query: np.ndarray, nprobe: int) -> np.ndarray:
+        """Rows of the ``nprobe`` lists whose centroids are closest to ``query``."""
+        nprobe = max(1, min(nprobe, self.nlist))
+        centroid_scores = self.centroids @ normalize(query)
+        lists = np.argpartition(-centroid_scores, nprobe - 1)[:nprobe]
+        return np.concatenate([
+            self.rows[self.offsets[i]:self.offsets[i + 1]] for i in lists
+        ])
+
+    def search(
+        self,
+        matrix: EmbeddingMatrix,
+        query: np.ndarray,
+        top_k: int,
+        nprobe: int,
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """Approximate top-k: exact scores within the probed lists only."""
+        return matrix.search_rows(self.candidates(query, nprobe), query, top_k)
+
+    # ------------------------------------------------------------------ #
+    # Persistence
+    # ------------------------------------------------------------------ #
+
+    @staticmethod
+    def exists(storage_path: str) -> bool:
+        return os.path.exists(os.path.join(storage_path, ANN_DIRNAME, META_FILENAME))
+
+    @staticmethod
+    def remove(storage_path: str) -> None:
+        ann_path = os.path.join(storage_path, ANN_DIRNAME)
+        if os.path.exists(ann_path):
+            shutil.rmtree(ann_path)
+
+    def save(self, storage_path: str) -> None:
+        """Write the index to ``<storage_path>/ann``; metadata goes last."""
+        ann_path = os.path.join(storage_path, ANN_DIRNAME)
+        os.makedirs(ann_path, exist_ok=True)
+
+        np.save(os.path.join(ann_path, CENTROIDS_FILENAME), self.centroids)
+        np.save(os.path.join(ann_path, ROWS_FILENAME), self.rows)
+        np.save(os.path.join(ann_path, OFFSETS_FILENAME), self.offsets)
+
+        meta_path = os.path.join(ann_path, META_FILENAME)
+        with open(meta_path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump({
+                "format": IVF_FORMAT,
+                "type": "ivf",
+                "nlist": self.nlist,
+                "dim": int(self.centroids.shape[1]),
+                "num_vectors": self.num_vectors,
+                "trained_vectors": self.trained_vectors,
+                "distance": self.distance,
+            }, f)
+        os.replace(meta_path + ".tmp", meta_path)
+
+    @classmethod
+    def load(cls, storage_path: str) -> "IVFIndex":
+        """Open a saved index; the row list is memory-mapped."""
+        ann_path = os.path.join(storage_path, ANN_DIRNAME)
+        with open(os.path.join(ann_path, META_FILENAME), "r", encoding="utf-8") as f:
+            meta = json.load(f)
+
+        if meta.get("format") != IVF_FORMAT:
+            raise ValueError(f"Unsupported ANN index format in {storage_path}")
+
+        return cls(
+            np.load(os.path.join(ann_path, CENTROIDS_FILENAME)),
+            np.load(os.path.join(ann_path, ROWS_FILENAME), mmap_mode="r"),
+            np.load(os.path.join(ann_path, OFFSETS_FILENAME)),
+            meta["num_vectors"],
+            trained_vectors=meta.get("trained_vectors"),
+            distance=meta.get("distance"),
+        )
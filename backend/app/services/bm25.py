@@ -0,0 +1,270 @@
+"""Persisted BM25 keyword index over the nodes of a collection.
+
+Vector search is weak on exact tokens such as part numbers or error codes,
+so every collection also gets an inverted index built from its node texts at
+``create_collection_index`` time. Postings are stored term-major as flat
+arrays (``offsets`` into ``rows``/``tfs``), the way ``IVFIndex`` stores its
+lists, so a query only touches the postings of its own terms and the arrays
+are memory-mapped on load. The vocabulary and node ids are JSON.
+
+Nodes are consumed as a stream of ``(node_id, text)`` and their postings are
+accumulated in typed buffers, never as Python objects per posting. After an
+incremental re-index, ``update`` drops the postings of removed nodes and adds
+those of new nodes, so unchanged nodes are not tokenized again.
+
+Tokens are accent- and case-folded; compound tokens like ``ERR-1234`` or
+``v2.1`` are indexed both whole and split into their parts.
+"""
+
+import json
+import math
+import os
+import re
+import shutil
+import unicodedata
+from array import array
+from collections import Counter
+from typing import Iterable, List, Sequence, Tuple
+
+import numpy as np
+
+from app.services.embedding_matrix import top_k_rows
+
+BM25_DIRNAME = "bm25"
+META_FILENAME = "bm25.meta.json"
+VOCAB_FILENAME = "bm25_vocab.json"
+NODE_IDS_FILENAME = "bm25_node_ids.json"
+OFFSETS_FILENAME = "bm25_offsets.npy"
+ROWS_FILENAME = "bm25_rows.npy"
+TFS_FILENAME = "bm25_tfs.npy"
+LENGTHS_FILENAME = "bm25_lengths.npy"
+BM25_FORMAT = 1
+
+_TOKEN_RE = re.compile(r"\w+(?:[-./:]\w+)*")
+_PART_RE = re.compile(r"\w+")
+
+
+def tokenize(text: str) -> List[str]:
+    """Accent-folded, lower-case word tokens, compounds plus their parts."""
+    text = unicodedata.normalize("NFKD", text.casefold())
+    text = "".join(char for char in text if not unicodedata.combining(char))
+    tokens = []
+    for token in _TOKEN_RE.findall(text):
+        tokens.append(token)
+        parts = _PART_RE.findall(token)
+        if len(parts) > 1:
+            tokens.extend(parts)
+    return tokens
+
+
+class BM25Index:
+    """Okapi BM25 over an inverted index of node texts."""
+
+    def __init__(
+        self,
+        vocab: dict,
+        node_ids: List[str],
+        offsets: np.ndarray,
+        rows: np.ndarray,
+        tfs: np.ndarray,
+        lengths: np.ndarray,
+        k1: float = 1.2,
+        b: float = 0.75,
+    ):
+        self.vocab = vocab
+        self.node_ids = node_ids
+        self.offsets = offsets
+        self.rows = rows
+        self.tfs = tfs
+        self.lengths = lengths
+        self.k1 = k1
+        self.b = b
+        self.avg_length = float(lengths.mean()) if len(lengths) else 0.0
+
+    def __len__(self) -> int:
+        return len(self.node_ids)
+
+    @classmethod
+    def build(cls, nodes: Iterable[Tuple[str, str]], k1: float = 1.2, b: float = 0.75) -> "BM25Index":
+        """Index ``(node_id, text)`` pairs."""
+        vocab: dict = {}
+        node_ids, lengths, term_ids, rows, tfs = _postings(nodes, vocab, first_row=0)
+        return cls(vocab, node_ids, *_term_major(len(vocab), term_ids, rows, tfs), lengths, k1=k1, b=b)
+
+    def update(self, removed: Iterable[str], added: Iterable[Tuple[str, str]]) -> "BM25Index":
+        """New index without the ``removed`` node ids and with the ``added`` nodes.
+
+        Postings of the other nodes are kept as they are (with their rows
+        renumbered), so only the added texts are tokenized. Terms that no
+        longer occur stay in the vocabulary with empty postings until the
+        next full build.
+        """
+        removed = set(removed)
+        keep = np.asarray([node_id not in removed for node_id in self.node_ids], dtype=bool)
+        # New row of every kept old row
+        new_rows = np.cumsum(keep, dtype=np.int64) - 1
+
+        counts = np.diff(np.asarray(self.offsets, dtype=np.int64))
+        old_terms = np.repeat(np.arange(len(counts), dtype=np.int64), counts)
+        old_rows = np.asarray(self.rows)
+        kept = keep[old_rows]
+
+        vocab = dict(self.vocab)
+        num_kept = int(keep.sum())
+        added_ids, added_lengths, term_ids, rows, tfs = _postings(added, vocab, first_row=num_kept)
+        offsets, rows, tfs = _term_major(
+            len(vocab),
+            np.concatenate([old_terms[kept], term_ids]),
+            np.concatenate([new_rows[old_rows[kept]].astype(np.int32), rows]),
+            np.concatenate([np.asarray(self.tfs)[kept], tfs]),
+        )
+        return BM25Index(
+            vocab,
+            [node_id for node_id, kept_row in zip(self.node_ids, keep) if kept_row] + added_ids,
+            offsets,
+            rows,
+            tfs,
+            np.concatenate([np.asarray(self.lengths)[keep], added_lengths]),
+            k1=self.k1,
+            b=self.b,
+        )
+
+    def scores(self, query: str) -> np.ndarray:
+        """BM25 score of every node; -inf where no query term occurs."""
+        scores = np.zeros(len(self.node_ids), dtype=np.float32)
+        if not len(scores):
+            return scores
+
+        num_docs = len(scores)
+        for term in set(tokenize(query)):
+            term_id = self.vocab.get(term)
+            if term_id is None:
+                continue
+            start, end = self.offsets[term_id], self.offsets[term_id + 1]
+            rows = self.rows[start:end]
+            tfs = self.tfs[start:end]
+            df = end - start
+            idf = math.log(1 + (num_docs - df + 0.5) / (df + 0.5))
+            norm = self.k1 * (1 - self.b + self.b * self.lengths[rows] / self.avg_length)
+            # A term occurs once per row in its postings, so plain += is safe
+            scores[rows] += idf * tfs * (self.k1 + 1) / (tfs + norm)
+
+        scores[scores <= 0] = -np.inf
+        return scores
+
+    def search(self, query: str, top_k: int) -> Tuple[List[str], np.ndarray]:
+        """Node ids and scores of the ``top_k`` best matches, best first."""
+        scores = self.scores(query)
+        rows = top_k_rows(scores, top_k)
+        return [self.node_ids[row] for row in rows], scores[rows]
+
+    # ------------------------------------------------------------------ #
+    # Persistence
+    # ------------------------------------------------------------------ #
+
+    @staticmethod
+    def exists(storage_path: str) -> bool:
+        return os.path.exists(os.path.join(storage_path, BM25_DIRNAME, META_FILENAME))
+
+    @staticmethod
+    def remove(storage_path: str) -> None:
+        bm25_path = os.path.join(storage_path, BM25_DIRNAME)
+        if os.path.exists(bm25_path):
+            shutil.rmtree(bm25_path)
+
+    def save(self, storage_path: str) -> None:
+        """Write the index to ``<storage_path>/bm25``; metadata goes last."""
+        bm25_path = os.path.join(storage_path, BM25_DIRNAME)
+        os.makedirs(bm25_path, exist_ok=True)
+
+        terms: List[str] = [""] * len(self.vocab)
+        for term, term_id in self.vocab.items():
+            terms[term_id] = term
+        with open(os.path.join(bm25_path, VOCAB_FILENAME), "w", encoding="utf-8") as f:
+            json.dump(terms, f, ensure_ascii=False)
+        with open(os.path.join(bm25_path, NODE_IDS_FILENAME), "w", encoding="utf-8") as f:
+            json.dump(self.node_ids, f)
+
+        np.save(os.path.join(bm25_path, OFFSETS_FILENAME), self.offsets)
+        np.save(os.path.join(bm25_path, ROWS_FILENAME), self.rows)
+        np.save(os.path.join(bm25_path, TFS_FILENAME), self.tfs)
+        np.save(os.path.join(bm25_path, LENGTHS_FILENAME), self.lengths)
+
+        meta_path = os.path.join(bm25_path, META_FILENAME)
+        with open(meta_path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump({
+                "format": BM25_FORMAT,
+                "num_nodes": len(self.node_ids),
+                "num_terms": len(self.vocab),
+                "k1": self.k1,
+                "b": self.b,
+            }, f)
+        os.replace(meta_path + ".tmp", meta_path)
+
+    @classmethod
+    def load(cls, storage_path: str) -> "BM25Index":
+        """Open a saved index; the postings are memory-mapped."""
+        bm25_path = os.path.join(storage_path, BM25_DIRNAME)
+        with open(os.path.join(bm25_path, META_FILENAME), "r", encoding="utf-8") as f:
+            meta = json.load(f)
+
+        if meta.get("format") != BM25_FORMAT:
+            raise ValueError(f"Unsupported BM25 index format in {storage_path}")
+
+        with open(os.path.join(bm25_path, VOCAB_FILENAME), "r", encoding="utf-8") as f:
+            vocab = {term: term_id for term_id, term in enumerate(json.load(f))}
+        with open(os.path.join(bm25_path, NODE_IDS_FILENAME), "r", encoding="utf-8") as f:
+            node_ids = json.load(f)
+
+        return cls(
+            vocab,
+            node_ids,
+            np.load(os.path.join(bm25_path, OFFSETS_FILENAME)),
+            np.load(os.path.join(bm25_path, ROWS_FILENAME), mmap_mode="r"),
+            np.load(os.path.join(bm25_path, TFS_FILENAME), mmap_mode="r"),
+            np.load(os.path.join(bm25_path, LENGTHS_FILENAME)),
+            k1=meta["k1"],
+            b=meta["b"],
+        )
+
+
+def _postings(nodes: Iterable[Tuple[str, str]], vocab: dict, first_row: int):
+    """Tokenize a stream of nodes into row-major posting arrays, extending ``vocab``."""
+    node_ids: List[str] = []
+    lengths = array("f")
+    term_ids = array("q")
+    rows = array("i")
+    tfs = array("f")
+
+    for row, (node_id, text) in enumerate(nodes, start=first_row):
+        counts = Counter(tokenize(text))
+        node_ids.append(node_id)
+        lengths.append(sum(counts.values()))
+        for term, tf in counts.items():
+            term_ids.append(vocab.setdefault(term, len(vocab)))
+            rows.append(row)
+            tfs.append(tf)
+
+    return (
+        node_ids,
+        np.frombuffer(lengths, dtype=np.float32),
+        np.frombuffer(term_ids, dtype=np.int64),
+        np.frombuffer(rows, dtype=np.int32),
+        np.frombuffer(tfs, dtype=np.float32),
+    )
+
+
+def _term_major(num_terms: int, term_ids: np.ndarray, rows: np.ndarray, tfs: np.ndarray):
+    """Sort postings by term (stable, so rows stay ascending) into ``offsets``/``rows``/``tfs``."""
+    order = np.argsort(term_ids, kind="stable")
+    offsets = np.concatenate([[0], np.cumsum(np.bincount(term_ids, minlength=num_terms))]).astype(np.int64)
+    return offsets, rows[order], tfs[order]
+
+
+def reciprocal_rank_fusion(rankings: Sequence[Sequence[str]], k: int = 60) -> List[Tuple[str, float]]:
+    """Fuse ranked id lists: score(id) = sum of 1 / (k + rank), best first."""
+    fused: dict = {}
+    for ranking in rankings:
+        for rank, node_id in enumerate(ranking, start=1):
+            fused[node_id] = fused.get(node_id, 0.0) + 1.0 / (k + rank)
+    return sorted(fused.items(), key=lambda item: item[1], reverse=True)
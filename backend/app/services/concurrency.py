@@ -0,0 +1,158 @@
+"""Concurrency limiting with a bounded wait queue for LLM calls.
+
+At most ``max_concurrent`` generations run against Ollama at once; up to
+``max_queue`` further requests wait for a slot. When the queue is full, or a
+request waited longer than ``queue_timeout``, ``QueueFullError`` is raised so
+the API can answer 429 with a ``Retry-After`` estimate instead of piling
+requests onto a saturated model server.
+"""
+
+import asyncio
+import math
+import time
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Dict, Optional
+
+# Weight of the newest sample in the moving average of slot hold time
+EWMA_ALPHA = 0.2
+
+
+class QueueFullError(Exception):
+    """No generation slot available; retry after ``retry_after`` seconds."""
+
+    def __init__(self, retry_after: int):
+        super().__init__(f"Request queue is full, retry after {retry_after}s")
+        self.retry_after = retry_after
+
+
+class ConcurrencyLimiter:
+    """Async semaphore with a bounded number of waiters."""
+
+    def __init__(self, max_concurrent: int, max_queue: int, queue_timeout: float):
+        self.max_concurrent = max_concurrent
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self._semaphore = asyncio.Semaphore(max_concurrent)
+        self._active = 0
+        self._waiting = 0
+        self._avg_seconds = 5.0
+        self.rejected = 0
+        self.completed = 0
+
+    def _retry_after(self) -> int:
+        # Time for the current queue to drain through the available slots
+        backlog = (self._waiting + 1) / self.max_concurrent
+        return max(1, math.ceil(self._avg_seconds * backlog))
+
+    async def acquire(self) -> float:
+        """Wait for a slot and return its start time (pass it to ``release``).
+
+        Raises QueueFullError if the queue is full or the wait timed out.
+        """
+        # Counted here rather than via the semaphore, which only sees waiters
+        # once their acquire task has actually run
+        if self._active + self._waiting >= self.max_concurrent + self.max_queue:
+            self.rejected += 1
+            raise QueueFullError(self._retry_after())
+
+        # The acquire runs as its own task: with wait_for, a permit granted at
+        # the moment the timeout (or a cancellation) fires would be lost
+        self._waiting += 1
+        acquire = asyncio.ensure_future(self._semaphore.acquire())
+        try:
+            done, _ = await asyncio.wait({acquire}, timeout=self.queue_timeout)
+        except BaseException:
+            self._abandon(acquire)
+            raise
+        finally:
+            self._waiting -= 1
+
+        if not done:
+            self._abandon(acquire)
+            self.rejected += 1
+            raise QueueFullError(self._retry_after())
+
+        acquire.result()
+        self._active += 1
+        return time.monotonic()
+
+    def _abandon(self, acquire: "asyncio.Future[bool]") -> None:
+        """Cancel a pending acquire; give the permit back if it got one anyway."""
+        acquire.cancel()
+        acquire.add_done_callback(self._release_if_acquired)
+
+    def _release_if_acquired(self, acquire: "asyncio.Future[bool]") -> None:
+        if not acquire.cancelled() and acquire.exception() is None:
+            self._semaphore.release()
+
+    def release(self, started: float) -> None:
+        """Give back a slot obtained with ``acquire``."""
+        elapsed = time.monotonic() - started
+        self._avg_seconds += EWMA_ALPHA * (elapsed - self._avg_seconds)
+        self._active -= 1
+        self.completed += 1
+        self._semaphore.release()
+
+    @asynccontextmanager
+    async def slot(self) -> AsyncIterator[None]:
+        """Hold one generation slot for the duration of the block."""
+        started = await self.acquire()
+        try:
+            yield
+        finally:
+            self.release(started)
+
+    def stream(self, started: float, events: AsyncIterator[Any]) -> "SlotStream":
+        """Wrap ``events`` so the slot from ``acquire`` is released with it."""
+        return SlotStream(self, started, events)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "max_concurrent": self.max_concurrent,
+            "max_queue": self.max_queue,
+            "active": self._active,
+            "waiting": self._waiting,
+            "completed": self.completed,
+            "rejected": self.rejected,
+            "avg_seconds": self._avg_seconds,
+        }
+
+
+class SlotStream:
+    """Async iterator holding a generation slot until it ends or is closed.
+
+    The slot is taken before the stream is returned (so a full queue can
+    still become a 429), which means the wrapped generator may never start:
+    a client that disconnects early never runs its ``finally``. The slot is
+    therefore released, once, whichever happens first: the events end or
+    fail, ``aclose`` is called, or the stream is garbage collected.
+    """
+
+    def __init__(self, limiter: ConcurrencyLimiter, started: float, events: AsyncIterator[Any]):
+        self._limiter: Optional[ConcurrencyLimiter] = limiter
+        self._started = started
+        self._events = events
+
+    def __aiter__(self) -> "SlotStream":
+        return self
+
+    async def __anext__(self) -> Any:
+        try:
+            return await self._events.__anext__()
+        except BaseException:
+            self.release()
+            raise
+
+    async def aclose(self) -> None:
+        try:
+            await self._events.aclose()
+        finally:
+            self.release()
+
+    def release(self) -> None:
+        limiter, self._limiter = self._limiter, None
+        if limiter is not None:
+            limiter.release(self._started)
+
+    def __del__(self) -> None:
+        self.release()
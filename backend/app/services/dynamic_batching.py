@@ -0,0 +1,161 @@
+"""Dynamic batching of concurrent embedding requests.
+
+On a CPU-only host a transformer embeds a batch of short texts in little
+more time than a single one, but every API request embeds just one query.
+``DynamicBatchingEmbedding`` holds the first request of a batch for at most
+``max_wait`` seconds so that concurrent requests can join it (up to
+``max_batch_size``), then embeds them all in one forward pass on a
+background thread and hands each caller its own vector. Calls that already
+pass a list of texts (indexing) go straight to the wrapped model.
+"""
+
+import asyncio
+import threading
+import time
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from llama_index.core.base.embeddings.base import BaseEmbedding, Embedding
+from llama_index.core.bridge.pydantic import Field, PrivateAttr
+
+
+class DynamicBatcher:
+    """Groups single-item calls from many threads into calls of ``fn`` on a list."""
+
+    def __init__(
+        self,
+        fn: Callable[[List[Any]], List[Any]],
+        max_batch_size: int = 32,
+        max_wait: float = 0.005,
+        name: str = "dynamic-batcher",
+    ):
+        self.fn = fn
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self.name = name
+        self._pending: List[Tuple[Any, Future]] = []
+        self._cond = threading.Condition()
+        self._thread: Optional[threading.Thread] = None
+        self._stats = {"items": 0, "batches": 0, "seconds": 0.0}
+
+    def submit(self, item: Any) -> Future:
+        """Queue ``item``; the future resolves to ``fn``'s result for it."""
+        future: Future = Future()
+        with self._cond:
+            self._pending.append((item, future))
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+                self._thread.start()
+            self._cond.notify()
+        return future
+
+    def __call__(self, item: Any) -> Any:
+        return self.submit(item).result()
+
+    def _next_batch(self) -> List[Tuple[Any, Future]]:
+        with self._cond:
+            while not self._pending:
+                self._cond.wait()
+            # Give concurrent callers a short window to join the batch
+            deadline = time.monotonic() + self.max_wait
+            while len(self._pending) < self.max_batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+            batch = self._pending[:self.max_batch_size]
+            del self._pending[:self.max_batch_size]
+            return batch
+
+    def _run(self) -> None:
+        while True:
+            # Skip callers that gave up (e.g. a cancelled request) meanwhile
+            batch = [
+                (item, future) for item, future in self._next_batch()
+                if future.set_running_or_notify_cancel()
+            ]
+            if not batch:
+                continue
+            start = time.perf_counter()
+            try:
+                results = self.fn([item for item, _ in batch])
+            except BaseException as e:
+                for _, future in batch:
+                    future.set_exception(e)
+                continue
+
+            for (_, future), result in zip(batch, results):
+                future.set_result(result)
+            with self._cond:
+                self._stats["items"] += len(batch)
+                self._stats["batches"] += 1
+                self._stats["seconds"] += time.perf_counter() - start
+
+    def stats(self) -> Dict[str, float]:
+        with self._cond:
+            batches = self._stats["batches"]
+            return dict(
+                self._stats,
+                pending=len(self._pending),
+                mean_batch_size=self._stats["items"] / batches if batches else 0.0,
+            )
+
+
+class DynamicBatchingEmbedding(BaseEmbedding):
+    """Embedding model that batches concurrent single-text calls.
+
+    ``query_batch_fn`` embeds a list of queries in one call; models without
+    a batched query API (e.g. ones that prepend a query instruction per
+    text) fall back to embedding queries one at a time on the batch thread.
+    """
+
+    embed_model: BaseEmbedding = Field(description="The wrapped embedding model.")
+    max_batch_size: int = Field(default=32, gt=0)
+    max_wait: float = Field(default=0.005, ge=0, description="Seconds a batch waits for more requests.")
+
+    _texts: DynamicBatcher = PrivateAttr()
+    _queries: DynamicBatcher = PrivateAttr()
+
+    def __init__(
+        self,
+        embed_model: BaseEmbedding,
+        query_batch_fn: Optional[Callable[[List[str]], List[Embedding]]] = None,
+        **kwargs: Any,
+    ):
+        kwargs.setdefault("embed_batch_size", embed_model.embed_batch_size)
+        super().__init__(embed_model=embed_model, model_name=embed_model.model_name, **kwargs)
+        if query_batch_fn is None:
+            def query_batch_fn(queries: List[str]) -> List[Embedding]:
+                return [embed_model.get_query_embedding(query) for query in queries]
+
+        self._texts = DynamicBatcher(
+            embed_model.get_text_embedding_batch, self.max_batch_size, self.max_wait, name="embed-texts"
+        )
+        self._queries = DynamicBatcher(
+            query_batch_fn, self.max_batch_size, self.max_wait, name="embed-queries"
+        )
+
+    @classmethod
+    def class_name(cls) -> str:
+        return "DynamicBatchingEmbedding"
+
+    def stats(self) -> Dict[str, Dict[str, float]]:
+        return {"texts": self._texts.stats(), "queries": self._queries.stats()}
+
+    def _get_query_embedding(self, query: str) -> Embedding:
+        return self._queries(query)
+
+    def _get_text_embedding(self, text: str) -> Embedding:
+        return self._texts(text)
+
+    def _get_text_embeddings(self, texts: List[str]) -> List[Embedding]:
+        return self.embed_model.get_text_embedding_batch(texts)
+
+    async def _aget_query_embedding(self, query: str) -> Embedding:
+        return await asyncio.wrap_future(self._queries.submit(query))
+
+    async def _aget_text_embedding(self, text: str) -> Embedding:
+        return await asyncio.wrap_future(self._texts.submit(text))
+
+    async def _aget_text_embeddings(self, texts: List[str]) -> List[Embedding]:
+        return await asyncio.to_thread(self._get_text_embeddings, texts)
@@ -0,0 +1,295 @@
+"""Persistent, content-addressed embedding cache shared across collections.
+
+Embeddings are stored in SQLite keyed by (model, SHA-256 of the normalized
+chunk text), so the same chunk uploaded to several collections, or indexed
+again after a rebuild, is embedded once per model (the ingestion pipeline
+keeps the file's storage path and collection out of the embedded text for
+this). The database is opened in WAL mode and is safe to share between the
+API process and indexing workers; lookups only take a read transaction.
+
+The cache is bounded by ``max_bytes``: once exceeded, least-recently-used
+entries are evicted down to ``EVICTION_TARGET`` of the budget. The model is
+part of the key, so a different embedding model never sees another model's
+vectors; ``retain_model`` additionally drops the entries of models that are
+no longer configured. Hit and miss counters are kept in the database so
+they cover every process using the cache.
+"""
+
+import asyncio
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+import unicodedata
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+from llama_index.core.base.embeddings.base import BaseEmbedding, Embedding
+from llama_index.core.bridge.pydantic import Field, PrivateAttr
+
+EVICTION_TARGET = 0.9
+# Per-row overhead (key, model reference, timestamps, b-tree) in the size estimate
+ROW_OVERHEAD = 64
+# SQLite's default limit on bound parameters is 999
+MAX_PARAMS = 900
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS embeddings (
+    model TEXT NOT NULL,
+    key BLOB NOT NULL,
+    vector BLOB NOT NULL,
+    size INTEGER NOT NULL,
+    last_used REAL NOT NULL,
+    UNIQUE (model, key)
+);
+CREATE INDEX IF NOT EXISTS embeddings_last_used ON embeddings (last_used);
+CREATE TABLE IF NOT EXISTS counters (
+    name TEXT PRIMARY KEY,
+    value INTEGER NOT NULL
+);
+INSERT OR IGNORE INTO counters (name, value) VALUES ('bytes', 0), ('hits', 0), ('misses', 0), ('evictions', 0);
+"""
+
+
+def normalize_text(text: str) -> str:
+    """Unicode NFC with runs of whitespace collapsed, so trivial differences hit."""
+    return " ".join(unicodedata.normalize("NFC", text).split())
+
+
+def text_key(text: str) -> bytes:
+    return hashlib.sha256(normalize_text(text).encode("utf-8")).digest()
+
+
+def model_key(embed_model: BaseEmbedding) -> str:
+    """Cache namespace of an embedding model, e.g. ``OllamaEmbedding:nomic-embed-text``."""
+    return f"{embed_model.class_name()}:{embed_model.model_name}"
+
+
+class EmbeddingCache:
+    """SQLite-backed embedding store with LRU eviction by size."""
+
+    def __init__(self, path: str, max_bytes: int = 0):
+        self.path = path
+        self.max_bytes = max_bytes
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(SCHEMA)
+        self._lock = threading.Lock()
+
+    def _add_counters(self, **amounts: int) -> None:
+        for name, amount in amounts.items():
+            if amount:
+                self._conn.execute("UPDATE counters SET value = value + ? WHERE name = ?", (amount, name))
+
+    def get_many(self, model: str, texts: Sequence[str]) -> List[Optional[Embedding]]:
+        """Cached embeddings in ``texts`` order, ``None`` for misses."""
+        keys = [text_key(text) for text in texts]
+        found: Dict[bytes, Embedding] = {}
+        now = time.time()
+
+        with self._lock:
+            # Lookups run in a deferred (read) transaction, so concurrent
+            # readers never wait on each other or on a writer under WAL
+            self._conn.execute("BEGIN")
+            try:
+                unique = list(dict.fromkeys(keys))
+                for start in range(0, len(unique), MAX_PARAMS):
+                    chunk = unique[start:start + MAX_PARAMS]
+                    marks = ",".join("?" * len(chunk))
+                    rows = self._conn.execute(
+                        f"SELECT key, vector FROM embeddings WHERE model = ? AND key IN ({marks})",
+                        (model, *chunk),
+                    ).fetchall()
+                    for key, vector in rows:
+                        found[key] = np.frombuffer(vector, dtype=np.float32).tolist()
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+
+            results = [found.get(key) for key in keys]
+            hits = sum(result is not None for result in results)
+
+            # LRU timestamps and counters: one short write afterwards
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                hit_keys = list(found)
+                for start in range(0, len(hit_keys), MAX_PARAMS):
+                    chunk = hit_keys[start:start + MAX_PARAMS]
+                    self._conn.execute(
+                        f"UPDATE embeddings SET last_used = ? WHERE model = ? AND key IN ({','.join('?' * len(chunk))})",
+                        (now, model, *chunk),
+                    )
+                self._add_counters(hits=hits, misses=len(results) - hits)
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+
+        return results
+
+    def put_many(self, model: str, texts: Sequence[str], embeddings: Sequence[Embedding]) -> None:
+        """Store embeddings, then evict if the byte budget is exceeded."""
+        now = time.time()
+        rows = {}
+        for text, embedding in zip(texts, embeddings):
+            vector = np.asarray(embedding, dtype=np.float32).tobytes()
+            rows[text_key(text)] = (vector, len(vector) + ROW_OVERHEAD)
+
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                added = 0
+                for key, (vector, size) in rows.items():
+                    cursor = self._conn.execute(
+                        "INSERT OR IGNORE INTO embeddings (model, key, vector, size, last_used) VALUES (?, ?, ?, ?, ?)",
+                        (model, key, vector, size, now),
+                    )
+                    if cursor.rowcount:
+                        added += size
+                self._add_counters(bytes=added)
+                if self.max_bytes:
+                    self._evict(int(self.max_bytes * EVICTION_TARGET))
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def _counter(self, name: str) -> int:
+        return self._conn.execute("SELECT value FROM counters WHERE name = ?", (name,)).fetchone()[0]
+
+    def _evict(self, target_bytes: int) -> None:
+        # Called inside a write transaction
+        total = self._counter("bytes")
+        if total <= self.max_bytes:
+            return
+
+        victims, freed = [], 0
+        for rowid, size in self._conn.execute("SELECT rowid, size FROM embeddings ORDER BY last_used"):
+            if total - freed <= target_bytes:
+                break
+            victims.append(rowid)
+            freed += size
+
+        for start in range(0, len(victims), MAX_PARAMS):
+            chunk = victims[start:start + MAX_PARAMS]
+            self._conn.execute(f"DELETE FROM embeddings WHERE rowid IN ({','.join('?' * len(chunk))})", chunk)
+        self._add_counters(bytes=-freed, evictions=len(victims))
+
+    def retain_model(self, model: str) -> int:
+        """Drop entries of other models in the same namespace (class) as ``model``.
+
+        Called when the configured model is set up, so switching models frees
+        the old vectors instead of leaving them to age out.
+        """
+        namespace = model.split(":", 1)[0] + ":"
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                stale = "substr(model, 1, length(?)) = ? AND model != ?"
+                params = (namespace, namespace, model)
+                removed, size = self._conn.execute(
+                    f"SELECT COUNT(*), COALESCE(SUM(size), 0) FROM embeddings WHERE {stale}", params
+                ).fetchone()
+                if removed:
+                    self._conn.execute(f"DELETE FROM embeddings WHERE {stale}", params)
+                    self._add_counters(bytes=-size)
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+        return removed
+
+    def clear(self) -> None:
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            self._conn.execute("DELETE FROM embeddings")
+            self._conn.execute("UPDATE counters SET value = 0")
+            self._conn.execute("COMMIT")
+
+    def stats(self) -> Dict[str, Any]:
+        """Usage and hit rate across every process sharing the cache."""
+        with self._lock:
+            counters = dict(self._conn.execute("SELECT name, value FROM counters").fetchall())
+            models = dict(self._conn.execute("SELECT model, COUNT(*) FROM embeddings GROUP BY model").fetchall())
+        lookups = counters["hits"] + counters["misses"]
+        return {
+            "path": self.path,
+            "entries": sum(models.values()),
+            "models": models,
+            "bytes": counters["bytes"],
+            "max_bytes": self.max_bytes,
+            "hits": counters["hits"],
+            "misses": counters["misses"],
+            "evictions": counters["evictions"],
+            "hit_rate": counters["hits"] / lookups if lookups else 0.0,
+        }
+
+
+class CachedEmbedding(BaseEmbedding):
+    """Embedding model that looks chunks up in an ``EmbeddingCache`` first.
+
+    Only texts missing from the cache reach the wrapped model. Query
+    embeddings are passed through uncached.
+    """
+
+    embed_model: BaseEmbedding = Field(description="The wrapped embedding model.")
+
+    _cache: EmbeddingCache = PrivateAttr()
+    _model_key: str = PrivateAttr()
+
+    def __init__(self, embed_model: BaseEmbedding, cache: EmbeddingCache, **kwargs: Any):
+        kwargs.setdefault("embed_batch_size", embed_model.embed_batch_size)
+        super().__init__(embed_model=embed_model, model_name=embed_model.model_name, **kwargs)
+        self._cache = cache
+        self._model_key = model_key(embed_model)
+
+    @classmethod
+    def class_name(cls) -> str:
+        return "CachedEmbedding"
+
+    @property
+    def cache(self) -> EmbeddingCache:
+        return self._cache
+
+    def _get_text_embeddings(self, texts: List[str]) -> List[Embedding]:
+        results = self._cache.get_many(self._model_key, texts)
+        missing = list(dict.fromkeys(text for text, result in zip(texts, results) if result is None))
+
+        if missing:
+            computed = dict(zip(missing, self.embed_model.get_text_embedding_batch(missing)))
+            self._cache.put_many(self._model_key, missing, [computed[text] for text in missing])
+            results = [computed[text] if result is None else result for text, result in zip(texts, results)]
+
+        return results
+
+    def _get_text_embedding(self, text: str) -> Embedding:
+        return self._get_text_embeddings([text])[0]
+
+    def _get_query_embedding(self, query: str) -> Embedding:
+        return self.embed_model.get_query_embedding(query)
+
+    async def _aget_text_embeddings(self, texts: List[str]) -> List[Embedding]:
+        return await asyncio.to_thread(self._get_text_embeddings, texts)
+
+    async def _aget_text_embedding(self, text: str) -> Embedding:
+        return await asyncio.to_thread(self._get_text_embedding, text)
+
+    async def _aget_query_embedding(self, query: str) -> Embedding:
+        return await self.embed_model.aget_query_embedding(query)
+
+
+_cache: Optional[EmbeddingCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_embedding_cache(path: str, max_bytes: int = 0) -> EmbeddingCache:
+    """Process-wide cache instance, opened on first use."""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = EmbeddingCache(path, max_bytes)
+        return _cache
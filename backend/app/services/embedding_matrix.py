@@ -0,0 +1,138 @@
+"""Vectorized brute-force similarity search over an embedding matrix.
+
+All embeddings of a collection are held as one L2-normalized matrix, so the
+cosine similarity against a query is a single matrix-vector product (or a
+matrix-matrix product for a batch of queries) and the top-k rows are selected
+with ``argpartition`` instead of a full sort.
+"""
+
+from typing import Callable, Iterable, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+
+# Rows scored per block when the matrix has to be upcast (float16)
+SCORE_BLOCK_ROWS = 65536
+
+
+def normalize(vectors: np.ndarray) -> np.ndarray:
+    """Return ``vectors`` scaled to unit L2 norm along the last axis."""
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+def top_k_rows(scores: np.ndarray, top_k: int) -> np.ndarray:
+    """Indices of the ``top_k`` highest finite scores, best first."""
+    if top_k <= 0 or scores.size == 0:
+        return np.empty(0, dtype=np.int64)
+
+    if top_k < scores.size:
+        candidates = np.argpartition(-scores, top_k - 1)[:top_k]
+    else:
+        candidates = np.arange(scores.size)
+
+    ranked = candidates[np.argsort(-scores[candidates], kind="stable")]
+    return ranked[np.isfinite(scores[ranked])]
+
+
+class EmbeddingMatrix:
+    """Normalized embedding matrix of a collection with top-k search.
+
+    ``node_ids`` is either a sequence aligned with the matrix rows or a
+    callable mapping a row to its node id, so stores that decode ids lazily
+    (like the mmap store) only pay for the rows a query returns. Rows listed in
+    ``deleted`` never show up in results.
+    """
+
+    def __init__(
+        self,
+        vectors: np.ndarray,
+        node_ids: Union[Sequence[str], Callable[[int], str]],
+        deleted: Optional[Iterable[int]] = None,
+        normalized: bool = False,
+    ):
+        self.vectors = vectors if normalized else normalize(vectors)
+        self._node_id = node_ids if callable(node_ids) else node_ids.__getitem__
+        deleted = sorted(deleted) if deleted else []
+        self._deleted = np.asarray(deleted, dtype=np.int64) if deleted else None
+
+    def __len__(self) -> int:
+        deleted = 0 if self._deleted is None else len(self._deleted)
+        return self.vectors.shape[0] - deleted
+
+    @property
+    def dim(self) -> int:
+        return self.vectors.shape[1]
+
+    @property
+    def deleted(self) -> Optional[np.ndarray]:
+        """Sorted deleted rows, or None."""
+        return self._deleted
+
+    @property
+    def nbytes(self) -> int:
+        return self.vectors.nbytes
+
+    @property
+    def resident_bytes(self) -> int:
+        """Bytes held in process memory; memory-mapped rows are not counted.
+
+        Neither are the zero rows of a store without float vectors, which are
+        a broadcast view of a single row.
+        """
+        if isinstance(self.vectors, np.memmap) or (self.vectors.size and self.vectors.strides[0] == 0):
+            return 0
+        return self.vectors.nbytes
+
+    def node_ids(self, rows: Iterable[int]) -> List[str]:
+        """Map matrix rows to node ids."""
+        return [self._node_id(int(row)) for row in rows]
+
+    def scores(self, queries: np.ndarray) -> np.ndarray:
+        """Cosine similarity of each query against every row, shape (m, n)."""
+        queries = normalize(np.atleast_2d(queries))
+
+        if self.vectors.dtype == np.float32:
+            scores = queries @ self.vectors.T
+        else:
+            # Upcast block by block instead of materializing a float32 copy
+            scores = np.empty((queries.shape[0], self.vectors.shape[0]), dtype=np.float32)
+            for start in range(0, self.vectors.shape[0], SCORE_BLOCK_ROWS):
+                block = np.asarray(self.vectors[start:start + SCORE_BLOCK_ROWS], dtype=np.float32)
+                scores[:, start:start + len(block)] = queries @ block.T
+
+        if self._deleted is not None:
+            scores[:, self._deleted] = -np.inf
+        return scores
+
+    def search(self, query: np.ndarray, top_k: int) -> Tuple[np.ndarray, np.ndarray]:
+        """Return ``(rows, scores)`` of the ``top_k`` rows closest to ``query``."""
+        return self.search_batch(np.atleast_2d(query), top_k)[0]
+
+    def search_batch(
+        self, queries: np.ndarray, top_k: int
+    ) -> List[Tuple[np.ndarray, np.ndarray]]:
+        """Score several queries with one matrix product and select top-k each."""
+        scores = self.scores(queries)
+        results = []
+        for query_scores in scores:
+            rows = top_k_rows(query_scores, top_k)
+            results.append((rows, query_scores[rows]))
+        return results
+
+    def search_rows(
+        self, rows: np.ndarray, query: np.ndarray, top_k: int
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """Exact top-k restricted to a candidate set of ``rows``."""
+        rows = np.sort(np.asarray(rows, dtype=np.int64))
+        if self._deleted is not None:
+            rows = rows[~np.isin(rows, self._deleted)]
+        if rows.size == 0:
+            return rows, np.empty(0, dtype=np.float32)
+
+        query = normalize(query)
+        candidates = np.asarray(self.vectors[rows], dtype=np.float32)
+        scores = candidates @ query
+        best = top_k_rows(scores, top_k)
+        return rows[best], scores[best]
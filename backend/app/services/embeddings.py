@@ -0,0 +1,154 @@
+"""Batched, concurrent Ollama embeddings.
+
+``OllamaEmbedding`` sends one HTTP request per chunk and waits for each, so
+indexing throughput is bounded by request latency. ``BatchedOllamaEmbedding``
+sends ``batch_size`` chunks per request to ``/api/embed`` and keeps up to
+``max_concurrency`` requests in flight over a pooled ``requests.Session``.
+Transient failures (connection errors, timeouts, 429/5xx) are retried with
+exponential backoff and jitter. Servers without ``/api/embed`` (Ollama older
+than 0.3) fall back to the per-text ``/api/embeddings`` endpoint.
+"""
+
+import asyncio
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional
+
+import requests
+from llama_index.core.base.embeddings.base import BaseEmbedding, Embedding
+from llama_index.core.bridge.pydantic import Field, PrivateAttr
+from requests.adapters import HTTPAdapter
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+class BatchedOllamaEmbedding(BaseEmbedding):
+    """Ollama embeddings sent in batches with several requests in flight."""
+
+    base_url: str = Field(default="http://localhost:11434")
+    batch_size: int = Field(default=32, gt=0, description="Chunks per HTTP request.")
+    max_concurrency: int = Field(default=4, gt=0, description="Requests in flight.")
+    max_retries: int = Field(default=3, ge=0)
+    backoff_seconds: float = Field(default=0.5, ge=0)
+    request_timeout: float = Field(default=60.0)
+    legacy_endpoint: bool = Field(
+        default=False, description="Use the per-text /api/embeddings endpoint."
+    )
+    keep_alive: Optional[str] = Field(
+        default=None, description="How long Ollama keeps the model loaded (e.g. '30m', '-1')."
+    )
+
+    _session: requests.Session = PrivateAttr()
+    _executor: Optional[ThreadPoolExecutor] = PrivateAttr(default=None)
+    _lock: threading.Lock = PrivateAttr()
+    _legacy: bool = PrivateAttr(default=False)
+    _stats: Dict[str, float] = PrivateAttr()
+
+    def __init__(self, model_name: str, **kwargs: Any):
+        batch_size = kwargs.get("batch_size", 32)
+        max_concurrency = kwargs.get("max_concurrency", 4)
+        # Each flush from BaseEmbedding must be large enough to fill every slot
+        kwargs.setdefault("embed_batch_size", batch_size * max_concurrency)
+        super().__init__(model_name=model_name, **kwargs)
+
+        self._session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.max_concurrency)
+        self._session.mount("http://", adapter)
+        self._session.mount("https://", adapter)
+        self._lock = threading.Lock()
+        self._legacy = self.legacy_endpoint
+        self._stats = {"chunks": 0, "requests": 0, "retries": 0, "seconds": 0.0}
+
+    @classmethod
+    def class_name(cls) -> str:
+        return "BatchedOllamaEmbedding"
+
+    def _pool(self) -> ThreadPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self.max_concurrency, thread_name_prefix="embed"
+                )
+            return self._executor
+
+    def _count(self, key: str, amount: float = 1) -> None:
+        with self._lock:
+            self._stats[key] += amount
+
+    def _post(self, path: str, payload: Dict[str, Any]) -> Dict[str, Any]:
+        """POST with retries on transient failures."""
+        attempt = 0
+        while True:
+            try:
+                self._count("requests")
+                response = self._session.post(
+                    f"{self.base_url}{path}", json=payload, timeout=self.request_timeout
+                )
+                if response.status_code not in RETRY_STATUSES or attempt >= self.max_retries:
+                    response.raise_for_status()
+                    return response.json()
+            except (requests.ConnectionError, requests.Timeout):
+                if attempt >= self.max_retries:
+                    raise
+
+            self._count("retries")
+            time.sleep(self.backoff_seconds * 2 ** attempt * (0.5 + random.random()))
+            attempt += 1
+
+    def _payload(self, **fields: Any) -> Dict[str, Any]:
+        payload = {"model": self.model_name, **fields}
+        if self.keep_alive is not None:
+            payload["keep_alive"] = self.keep_alive
+        return payload
+
+    def _embed_batch(self, texts: List[str]) -> List[Embedding]:
+        if not self._legacy:
+            try:
+                result = self._post("/api/embed", self._payload(input=texts))
+                return result["embeddings"]
+            except requests.HTTPError as e:
+                if e.response is None or e.response.status_code != 404:
+                    raise
+                self._legacy = True
+
+        return [
+            self._post("/api/embeddings", self._payload(prompt=text))["embedding"]
+            for text in texts
+        ]
+
+    def _get_text_embeddings(self, texts: List[str]) -> List[Embedding]:
+        start = time.perf_counter()
+        batches = [texts[i:i + self.batch_size] for i in range(0, len(texts), self.batch_size)]
+
+        if len(batches) == 1:
+            results = [self._embed_batch(batches[0])]
+        else:
+            results = list(self._pool().map(self._embed_batch, batches))
+
+        self._count("chunks", len(texts))
+        self._count("seconds", time.perf_counter() - start)
+        return [embedding for batch in results for embedding in batch]
+
+    def _get_text_embedding(self, text: str) -> Embedding:
+        return self._get_text_embeddings([text])[0]
+
+    def _get_query_embedding(self, query: str) -> Embedding:
+        return self._get_text_embedding(query)
+
+    async def _aget_text_embeddings(self, texts: List[str]) -> List[Embedding]:
+        return await asyncio.to_thread(self._get_text_embeddings, texts)
+
+    async def _aget_text_embedding(self, text: str) -> Embedding:
+        return await asyncio.to_thread(self._get_text_embedding, text)
+
+    async def _aget_query_embedding(self, query: str) -> Embedding:
+        return await asyncio.to_thread(self._get_query_embedding, query)
+
+    def stats(self) -> Dict[str, float]:
+        """Totals since creation, including throughput in chunks per second."""
+        with self._lock:
+            stats = dict(self._stats)
+        stats["chunks_per_sec"] = stats["chunks"] / stats["seconds"] if stats["seconds"] else 0.0
+        return stats
@@ -0,0 +1,130 @@
+"""Bounded LRU cache for loaded collection indexes.
+
+Entries are evicted least-recently-used first once either the entry limit or
+the byte budget is exceeded. Sizes are estimates supplied by the caller when
+an entry is stored. Hit, miss and eviction counters are kept for the stats
+endpoint.
+"""
+
+import os
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, List, Optional
+
+# Approximate ratio between JSON index files on disk and the loaded Python objects
+JSON_MEMORY_FACTOR = 3
+
+
+def estimate_index_bytes(storage_path: str) -> int:
+    """Estimated memory of an index loaded from the JSON files in ``storage_path``."""
+    return sum(
+        entry.stat().st_size * JSON_MEMORY_FACTOR
+        for entry in os.scandir(storage_path)
+        if entry.name.endswith(".json") and entry.is_file()
+    )
+
+
+class IndexCache:
+    """Thread-safe LRU cache bounded by entry count and estimated bytes.
+
+    ``max_entries`` and ``max_bytes`` of 0 mean unlimited. ``on_evict`` is
+    called with the key of every entry dropped to make room, so callers can
+    release state derived from it.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = 0,
+        max_bytes: int = 0,
+        on_evict: Optional[Callable[[Hashable], None]] = None,
+    ):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.on_evict = on_evict
+        self._entries: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._lock = threading.RLock()
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __contains__(self, key: Hashable) -> bool:
+        with self._lock:
+            return key in self._entries
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._entries)
+
+    def keys(self) -> List[Hashable]:
+        """Cached keys, most recently used first."""
+        with self._lock:
+            return list(reversed(self._entries))
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """Return the cached value and mark it most recently used."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return default
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def peek(self, key: Hashable, default: Any = None) -> Any:
+        """Return the cached value without touching the LRU order or counters."""
+        with self._lock:
+            entry = self._entries.get(key)
+            return default if entry is None else entry[0]
+
+    def put(self, key: Hashable, value: Any, size: int = 0) -> None:
+        """Store ``value`` with an estimated ``size`` in bytes, then evict."""
+        evicted = []
+        with self._lock:
+            if key in self._entries:
+                self.current_bytes -= self._entries.pop(key)[1]
+            self._entries[key] = (value, size)
+            self.current_bytes += size
+
+            while len(self._entries) > 1 and self._over_budget():
+                old_key, (_, old_size) = self._entries.popitem(last=False)
+                self.current_bytes -= old_size
+                self.evictions += 1
+                evicted.append(old_key)
+
+        if self.on_evict:
+            for old_key in evicted:
+                self.on_evict(old_key)
+
+    def pop(self, key: Hashable, default: Any = None) -> Any:
+        """Remove an entry without counting it as an eviction."""
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry is None:
+                return default
+            self.current_bytes -= entry[1]
+            return entry[0]
+
+    def _over_budget(self) -> bool:
+        if self.max_entries and len(self._entries) > self.max_entries:
+            return True
+        return bool(self.max_bytes and self.current_bytes > self.max_bytes)
+
+    def stats(self) -> Dict[str, Any]:
+        """Counters and current usage of the cache."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "bytes": self.current_bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "collections": {
+                    key: size for key, (_, size) in self._entries.items()
+                },
+            }
@@ -0,0 +1,134 @@
+"""Manifest of the source files that make up a persisted collection index.
+
+The manifest is stored next to the LlamaIndex storage of a collection and
+records, for every file of the collection folder, its SHA-256 content hash and
+the ids of the documents that were inserted into the index for it. Diffing it
+against the folder tells ``create_collection_index`` which files have to be
+parsed and embedded again and which document nodes have to be removed.
+"""
+
+import hashlib
+import json
+import os
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+
+MANIFEST_FILENAME = "manifest.json"
+MANIFEST_VERSION = 1
+HASH_CHUNK_SIZE = 1024 * 1024
+
+
+def file_sha256(file_path: str) -> str:
+    """Compute the SHA-256 of a file, reading it in fixed-size chunks."""
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def list_collection_files(documents_path: str) -> Dict[str, os.stat_result]:
+    """List the files of a collection folder as SimpleDirectoryReader sees them.
+
+    Only regular, non-hidden files directly inside ``documents_path`` are
+    returned, keyed by file name.
+    """
+    files = {}
+    with os.scandir(documents_path) as entries:
+        for entry in entries:
+            if entry.name.startswith(".") or not entry.is_file():
+                continue
+            files[entry.name] = entry.stat()
+    return files
+
+
+def load_manifest(storage_path: str) -> Dict[str, dict]:
+    """Load the manifest entries of a collection; {} if there is none."""
+    manifest_path = os.path.join(storage_path, MANIFEST_FILENAME)
+    if not os.path.exists(manifest_path):
+        return {}
+
+    with open(manifest_path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+
+    if data.get("version") != MANIFEST_VERSION:
+        return {}
+    return data.get("files", {})
+
+
+def save_manifest(storage_path: str, files: Dict[str, dict]) -> None:
+    """Atomically write the manifest entries of a collection."""
+    os.makedirs(storage_path, exist_ok=True)
+    manifest_path = os.path.join(storage_path, MANIFEST_FILENAME)
+    tmp_path = manifest_path + ".tmp"
+
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump({"version": MANIFEST_VERSION, "files": files}, f)
+    os.replace(tmp_path, manifest_path)
+
+
+def index_version(storage_path: str) -> Optional[str]:
+    """Opaque version of a persisted index; changes whenever it is re-saved.
+
+    The manifest is written last by every build and checkpoint, so its
+    modification time identifies the index contents. None if not indexed.
+    """
+    try:
+        return str(os.stat(os.path.join(storage_path, MANIFEST_FILENAME)).st_mtime_ns)
+    except FileNotFoundError:
+        return None
+
+
+@dataclass
+class ManifestDiff:
+    """Result of comparing a collection folder with its manifest."""
+
+    added: List[str] = field(default_factory=list)
+    changed: List[str] = field(default_factory=list)
+    removed: List[str] = field(default_factory=list)
+    unchanged: List[str] = field(default_factory=list)
+    # Current entries (sha256, size, mtime_ns) of every file in the folder
+    entries: Dict[str, dict] = field(default_factory=dict)
+
+    @property
+    def has_changes(self) -> bool:
+        return bool(self.added or self.changed or self.removed)
+
+
+def diff_manifest(documents_path: str, manifest: Dict[str, dict]) -> ManifestDiff:
+    """Compare a collection folder with its saved manifest.
+
+    Files whose size and modification time match the manifest reuse the
+    recorded hash, so an unchanged collection is diffed without being read.
+    """
+    diff = ManifestDiff()
+    current = list_collection_files(documents_path)
+
+    for name in sorted(current):
+        stat = current[name]
+        previous = manifest.get(name)
+
+        if (
+            previous
+            and previous.get("size") == stat.st_size
+            and previous.get("mtime_ns") == stat.st_mtime_ns
+        ):
+            sha256 = previous["sha256"]
+        else:
+            sha256 = file_sha256(os.path.join(documents_path, name))
+
+        diff.entries[name] = {
+            "sha256": sha256,
+            "size": stat.st_size,
+            "mtime_ns": stat.st_mtime_ns,
+        }
+
+        if previous is None:
+            diff.added.append(name)
+        elif previous.get("sha256") != sha256:
+            diff.changed.append(name)
+        else:
+            diff.unchanged.append(name)
+
+    diff.removed = sorted(name for name in manifest if name not in current)
+    return diff
@@ -0,0 +1,174 @@
+"""Versioned, atomically published snapshots of a collection index.
+
+Every build writes a complete index into a new directory
+``<collection>/versions/<n>`` and publishes it by atomically replacing the
+``CURRENT`` pointer file with the new version name. Readers resolve the
+pointer once per load and only ever see fully written versions, so queries
+keep running on the previous snapshot while a new one is being built (in
+another process or thread), and a crashed build leaves nothing half-written
+behind the pointer.
+
+A version newer than the current one is a build in progress (or an
+interrupted one, whose checkpoints let the next build resume it). Older
+versions are kept while ``VersionRefs`` reports them in use by a loaded index
+of this process, and the newest ``keep`` ones are always kept as a grace
+period for other processes, then ``prune`` deletes them.
+
+A collection indexed before versioning (index files directly in the
+collection directory, no pointer) is served from there until its next build;
+it counts as the oldest version.
+"""
+
+import os
+import shutil
+import threading
+import weakref
+from collections import Counter
+from typing import Any, List, Optional, Set
+
+CURRENT_FILENAME = "CURRENT"
+VERSIONS_DIRNAME = "versions"
+# Present in every persisted LlamaIndex storage directory
+INDEX_STORE_FILENAME = "index_store.json"
+# Version name of the flat, pre-versioning layout
+LEGACY_VERSION = ""
+
+
+def version_path(collection_path: str, version: str) -> str:
+    if version == LEGACY_VERSION:
+        return collection_path
+    return os.path.join(collection_path, VERSIONS_DIRNAME, version)
+
+
+def list_versions(collection_path: str) -> List[str]:
+    """Version directories, oldest first."""
+    try:
+        names = os.listdir(os.path.join(collection_path, VERSIONS_DIRNAME))
+    except FileNotFoundError:
+        return []
+    return sorted(name for name in names if name.isdigit())
+
+
+def current_version(collection_path: str) -> Optional[str]:
+    """Published version of the collection; None if it was never indexed."""
+    try:
+        with open(os.path.join(collection_path, CURRENT_FILENAME), "r", encoding="utf-8") as f:
+            return f.read().strip()
+    except FileNotFoundError:
+        pass
+    if os.path.exists(os.path.join(collection_path, INDEX_STORE_FILENAME)):
+        return LEGACY_VERSION
+    return None
+
+
+def resolve(collection_path: str) -> Optional[str]:
+    """Directory of the published version; None if the collection is not indexed."""
+    version = current_version(collection_path)
+    return version_path(collection_path, version) if version is not None else None
+
+
+def pending_version(collection_path: str) -> Optional[str]:
+    """Newest version not published yet (a build in progress or interrupted)."""
+    current = current_version(collection_path) or ""
+    pending = [version for version in list_versions(collection_path) if version > current]
+    return pending[-1] if pending else None
+
+
+def begin(collection_path: str, resume: bool = True) -> str:
+    """Version a new build writes into.
+
+    With ``resume``, an unpublished version left by an interrupted build is
+    reused so its checkpoints are kept; otherwise unpublished versions are
+    discarded and a new, empty one is created.
+    """
+    if resume:
+        pending = pending_version(collection_path)
+        if pending is not None:
+            return pending
+
+    current = current_version(collection_path) or ""
+    versions = list_versions(collection_path)
+    for version in versions:
+        if version > current:
+            shutil.rmtree(version_path(collection_path, version), ignore_errors=True)
+
+    number = int(versions[-1]) + 1 if versions else 1
+    version = f"{number:06d}"
+    os.makedirs(version_path(collection_path, version))
+    return version
+
+
+def commit(collection_path: str, version: str) -> None:
+    """Publish ``version`` with an atomic replace of the pointer file."""
+    pointer_path = os.path.join(collection_path, CURRENT_FILENAME)
+    tmp_path = pointer_path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(version)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, pointer_path)
+
+
+def prune(collection_path: str, keep: int = 2, in_use: Optional[Set[str]] = None) -> List[str]:
+    """Delete versions older than the newest ``keep`` published ones and unused.
+
+    Unpublished versions (builds in progress) are never touched. Returns the
+    versions removed.
+    """
+    current = current_version(collection_path)
+    if current is None:
+        return []
+    in_use = in_use or set()
+
+    published = [version for version in list_versions(collection_path) if version <= current]
+    if current == LEGACY_VERSION or os.path.exists(os.path.join(collection_path, INDEX_STORE_FILENAME)):
+        published.insert(0, LEGACY_VERSION)
+
+    removed = []
+    for version in published[:max(0, len(published) - max(keep, 1))]:
+        if version == current or version in in_use:
+            continue
+        if version == LEGACY_VERSION:
+            _remove_legacy_files(collection_path)
+        else:
+            shutil.rmtree(version_path(collection_path, version), ignore_errors=True)
+        removed.append(version)
+    return removed
+
+
+def _remove_legacy_files(collection_path: str) -> None:
+    for entry in os.scandir(collection_path):
+        if entry.name in (CURRENT_FILENAME, VERSIONS_DIRNAME):
+            continue
+        if entry.is_dir():
+            shutil.rmtree(entry.path, ignore_errors=True)
+        else:
+            os.remove(entry.path)
+
+
+class VersionRefs:
+    """In-process reference counts of the index versions loaded in memory.
+
+    ``track`` counts one reference for as long as the given object (a loaded
+    index) is alive: the cache holds it, and so does every query still
+    running on it after a newer version replaced it in the cache.
+    """
+
+    def __init__(self):
+        self._counts: Counter = Counter()
+        self._lock = threading.Lock()
+
+    def track(self, collection: str, version: str, obj: Any) -> None:
+        with self._lock:
+            self._counts[(collection, version)] += 1
+        weakref.finalize(obj, self._release, collection, version)
+
+    def _release(self, collection: str, version: str) -> None:
+        with self._lock:
+            self._counts[(collection, version)] -= 1
+            if self._counts[(collection, version)] <= 0:
+                del self._counts[(collection, version)]
+
+    def in_use(self, collection: str) -> Set[str]:
+        with self._lock:
+            return {version for (name, version) in self._counts if name == collection}
@@ -0,0 +1,404 @@
+"""Background indexing jobs executed on a process pool.
+
+Jobs are rows of ``IndexingJob``; the API only enqueues them and polls their
+progress. Each job runs ``rag_service.create_collection_index`` in a worker
+process (parsing and embedding are CPU/GIL bound), which writes progress to
+the database after every file and checks for cancellation between files.
+
+The index is checkpointed every ``index_checkpoint_files`` files (index files
+plus a partial manifest) into the unpublished version being built, so a job
+interrupted by a crash is resubmitted on startup and continues incrementally
+from the last checkpoint while queries keep using the published version.
+
+Every API worker process resubmits interrupted jobs, so a job only runs once
+it has been claimed: a conditional UPDATE takes it if it is still queued, or
+if its heartbeat (renewed by the running worker) is older than
+``indexing_job_lease_seconds``. Other submissions of the same job exit
+without doing anything, and a job still running in a live process is left
+alone.
+
+Stage timings measured in the worker are returned with the job status and
+recorded in the API process, whose ``/metrics`` is the one scraped.
+"""
+
+import multiprocessing
+import os
+import socket
+import threading
+import uuid
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime, timedelta, timezone
+from functools import partial
+from typing import Any, Dict, List, Optional, Tuple
+
+from sqlalchemy import and_, or_
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.core.logging_config import configure_logging
+from app.core.metrics import collect_timings, record_stage
+from app.models.database import Document, DocumentCollection, IndexingJob, SessionLocal
+from app.services import index_versions
+from app.services.index_manifest import MANIFEST_FILENAME
+from app.services.lazy import rag_service
+
+ACTIVE_STATUSES = ("queued", "running")
+
+
+def _checkpointed_since(storage_path: str, since: datetime) -> bool:
+    """Whether the unpublished index version got a manifest after ``since`` (naive UTC)."""
+    version = index_versions.pending_version(storage_path)
+    if version is None:
+        return False
+    manifest_path = os.path.join(index_versions.version_path(storage_path, version), MANIFEST_FILENAME)
+    if not os.path.exists(manifest_path):
+        return False
+    return os.path.getmtime(manifest_path) >= since.replace(tzinfo=timezone.utc).timestamp()
+
+
+def _lease_expired_before() -> datetime:
+    return datetime.utcnow() - timedelta(seconds=settings.indexing_job_lease_seconds)
+
+
+def _claim(db: Session, job_id: int, owner: str) -> bool:
+    """Atomically take a queued job, or a running one whose lease expired."""
+    now = datetime.utcnow()
+    claimed = db.query(IndexingJob).filter(
+        IndexingJob.id == job_id,
+        or_(
+            IndexingJob.status == "queued",
+            and_(
+                IndexingJob.status == "running",
+                or_(IndexingJob.heartbeat.is_(None), IndexingJob.heartbeat < _lease_expired_before()),
+            ),
+        ),
+    ).update({"status": "running", "owner": owner, "heartbeat": now}, synchronize_session=False)
+    db.commit()
+    return claimed == 1
+
+
+class _Lease:
+    """Renews the heartbeat of a claimed job from a background thread.
+
+    ``lost`` is set if the job no longer belongs to ``owner`` (its lease
+    expired and another process took it over).
+    """
+
+    def __init__(self, job_id: int, owner: str, interval: float):
+        self.job_id = job_id
+        self.owner = owner
+        self.interval = interval
+        self.lost = threading.Event()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name=f"job-{job_id}-lease", daemon=True)
+
+    def __enter__(self) -> "_Lease":
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            db = SessionLocal()
+            try:
+                renewed = db.query(IndexingJob).filter(
+                    IndexingJob.id == self.job_id,
+                    IndexingJob.owner == self.owner,
+                    IndexingJob.status == "running",
+                ).update({"heartbeat": datetime.utcnow()}, synchronize_session=False)
+                db.commit()
+            except Exception:
+                # Transient (e.g. database locked): retry on the next beat
+                db.rollback()
+                continue
+            finally:
+                db.close()
+            if not renewed:
+                self.lost.set()
+                return
+
+
+def _finish(db: Session, job: IndexingJob, status: str, error: Optional[str] = None) -> None:
+    job.status = status
+    job.error = error
+    job.finished_at = datetime.utcnow()
+    db.commit()
+
+
+def run_indexing_job(job_id: int, owner: str) -> str:
+    """Run one job to completion; worker process entry point.
+
+    Returns "skipped" without doing anything if the job could not be claimed
+    (finished, or running in another live process).
+    """
+    # Imported here: LlamaIndex is only needed in the worker processes
+    from app.services.rag_service import IndexingCancelled
+
+    db = SessionLocal()
+    try:
+        if not _claim(db, job_id, owner):
+            return "skipped"
+        job = db.get(IndexingJob, job_id)
+
+        if job.cancel_requested:
+            _finish(db, job, "cancelled")
+            return job.status
+
+        collection = db.get(DocumentCollection, job.collection_id)
+        if collection is None:
+            _finish(db, job, "failed", "Coleção não encontrada")
+            return job.status
+
+        storage_path = os.path.join(settings.INDEX_STORAGE_PATH, collection.name)
+        documents_path = os.path.join(settings.DOCUMENTS_PATH, collection.name)
+
+        # A full rebuild that already wrote a checkpoint resumes incrementally
+        incremental = not job.full_rebuild or _checkpointed_since(storage_path, job.created_at)
+
+        job.started_at = datetime.utcnow()
+        job.files_done = 0
+        job.chunks_embedded = 0
+        db.commit()
+
+        def progress(files_done: int, files_total: int, chunks: int) -> None:
+            job.files_done = files_done
+            job.files_total = files_total
+            job.chunks_embedded = chunks
+            db.commit()
+
+        with _Lease(job_id, owner, settings.indexing_job_lease_seconds / 3) as lease:
+            def should_cancel() -> bool:
+                # A lost lease stops the build: another process now runs the job
+                return lease.lost.is_set() or bool(
+                    db.query(IndexingJob.cancel_requested)
+                    .filter(IndexingJob.id == job_id)
+                    .scalar()
+                )
+
+            try:
+                success = rag_service.create_collection_index(
+                    collection.name,
+                    documents_path,
+                    incremental=incremental,
+                    progress=progress,
+                    should_cancel=should_cancel,
+                    checkpoint_every=settings.index_checkpoint_files,
+                )
+            except IndexingCancelled:
+                if lease.lost.is_set():
+                    return "skipped"
+                _finish(db, job, "cancelled")
+                return job.status
+            finally:
+                # The parent process serves queries; keep the worker lean
+                rag_service.invalidate_collection(collection.name)
+
+            if lease.lost.is_set():
+                return "skipped"
+
+        if not success:
+            _finish(db, job, "failed", "Erro ao criar índice")
+            return job.status
+
+        db.query(Document).filter(
+            Document.collection_id == collection.id
+        ).update({"is_indexed": True})
+        _finish(db, job, "completed")
+        return job.status
+
+    except Exception as e:
+        db.rollback()
+        job = db.get(IndexingJob, job_id)
+        if job is not None and job.owner == owner and job.status in ACTIVE_STATUSES:
+            _finish(db, job, "failed", str(e))
+        raise
+    finally:
+        db.close()
+
+
+def run_indexing_job_timed(job_id: int, owner: str) -> Tuple[str, List[Tuple[str, float]]]:
+    """Worker entry point: run the job and return its status and stage timings."""
+    with collect_timings() as timings:
+        status = run_indexing_job(job_id, owner)
+    return status, timings
+
+
+def job_to_dict(job: IndexingJob) -> Dict[str, Any]:
+    """Serializable job status with throughput and an ETA from the files done."""
+    eta_seconds = None
+    chunks_per_sec = None
+    if job.started_at:
+        elapsed = ((job.finished_at or datetime.utcnow()) - job.started_at).total_seconds()
+        if elapsed > 0:
+            chunks_per_sec = job.chunks_embedded / elapsed
+        if job.status == "running" and job.files_done and job.files_total:
+            eta_seconds = elapsed / job.files_done * (job.files_total - job.files_done)
+
+    return {
+        "id": job.id,
+        "collection_id": job.collection_id,
+        "status": job.status,
+        "full_rebuild": job.full_rebuild,
+        "cancel_requested": job.cancel_requested,
+        "files_total": job.files_total,
+        "files_done": job.files_done,
+        "chunks_embedded": job.chunks_embedded,
+        "progress": job.files_done / job.files_total if job.files_total else 0.0,
+        "chunks_per_sec": chunks_per_sec,
+        "eta_seconds": eta_seconds,
+        "error": job.error,
+        "created_at": job.created_at,
+        "started_at": job.started_at,
+        "finished_at": job.finished_at,
+    }
+
+
+class IndexingJobManager:
+    """Submits indexing jobs to a process pool and tracks their futures."""
+
+    def __init__(self, max_workers: int):
+        self.max_workers = max_workers
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._futures: Dict[int, Future] = {}
+        self._lock = threading.Lock()
+        # Recorded on the jobs this process claims (pids repeat across containers)
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self._resume_timer: Optional[threading.Timer] = None
+        self._closed = False
+
+    def _pool(self) -> ProcessPoolExecutor:
+        # Created on first use; "spawn" because the server process has threads
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.max_workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=configure_logging,
+            )
+        return self._executor
+
+    @staticmethod
+    def active_job(db: Session, collection_id: int) -> Optional[IndexingJob]:
+        """Queued or running job of a collection, if any."""
+        return db.query(IndexingJob).filter(
+            IndexingJob.collection_id == collection_id,
+            IndexingJob.status.in_(ACTIVE_STATUSES),
+        ).first()
+
+    def enqueue(self, db: Session, collection: DocumentCollection, full_rebuild: bool = False) -> IndexingJob:
+        """Create a job for ``collection`` and submit it to the pool."""
+        job = IndexingJob(collection_id=collection.id, full_rebuild=full_rebuild)
+        db.add(job)
+        db.commit()
+        db.refresh(job)
+        self._submit(job.id, collection.name)
+        return job
+
+    def cancel(self, db: Session, job: IndexingJob) -> IndexingJob:
+        """Request cancellation; queued jobs are dropped immediately."""
+        job.cancel_requested = True
+        with self._lock:
+            future = self._futures.get(job.id)
+        if job.status == "queued" and future is not None and future.cancel():
+            job.status = "cancelled"
+            job.finished_at = datetime.utcnow()
+        db.commit()
+        db.refresh(job)
+        return job
+
+    def resume_interrupted(self) -> int:
+        """Resubmit queued jobs and running jobs whose lease expired.
+
+        Runs in every server process; the claim in ``run_indexing_job`` makes
+        sure each job is built by only one of them. Jobs still leased by a
+        live process are checked again once their lease could have expired.
+        """
+        db = SessionLocal()
+        try:
+            expired_before = _lease_expired_before()
+            jobs = db.query(IndexingJob).filter(IndexingJob.status.in_(ACTIVE_STATUSES)).all()
+            resumed = 0
+            leased = False
+            for job in jobs:
+                with self._lock:
+                    if job.id in self._futures:
+                        continue
+                if job.status == "running" and job.heartbeat is not None and job.heartbeat >= expired_before:
+                    leased = True
+                    continue
+                collection = db.get(DocumentCollection, job.collection_id)
+                if collection is None:
+                    _finish(db, job, "failed", "Coleção não encontrada")
+                    continue
+                self._submit(job.id, collection.name)
+                resumed += 1
+
+            if leased:
+                self._schedule_resume(settings.indexing_job_lease_seconds)
+            return resumed
+        finally:
+            db.close()
+
+    def _schedule_resume(self, delay: float) -> None:
+        with self._lock:
+            if self._resume_timer is not None or self._closed:
+                return
+            self._resume_timer = threading.Timer(delay, self._run_scheduled_resume)
+            self._resume_timer.daemon = True
+            self._resume_timer.start()
+
+    def _run_scheduled_resume(self) -> None:
+        with self._lock:
+            self._resume_timer = None
+        self.resume_interrupted()
+
+    def _submit(self, job_id: int, collection_name: str) -> None:
+        with self._lock:
+            future = self._pool().submit(run_indexing_job_timed, job_id, self.owner)
+            self._futures[job_id] = future
+        future.add_done_callback(partial(self._on_done, job_id, collection_name))
+
+    def _on_done(self, job_id: int, collection_name: str, future: Future) -> None:
+        with self._lock:
+            self._futures.pop(job_id, None)
+
+        # The worker rewrote the index on disk; drop the stale in-memory copy
+        if rag_service.loaded:
+            rag_service.invalidate_collection(collection_name)
+
+        if future.cancelled():
+            return
+        error = future.exception()
+        if error is None:
+            _, timings = future.result()
+            for stage, seconds in timings:
+                record_stage(stage, seconds)
+        elif isinstance(error, BrokenProcessPool):
+            # A worker died (e.g. out of memory); the job could not record it
+            with self._lock:
+                self._executor = None
+            db = SessionLocal()
+            try:
+                job = db.get(IndexingJob, job_id)
+                if job is not None and job.status in ACTIVE_STATUSES and job.owner == self.owner:
+                    _finish(db, job, "failed", "Processo de indexação encerrado inesperadamente")
+            finally:
+                db.close()
+
+    def shutdown(self) -> None:
+        """Stop accepting work; interrupted jobs resume on next startup."""
+        with self._lock:
+            self._closed = True
+            if self._resume_timer is not None:
+                self._resume_timer.cancel()
+                self._resume_timer = None
+            if self._executor is not None:
+                self._executor.shutdown(wait=False, cancel_futures=True)
+                self._executor = None
+
+
+# Global job manager instance
+job_manager = IndexingJobManager(max_workers=settings.indexing_workers)
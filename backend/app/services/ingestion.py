@@ -0,0 +1,186 @@
+"""Streaming ingestion pipeline: read -> chunk -> embed, with bounded queues.
+
+Each stage runs on its own thread and hands work to the next one through a
+``queue.Queue`` of ``queue_size`` items, so parsing, chunking and embedding
+overlap while at most a few batches are in memory at any time, regardless
+of collection size. The caller consumes ``EmbeddedBatch`` objects and
+writes them to the index, keeping index mutation on a single thread.
+
+A file's chunks may span several batches. ``EmbeddedBatch.files`` lists the
+files whose last chunk is in the batch, and ``open_doc_ids`` the documents
+of files that are only partly written, so the caller can checkpoint only at
+file boundaries (or roll a partial file back).
+"""
+
+import queue
+import threading
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterator, List, Optional, Sequence
+
+from llama_index.core.base.embeddings.base import BaseEmbedding
+from llama_index.core.ingestion import run_transformations
+from llama_index.core.schema import BaseNode, MetadataMode, TransformComponent
+
+from app.services.parsing import DocumentParser, ParseResult
+
+# How long a blocked stage waits before re-checking for shutdown
+POLL_SECONDS = 0.1
+# Metadata naming where a file is stored, kept out of the embedded text so the
+# same content embeds identically in every collection and after a re-upload
+LOCATION_METADATA_KEYS = ("file_path", "file_name")
+
+_DONE = object()
+
+
+class _StageError:
+    def __init__(self, error: BaseException):
+        self.error = error
+
+
+@dataclass
+class EmbeddedBatch:
+    nodes: List[BaseNode] = field(default_factory=list)
+    files: List[ParseResult] = field(default_factory=list)
+    open_doc_ids: List[str] = field(default_factory=list)
+
+
+class IngestionPipeline:
+    """Parses, chunks and embeds files, yielding batches ready to insert."""
+
+    def __init__(
+        self,
+        parser: DocumentParser,
+        transformations: Sequence[TransformComponent],
+        embed_model: BaseEmbedding,
+        batch_size: int,
+        queue_size: int = 4,
+        metadata: Optional[Dict[str, Any]] = None,
+    ):
+        self.parser = parser
+        self.transformations = transformations
+        self.embed_model = embed_model
+        self.batch_size = batch_size
+        self.queue_size = queue_size
+        self.metadata = metadata or {}
+
+    def run(self, paths: Sequence[str]) -> Iterator[EmbeddedBatch]:
+        """Yield embedded batches; closing the generator stops every stage."""
+        stop = threading.Event()
+        parsed: queue.Queue = queue.Queue(self.queue_size)
+        chunked: queue.Queue = queue.Queue(self.queue_size)
+        embedded: queue.Queue = queue.Queue(self.queue_size)
+
+        stages = [
+            threading.Thread(target=self._read, args=(paths, parsed, stop), name="ingest-read", daemon=True),
+            threading.Thread(target=self._chunk, args=(parsed, chunked, stop), name="ingest-chunk", daemon=True),
+            threading.Thread(target=self._embed, args=(chunked, embedded, stop), name="ingest-embed", daemon=True),
+        ]
+        for stage in stages:
+            stage.start()
+
+        try:
+            while True:
+                item = embedded.get()
+                if item is _DONE:
+                    return
+                if isinstance(item, _StageError):
+                    raise item.error
+                yield item
+        finally:
+            stop.set()
+            for stage in stages:
+                stage.join()
+
+    @staticmethod
+    def _put(target: queue.Queue, item: Any, stop: threading.Event) -> bool:
+        """Blocking put that gives up once the pipeline is stopped."""
+        while not stop.is_set():
+            try:
+                target.put(item, timeout=POLL_SECONDS)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    @staticmethod
+    def _get(source: queue.Queue, stop: threading.Event) -> Any:
+        while not stop.is_set():
+            try:
+                return source.get(timeout=POLL_SECONDS)
+            except queue.Empty:
+                continue
+        return _DONE
+
+    def _read(self, paths: Sequence[str], target: queue.Queue, stop: threading.Event) -> None:
+        results = self.parser.iter_parse(paths)
+        try:
+            for result in results:
+                if not self._put(target, result, stop):
+                    return
+            self._put(target, _DONE, stop)
+        except BaseException as e:
+            self._put(target, _StageError(e), stop)
+        finally:
+            results.close()
+
+    def _chunk(self, source: queue.Queue, target: queue.Queue, stop: threading.Event) -> None:
+        try:
+            while True:
+                result = self._get(source, stop)
+                if result is _DONE or isinstance(result, _StageError):
+                    self._put(target, result, stop)
+                    return
+
+                nodes: List[BaseNode] = []
+                if result.ok:
+                    excluded = [*LOCATION_METADATA_KEYS, *self.metadata]
+                    for doc in result.documents:
+                        doc.metadata.update(self.metadata)
+                        doc.excluded_embed_metadata_keys = list(
+                            dict.fromkeys([*doc.excluded_embed_metadata_keys, *excluded])
+                        )
+                    nodes = run_transformations(result.documents, self.transformations)
+                if not self._put(target, (result, nodes), stop):
+                    return
+        except BaseException as e:
+            self._put(target, _StageError(e), stop)
+
+    def _embed(self, source: queue.Queue, target: queue.Queue, stop: threading.Event) -> None:
+        batch = EmbeddedBatch()
+        # Files with chunks still waiting in later batches: doc ids per file
+        open_files: Dict[str, List[str]] = {}
+
+        def emit() -> bool:
+            nonlocal batch
+            if batch.nodes:
+                texts = [node.get_content(metadata_mode=MetadataMode.EMBED) for node in batch.nodes]
+                for node, embedding in zip(batch.nodes, self.embed_model.get_text_embedding_batch(texts)):
+                    node.embedding = embedding
+            batch.open_doc_ids = [doc_id for doc_ids in open_files.values() for doc_id in doc_ids]
+            ready, batch = batch, EmbeddedBatch()
+            return self._put(target, ready, stop)
+
+        try:
+            while True:
+                item = self._get(source, stop)
+                if item is _DONE or isinstance(item, _StageError):
+                    if (batch.nodes or batch.files) and not emit():
+                        return
+                    self._put(target, item, stop)
+                    return
+
+                result, nodes = item
+                open_files[result.path] = [doc.doc_id for doc in result.documents]
+                while nodes:
+                    room = self.batch_size - len(batch.nodes)
+                    batch.nodes.extend(nodes[:room])
+                    nodes = nodes[room:]
+                    if nodes and not emit():
+                        return
+
+                del open_files[result.path]
+                batch.files.append(result)
+                if len(batch.nodes) >= self.batch_size and not emit():
+                    return
+        except BaseException as e:
+            self._put(target, _StageError(e), stop)
@@ -0,0 +1,43 @@
+"""Deferred construction of heavy service singletons.
+
+Importing ``app.services.rag_service`` pulls in LlamaIndex (over a second of
+imports) and builds the Ollama clients and the embedding cache. The API
+modules, the job manager and the warm-up therefore hold a ``LazyObject``,
+which imports the module and returns the real object on first attribute
+access. A web worker can answer ``/health`` right after boot while the
+warm-up builds the service in the background.
+"""
+
+import importlib
+import threading
+from typing import Any
+
+
+class LazyObject:
+    """Proxy for ``module.attribute``, resolved once on first use."""
+
+    def __init__(self, module: str, attribute: str):
+        self._module = module
+        self._attribute = attribute
+        self._target = None
+        self._lock = threading.Lock()
+
+    @property
+    def loaded(self) -> bool:
+        return self._target is not None
+
+    def resolve(self) -> Any:
+        """Import the module (once) and return the proxied object."""
+        if self._target is None:
+            with self._lock:
+                if self._target is None:
+                    module = importlib.import_module(self._module)
+                    self._target = getattr(module, self._attribute)
+        return self._target
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self.resolve(), name)
+
+
+# Global RAG service, built on first use
+rag_service = LazyObject("app.services.rag_service", "rag_service")
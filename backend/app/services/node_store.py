@@ -0,0 +1,419 @@
+"""Memory-mapped node store (docstore) for collection indexes.
+
+Node texts and metadata are the bulk of a loaded index besides the vectors.
+``SimpleDocumentStore`` parses all of them from ``docstore.json`` into each
+process; ``MmapDocumentStore`` instead keeps every docstore collection (nodes,
+node metadata, ref doc info) in tables of JSON values sorted by key and
+memory-mapped read-only, so worker processes on a host share the same page
+cache pages and only the nodes a query returns are decoded.
+
+Each table is four files: ``keys``/``values`` blobs addressed through int64
+``keys_offsets``/``values_offsets`` arrays, with lookups by binary search on
+the keys. Tables are immutable. Writes (during an index build) go to an
+in-memory overlay; ``persist`` writes only the overlay as a new table per
+changed collection, with deletions as tombstones (empty values), then
+atomically replaces ``nodes.meta.json``, which lists the tables in use, so a
+crash mid-write leaves the previous state readable. A lookup checks the
+tables newest first. ``compact`` merges tables with a streaming k-way merge
+written straight to the new files, at the end of a build. Persisting into
+another directory (a new index version) hard-links the existing tables
+instead of copying them.
+"""
+
+import heapq
+import json
+import os
+import shutil
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+import numpy as np
+from llama_index.core.schema import BaseNode
+from llama_index.core.storage.docstore.keyval_docstore import KVDocumentStore
+from llama_index.core.storage.docstore.utils import json_to_doc
+from llama_index.core.storage.kvstore.types import DEFAULT_COLLECTION, BaseInMemoryKVStore
+
+META_FILENAME = "nodes.meta.json"
+FILE_PREFIX = "nodes."
+STORE_FORMAT = 2
+# Format 1: one table per collection, rewritten on every persist
+READABLE_FORMATS = (1, 2)
+TABLE_FILES = ("keys", "keys_offsets", "values", "values_offsets")
+# Tables per collection left by a build; older ones are merged beyond this
+MAX_TABLES = 4
+# Offsets buffered before they are appended to their file
+OFFSETS_BLOCK = 65536
+TOMBSTONE = b""
+
+
+class _Table:
+    """Read-only sorted key/value table over memory-mapped files."""
+
+    def __init__(self, persist_dir: str, prefix: str, count: int, keys_bytes: int, values_bytes: int):
+        self.prefix = prefix
+        self.count = count
+        self.keys_bytes = keys_bytes
+        self.values_bytes = values_bytes
+        if not count:
+            return
+
+        def mapped(name: str, dtype, length: int) -> np.ndarray:
+            if not length:
+                # mmap refuses empty files, e.g. the values of a table of tombstones
+                return np.empty(0, dtype=dtype)
+            return np.memmap(os.path.join(persist_dir, f"{prefix}.{name}"), dtype=dtype, mode="r", shape=(length,))
+
+        self._keys = mapped("keys", np.uint8, keys_bytes)
+        self._key_offsets = mapped("keys_offsets", np.int64, count + 1)
+        self._values = mapped("values", np.uint8, values_bytes)
+        self._value_offsets = mapped("values_offsets", np.int64, count + 1)
+
+    def info(self) -> dict:
+        return {
+            "prefix": self.prefix,
+            "count": self.count,
+            "keys_bytes": self.keys_bytes,
+            "values_bytes": self.values_bytes,
+        }
+
+    def key(self, row: int) -> bytes:
+        return self._keys[self._key_offsets[row]:self._key_offsets[row + 1]].tobytes()
+
+    def raw_value(self, row: int) -> bytes:
+        return self._values[self._value_offsets[row]:self._value_offsets[row + 1]].tobytes()
+
+    def find(self, key: bytes) -> Optional[int]:
+        lo, hi = 0, self.count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self.key(mid) < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo if lo < self.count and self.key(lo) == key else None
+
+    def items(self) -> Iterator[Tuple[bytes, bytes]]:
+        for row in range(self.count):
+            yield self.key(row), self.raw_value(row)
+
+
+class _TableWriter:
+    """Writes a table from items in key order, straight to its files."""
+
+    def __init__(self, persist_dir: str, prefix: str):
+        self.persist_dir = persist_dir
+        self.prefix = prefix
+        self._files = {
+            name: open(os.path.join(persist_dir, f"{prefix}.{name}"), "wb") for name in TABLE_FILES
+        }
+        self.count = self.keys_bytes = self.values_bytes = 0
+        self._key_offsets: List[int] = [0]
+        self._value_offsets: List[int] = [0]
+
+    def write(self, key: bytes, value: bytes) -> None:
+        self._files["keys"].write(key)
+        self._files["values"].write(value)
+        self.count += 1
+        self.keys_bytes += len(key)
+        self.values_bytes += len(value)
+        self._key_offsets.append(self.keys_bytes)
+        self._value_offsets.append(self.values_bytes)
+        if len(self._key_offsets) >= OFFSETS_BLOCK:
+            self._flush_offsets()
+
+    def _flush_offsets(self) -> None:
+        self._files["keys_offsets"].write(np.asarray(self._key_offsets, dtype=np.int64).tobytes())
+        self._files["values_offsets"].write(np.asarray(self._value_offsets, dtype=np.int64).tobytes())
+        self._key_offsets, self._value_offsets = [], []
+
+    def close(self) -> _Table:
+        self._flush_offsets()
+        for f in self._files.values():
+            f.flush()
+            os.fsync(f.fileno())
+            f.close()
+        return _Table(self.persist_dir, self.prefix, self.count, self.keys_bytes, self.values_bytes)
+
+    def abort(self) -> None:
+        for name, f in self._files.items():
+            f.close()
+            os.remove(os.path.join(self.persist_dir, f"{self.prefix}.{name}"))
+
+
+def _merge(tables: List[_Table]) -> Iterator[Tuple[bytes, bytes]]:
+    """Items of ``tables`` (oldest first) in key order; the newest value of a key wins."""
+    def ranked(table: _Table, rank: int) -> Iterator[Tuple[bytes, int, bytes]]:
+        for key, value in table.items():
+            yield key, rank, value
+
+    # Among equal keys, the lowest rank (newest table) comes first
+    streams = [ranked(table, -age) for age, table in enumerate(tables)]
+    previous = None
+    for key, _, value in heapq.merge(*streams):
+        if key != previous:
+            previous = key
+            yield key, value
+
+
+class MmapKVStore(BaseInMemoryKVStore):
+    """Key-value store persisted as memory-mapped sorted tables, several per collection."""
+
+    def __init__(self) -> None:
+        self._persist_dir: Optional[str] = None
+        self._next_table = 0
+        # Per collection, oldest first
+        self._tables: Dict[str, List[_Table]] = {}
+        self._pending: Dict[str, Dict[str, dict]] = {}
+        self._deleted: Dict[str, Set[str]] = {}
+
+    @classmethod
+    def from_persist_dir(cls, persist_dir: str) -> "MmapKVStore":
+        """Open a persisted store; only the metadata file is actually read."""
+        with open(os.path.join(persist_dir, META_FILENAME), "r", encoding="utf-8") as f:
+            meta = json.load(f)
+
+        if meta.get("format") not in READABLE_FORMATS:
+            raise ValueError(f"Unsupported node store format in {persist_dir}")
+
+        store = cls()
+        store._persist_dir = os.path.abspath(persist_dir)
+        if meta["format"] == 1:
+            store._next_table = 0
+            collections = {name: [info] for name, info in meta["collections"].items()}
+        else:
+            store._next_table = meta["next_table"]
+            collections = meta["collections"]
+        store._tables = {
+            collection: [
+                _Table(store._persist_dir, info["prefix"], info["count"], info["keys_bytes"], info["values_bytes"])
+                for info in infos
+            ]
+            for collection, infos in collections.items()
+        }
+        return store
+
+    @classmethod
+    def from_persist_path(cls, persist_path: str, fs: Optional[Any] = None) -> "MmapKVStore":
+        return cls.from_persist_dir(os.path.dirname(persist_path))
+
+    # ------------------------------------------------------------------ #
+    # Reading
+    # ------------------------------------------------------------------ #
+
+    def _persisted(self, key: str, collection: str) -> Optional[bytes]:
+        """Raw value of ``key`` in the newest table holding it (None if absent or deleted)."""
+        encoded = key.encode("utf-8")
+        for table in reversed(self._tables.get(collection, ())):
+            row = table.find(encoded)
+            if row is not None:
+                value = table.raw_value(row)
+                return value if value != TOMBSTONE else None
+        return None
+
+    def get(self, key: str, collection: str = DEFAULT_COLLECTION) -> Optional[dict]:
+        pending = self._pending.get(collection)
+        if pending is not None and key in pending:
+            return pending[key].copy()
+        if key in self._deleted.get(collection, ()):
+            return None
+
+        value = self._persisted(key, collection)
+        return json.loads(value) if value is not None else None
+
+    async def aget(self, key: str, collection: str = DEFAULT_COLLECTION) -> Optional[dict]:
+        return self.get(key, collection)
+
+    def iter_raw(self, collection: str = DEFAULT_COLLECTION) -> Iterator[Tuple[str, bytes]]:
+        """Persisted (key, JSON bytes) of a collection in key order, without the overlay."""
+        for key, value in _merge(self._tables.get(collection, [])):
+            if value != TOMBSTONE:
+                yield key.decode("utf-8"), value
+
+    def iter_items(self, collection: str = DEFAULT_COLLECTION) -> Iterator[Tuple[str, dict]]:
+        """Every (key, value) of a collection, overlay included, decoded one at a time."""
+        pending = self._pending.get(collection, {})
+        deleted = self._deleted.get(collection, set())
+        for key, value in self.iter_raw(collection):
+            if key not in deleted and key not in pending:
+                yield key, json.loads(value)
+        for key, value in list(pending.items()):
+            yield key, value.copy()
+
+    def get_all(self, collection: str = DEFAULT_COLLECTION) -> Dict[str, dict]:
+        """Decode a whole collection (index builds only; queries use ``get``)."""
+        return dict(self.iter_items(collection))
+
+    async def aget_all(self, collection: str = DEFAULT_COLLECTION) -> Dict[str, dict]:
+        return self.get_all(collection)
+
+    # ------------------------------------------------------------------ #
+    # Writing
+    # ------------------------------------------------------------------ #
+
+    def put(self, key: str, val: dict, collection: str = DEFAULT_COLLECTION) -> None:
+        self._pending.setdefault(collection, {})[key] = val.copy()
+        self._deleted.get(collection, set()).discard(key)
+
+    async def aput(self, key: str, val: dict, collection: str = DEFAULT_COLLECTION) -> None:
+        self.put(key, val, collection)
+
+    def delete(self, key: str, collection: str = DEFAULT_COLLECTION) -> bool:
+        existed = self.get(key, collection) is not None
+        self._pending.get(collection, {}).pop(key, None)
+        if self._persisted(key, collection) is not None:
+            self._deleted.setdefault(collection, set()).add(key)
+        return existed
+
+    async def adelete(self, key: str, collection: str = DEFAULT_COLLECTION) -> bool:
+        return self.delete(key, collection)
+
+    def persist(self, persist_path: str, fs: Optional[Any] = None) -> None:
+        """Write the overlay as new tables into the directory of ``persist_path``.
+
+        StorageContext passes the path of the JSON file a SimpleDocumentStore
+        would write; only its directory is used. Only what changed since the
+        last persist is written, so checkpoints cost the size of the overlay.
+        """
+        persist_dir = os.path.abspath(os.path.dirname(persist_path))
+        os.makedirs(persist_dir, exist_ok=True)
+        if persist_dir != self._persist_dir:
+            self._link_tables(persist_dir)
+
+        tables = {collection: list(tables) for collection, tables in self._tables.items()}
+        for collection in sorted(set(self._pending) | set(self._deleted)):
+            items = {
+                key.encode("utf-8"): json.dumps(value).encode("utf-8")
+                for key, value in self._pending.get(collection, {}).items()
+            }
+            for key in self._deleted.get(collection, ()):
+                items[key.encode("utf-8")] = TOMBSTONE
+            if items:
+                tables.setdefault(collection, []).append(self._write_table(persist_dir, sorted(items.items())))
+
+        self._commit(persist_dir, tables)
+        self._pending = {}
+        self._deleted = {}
+
+    def compact(self, max_tables: int = MAX_TABLES) -> None:
+        """Merge the newest tables of each collection so at most ``max_tables`` remain.
+
+        The merge streams the tables' items into the new files. Tombstones are
+        dropped when every table of the collection takes part. Persist first:
+        the overlay is not included.
+        """
+        if self._persist_dir is None:
+            return
+        max_tables = max(max_tables, 1)
+        tables = {collection: list(tables) for collection, tables in self._tables.items()}
+        changed = False
+        for collection, current in tables.items():
+            if len(current) <= max_tables:
+                continue
+            keep, merged = current[:max_tables - 1], current[max_tables - 1:]
+            items = _merge(merged)
+            if not keep:
+                items = ((key, value) for key, value in items if value != TOMBSTONE)
+            tables[collection] = keep + [self._write_table(self._persist_dir, items)]
+            changed = True
+        if changed:
+            self._commit(self._persist_dir, tables)
+
+    def table_count(self, collection: str = DEFAULT_COLLECTION) -> int:
+        return len(self._tables.get(collection, ()))
+
+    def _write_table(self, persist_dir: str, items: Iterable[Tuple[bytes, bytes]]) -> _Table:
+        writer = _TableWriter(persist_dir, f"{FILE_PREFIX}t{self._next_table}")
+        self._next_table += 1
+        try:
+            for key, value in items:
+                writer.write(key, value)
+        except BaseException:
+            writer.abort()
+            raise
+        return writer.close()
+
+    def _link_tables(self, persist_dir: str) -> None:
+        """Hard-link the (immutable) table files into ``persist_dir``; copy if linking fails."""
+        for tables in self._tables.values():
+            for table in tables:
+                for name in TABLE_FILES:
+                    source = os.path.join(self._persist_dir, f"{table.prefix}.{name}")
+                    target = os.path.join(persist_dir, f"{table.prefix}.{name}")
+                    if os.path.exists(target):
+                        os.remove(target)
+                    try:
+                        os.link(source, target)
+                    except OSError:
+                        shutil.copyfile(source, target)
+
+    def _commit(self, persist_dir: str, tables: Dict[str, List[_Table]]) -> None:
+        """Publish ``tables`` with the metadata file, remap, drop unreferenced files."""
+        meta = {
+            "format": STORE_FORMAT,
+            "next_table": self._next_table,
+            "collections": {
+                collection: [table.info() for table in current]
+                for collection, current in tables.items()
+            },
+        }
+        meta_path = os.path.join(persist_dir, META_FILENAME)
+        tmp_path = meta_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(meta, f)
+        os.replace(tmp_path, meta_path)
+
+        self._persist_dir = persist_dir
+        self._tables = {
+            collection: [
+                _Table(persist_dir, table.prefix, table.count, table.keys_bytes, table.values_bytes)
+                for table in current
+            ]
+            for collection, current in tables.items()
+        }
+        _remove_files(persist_dir, keep={table.prefix for current in tables.values() for table in current})
+
+
+def _remove_files(persist_dir: str, keep: Optional[Set[str]] = None) -> None:
+    """Remove node store data files, except those of the tables in ``keep``."""
+    keep = keep or set()
+    for entry in os.scandir(persist_dir):
+        name = entry.name
+        prefix, _, suffix = name.rpartition(".")
+        if name.startswith(FILE_PREFIX) and suffix in TABLE_FILES and prefix not in keep:
+            os.remove(entry.path)
+
+
+class MmapDocumentStore(KVDocumentStore):
+    """Document (node) store whose persisted data is memory-mapped."""
+
+    def __init__(self, kvstore: Optional[MmapKVStore] = None, namespace: Optional[str] = None) -> None:
+        super().__init__(kvstore or MmapKVStore(), namespace=namespace)
+
+    @staticmethod
+    def exists(persist_dir: str) -> bool:
+        """Check whether ``persist_dir`` holds a persisted mmap node store."""
+        return os.path.exists(os.path.join(persist_dir, META_FILENAME))
+
+    @staticmethod
+    def remove(persist_dir: str) -> None:
+        """Remove the mmap node store files from ``persist_dir``, if any."""
+        meta_path = os.path.join(persist_dir, META_FILENAME)
+        if os.path.exists(meta_path):
+            os.remove(meta_path)
+        if os.path.isdir(persist_dir):
+            _remove_files(persist_dir)
+
+    @classmethod
+    def from_persist_dir(cls, persist_dir: str, namespace: Optional[str] = None) -> "MmapDocumentStore":
+        return cls(MmapKVStore.from_persist_dir(persist_dir), namespace=namespace)
+
+    def persist(self, persist_path: str, fs: Optional[Any] = None) -> None:
+        self._kvstore.persist(persist_path)
+
+    def iter_nodes(self) -> Iterator[Tuple[str, BaseNode]]:
+        """(node id, node) pairs, decoded lazily instead of all at once like ``docs``."""
+        for node_id, data in self._kvstore.iter_items(self._node_collection):
+            yield node_id, json_to_doc(data)
+
+    def compact(self, max_tables: int = MAX_TABLES) -> None:
+        """Merge tables left by checkpoints (see ``MmapKVStore.compact``)."""
+        self._kvstore.compact(max_tables)
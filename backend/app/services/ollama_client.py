@@ -0,0 +1,181 @@
+"""Ollama LLM with a real async implementation over a shared connection pool.
+
+The pinned ``llama_index.llms.ollama.Ollama`` only implements the sync API;
+its ``achat``/``acomplete`` fall back to the blocking calls and would stall
+the event loop for the whole generation. ``AsyncOllama`` keeps the sync
+behaviour and implements the async methods with one process-wide
+``httpx.AsyncClient`` (see ``ollama_pool``), so concurrent chats reuse
+keep-alive connections to Ollama instead of opening one per request.
+``keep_alive`` is forwarded to Ollama so the model stays loaded between
+requests. Token counts and throughput reported by Ollama are recorded in
+``app.core.metrics``.
+"""
+
+import json
+from typing import Any, Dict, Optional, Sequence
+
+from llama_index.core.base.llms.types import (
+    ChatMessage,
+    ChatResponse,
+    ChatResponseAsyncGen,
+    CompletionResponse,
+    CompletionResponseAsyncGen,
+    MessageRole,
+)
+from llama_index.core.bridge.pydantic import Field
+from llama_index.core.llms.callbacks import llm_chat_callback, llm_completion_callback
+from llama_index.llms.ollama import Ollama
+
+from app.core.metrics import record_llm_usage
+from app.services.ollama_pool import get_async_client
+
+
+def _extra(data: Dict[str, Any], exclude: Sequence[str]) -> Dict[str, Any]:
+    return {key: value for key, value in data.items() if key not in exclude}
+
+
+class AsyncOllama(Ollama):
+    """``Ollama`` whose async methods do not block the event loop."""
+
+    keep_alive: Optional[str] = Field(
+        default=None, description="How long Ollama keeps the model loaded (e.g. '30m', '-1')."
+    )
+
+    @classmethod
+    def class_name(cls) -> str:
+        return "AsyncOllama_llm"
+
+    def _chat_payload(self, messages: Sequence[ChatMessage], stream: bool, **kwargs: Any) -> Dict[str, Any]:
+        return {
+            "model": self.model,
+            "messages": [
+                {
+                    "role": message.role.value,
+                    "content": message.content,
+                    **message.additional_kwargs,
+                }
+                for message in messages
+            ],
+            "options": self._model_kwargs,
+            "stream": stream,
+            **self._keep_alive(),
+            **kwargs,
+        }
+
+    def _keep_alive(self) -> Dict[str, Any]:
+        return {"keep_alive": self.keep_alive} if self.keep_alive is not None else {}
+
+    def _completion_payload(self, prompt: str, stream: bool, **kwargs: Any) -> Dict[str, Any]:
+        return {
+            self.prompt_key: prompt,
+            "model": self.model,
+            "options": self._model_kwargs,
+            "stream": stream,
+            **self._keep_alive(),
+            **kwargs,
+        }
+
+    @llm_chat_callback()
+    async def achat(self, messages: Sequence[ChatMessage], **kwargs: Any) -> ChatResponse:
+        response = await get_async_client().post(
+            f"{self.base_url}/api/chat",
+            json=self._chat_payload(messages, stream=False, **kwargs),
+            timeout=self.request_timeout,
+        )
+        response.raise_for_status()
+        raw = response.json()
+        record_llm_usage(raw)
+        message = raw["message"]
+        return ChatResponse(
+            message=ChatMessage(
+                content=message.get("content"),
+                role=MessageRole(message.get("role")),
+                additional_kwargs=_extra(message, ("content", "role")),
+            ),
+            raw=raw,
+            additional_kwargs=_extra(raw, ("message",)),
+        )
+
+    @llm_chat_callback()
+    async def astream_chat(self, messages: Sequence[ChatMessage], **kwargs: Any) -> ChatResponseAsyncGen:
+        payload = self._chat_payload(messages, stream=True, **kwargs)
+
+        async def gen() -> ChatResponseAsyncGen:
+            async with get_async_client().stream(
+                "POST",
+                f"{self.base_url}/api/chat",
+                json=payload,
+                timeout=self.request_timeout,
+            ) as response:
+                response.raise_for_status()
+                text = ""
+                async for line in response.aiter_lines():
+                    if not line:
+                        continue
+                    chunk = json.loads(line)
+                    if chunk.get("done"):
+                        record_llm_usage(chunk)
+                        break
+                    message = chunk["message"]
+                    delta = message.get("content")
+                    text += delta
+                    yield ChatResponse(
+                        message=ChatMessage(
+                            content=text,
+                            role=MessageRole(message.get("role")),
+                            additional_kwargs=_extra(message, ("content", "role")),
+                        ),
+                        delta=delta,
+                        raw=chunk,
+                        additional_kwargs=_extra(chunk, ("message",)),
+                    )
+
+        return gen()
+
+    @llm_completion_callback()
+    async def acomplete(self, prompt: str, formatted: bool = False, **kwargs: Any) -> CompletionResponse:
+        response = await get_async_client().post(
+            f"{self.base_url}/api/generate",
+            json=self._completion_payload(prompt, stream=False, **kwargs),
+            timeout=self.request_timeout,
+        )
+        response.raise_for_status()
+        raw = response.json()
+        record_llm_usage(raw)
+        return CompletionResponse(
+            text=raw.get("response"),
+            raw=raw,
+            additional_kwargs=_extra(raw, ("response",)),
+        )
+
+    @llm_completion_callback()
+    async def astream_complete(
+        self, prompt: str, formatted: bool = False, **kwargs: Any
+    ) -> CompletionResponseAsyncGen:
+        payload = self._completion_payload(prompt, stream=True, **kwargs)
+
+        async def gen() -> CompletionResponseAsyncGen:
+            async with get_async_client().stream(
+                "POST",
+                f"{self.base_url}/api/generate",
+                json=payload,
+                timeout=self.request_timeout,
+            ) as response:
+                response.raise_for_status()
+                text = ""
+                async for line in response.aiter_lines():
+                    if not line:
+                        continue
+                    chunk = json.loads(line)
+                    if chunk.get("done"):
+                        record_llm_usage(chunk)
+                    delta = chunk.get("response")
+                    text += delta
+                    yield CompletionResponse(
+                        delta=delta,
+                        text=text,
+                        raw=chunk,
+                        additional_kwargs=_extra(chunk, ("response",)),
+                    )
+
+        return gen()
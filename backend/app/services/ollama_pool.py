@@ -0,0 +1,41 @@
+"""Process-wide async HTTP connection pool to Ollama.
+
+Kept apart from ``ollama_client`` (which imports LlamaIndex) so that the
+application startup, the warm-up and shutdown hooks can use the pool
+without importing the LLM classes.
+"""
+
+from typing import Optional
+
+import httpx
+
+_async_client: Optional[httpx.AsyncClient] = None
+_max_connections = 20
+
+
+def configure_pool(max_connections: int) -> None:
+    """Set the pool size used when the shared client is first created."""
+    global _max_connections
+    _max_connections = max_connections
+
+
+def get_async_client() -> httpx.AsyncClient:
+    """Process-wide async HTTP client for Ollama, created on first use."""
+    global _async_client
+    if _async_client is None or _async_client.is_closed:
+        _async_client = httpx.AsyncClient(
+            limits=httpx.Limits(
+                max_connections=_max_connections,
+                max_keepalive_connections=_max_connections,
+            ),
+            timeout=None,
+        )
+    return _async_client
+
+
+async def close_async_client() -> None:
+    """Close the shared client (application shutdown)."""
+    global _async_client
+    if _async_client is not None:
+        await _async_client.aclose()
+        _async_client = None
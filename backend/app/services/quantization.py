@@ -0,0 +1,437 @@
+"""Quantized embedding codes for scoring a collection on compressed vectors.
+
+A ``QuantizedIndex`` stores one compact code per row of a collection's
+``EmbeddingMatrix``:
+
+- ``int8``: scalar quantization, one signed byte per dimension with a
+  per-dimension offset and step (4x smaller than float32);
+- ``pq``: product quantization, the vector split into ``m`` sub-vectors each
+  replaced by the id of the nearest of 256 centroids (one byte per
+  sub-vector, e.g. 32x smaller with 8 dimensions per sub-vector).
+
+Queries are scored against the codes only (for PQ through a per-query lookup
+table of sub-vector/centroid dot products), and the ``rerank`` best
+candidates are then re-scored exactly on their float rows, so a search
+touches the small codes file plus a handful of float rows instead of the
+whole matrix. With ``rerank=0`` the code scores are final, so collections
+can keep the codes alone on disk, without any float rows. The codes live in ``quant/`` inside the collection's storage
+directory, memory-mapped on load, with the mode recorded in its metadata.
+
+After an incremental re-index, ``extend`` keeps the trained quantizer and
+encodes only the appended rows; it asks for retraining once too many rows
+changed since training or the new rows quantize clearly worse than the
+training rows did.
+"""
+
+import json
+import os
+import shutil
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+
+from app.services.embedding_matrix import EmbeddingMatrix, normalize, top_k_rows
+
+QUANT_DIRNAME = "quant"
+META_FILENAME = "quant.meta.json"
+CODES_FILENAME = "quant_codes.npy"
+QUANT_FORMAT = 1
+
+# Rows decoded/scored per block, to bound temporary float32 buffers
+SCORE_BLOCK_ROWS = 16384
+PQ_CENTROIDS = 256
+# Share of the training sample held out to measure the quantization error
+HOLDOUT_SHARE = 0.1
+KMEANS_ITERATIONS = 10
+
+
+class ScalarQuantizer:
+    """Per-dimension affine quantization to int8: ``x ≈ offset + scale * code``."""
+
+    mode = "int8"
+    code_dtype = np.int8
+
+    def __init__(self, offset: np.ndarray, scale: np.ndarray):
+        self.offset = offset
+        self.scale = scale
+
+    @property
+    def code_bytes(self) -> int:
+        return self.offset.shape[0]
+
+    @classmethod
+    def train(cls, sample: np.ndarray, **kwargs) -> "ScalarQuantizer":
+        sample = np.asarray(sample, dtype=np.float32)
+        low, high = sample.min(axis=0), sample.max(axis=0)
+        scale = (high - low) / 254.0
+        scale[scale == 0] = 1.0
+        return cls((high + low) / 2.0, scale.astype(np.float32))
+
+    def encode(self, vectors: np.ndarray) -> np.ndarray:
+        codes = np.rint((np.asarray(vectors, dtype=np.float32) - self.offset) / self.scale)
+        return np.clip(codes, -127, 127).astype(np.int8)
+
+    def decode(self, codes: np.ndarray) -> np.ndarray:
+        return self.offset + self.scale * codes.astype(np.float32)
+
+    def scorer(self, query: np.ndarray):
+        """Function scoring a block of codes against ``query`` (dot product)."""
+        weights = (query * self.scale).astype(np.float32)
+        bias = float(query @ self.offset)
+        return lambda codes: codes.astype(np.float32) @ weights + bias
+
+    def arrays(self) -> Dict[str, np.ndarray]:
+        return {"offset": self.offset, "scale": self.scale}
+
+    @classmethod
+    def from_arrays(cls, arrays: Dict[str, np.ndarray]) -> "ScalarQuantizer":
+        return cls(arrays["offset"], arrays["scale"])
+
+
+def _kmeans(vectors: np.ndarray, k: int, rng: np.random.Generator, iterations: int = KMEANS_ITERATIONS) -> np.ndarray:
+    """Euclidean k-means; returns the ``k`` centroids."""
+    centroids = vectors[rng.choice(len(vectors), k, replace=False)].copy()
+    for _ in range(iterations):
+        labels = _nearest(vectors, centroids)
+        counts = np.bincount(labels, minlength=k)
+        sums = np.stack([np.bincount(labels, weights=column, minlength=k) for column in vectors.T], axis=1)
+        filled = counts > 0
+        centroids[filled] = sums[filled] / counts[filled, None]
+        if not filled.all():
+            # Re-seed empty clusters with random vectors
+            centroids[~filled] = vectors[rng.choice(len(vectors), int((~filled).sum()), replace=False)]
+    return centroids
+
+
+def _nearest(vectors: np.ndarray, centroids: np.ndarray) -> np.ndarray:
+    """Index of the closest centroid (L2) for every vector, in blocks."""
+    norms = (centroids ** 2).sum(axis=1)
+    labels = np.empty(len(vectors), dtype=np.int64)
+    for start in range(0, len(vectors), SCORE_BLOCK_ROWS):
+        block = vectors[start:start + SCORE_BLOCK_ROWS]
+        labels[start:start + len(block)] = np.argmin(norms - 2.0 * block @ centroids.T, axis=1)
+    return labels
+
+
+class ProductQuantizer:
+    """Product quantization: ``m`` sub-vectors, each coded by a 256-entry codebook."""
+
+    mode = "pq"
+    code_dtype = np.uint8
+
+    def __init__(self, codebooks: np.ndarray):
+        # Shape (m, centroids, sub-vector dimension)
+        self.codebooks = codebooks
+
+    @property
+    def subvectors(self) -> int:
+        return self.codebooks.shape[0]
+
+    @property
+    def code_bytes(self) -> int:
+        return self.subvectors
+
+    @classmethod
+    def train(cls, sample: np.ndarray, subvectors: int = 0, seed: int = 0, **kwargs) -> "ProductQuantizer":
+        sample = np.asarray(sample, dtype=np.float32)
+        dim = sample.shape[1]
+        # Default: 8 dimensions per sub-vector; m must divide the dimension
+        m = min(subvectors or max(1, dim // 8), dim)
+        while dim % m:
+            m -= 1
+
+        rng = np.random.default_rng(seed)
+        k = min(PQ_CENTROIDS, len(sample))
+        parts = sample.reshape(len(sample), m, dim // m)
+        return cls(np.stack([_kmeans(np.ascontiguousarray(parts[:, j]), k, rng) for j in range(m)]))
+
+    def encode(self, vectors: np.ndarray) -> np.ndarray:
+        vectors = np.asarray(vectors, dtype=np.float32)
+        m, _, sub_dim = self.codebooks.shape
+        parts = vectors.reshape(len(vectors), m, sub_dim)
+        return np.stack([_nearest(parts[:, j], self.codebooks[j]) for j in range(m)], axis=1).astype(np.uint8)
+
+    def decode(self, codes: np.ndarray) -> np.ndarray:
+        m = self.subvectors
+        return self.codebooks[np.arange(m), codes].reshape(len(codes), -1)
+
+    def scorer(self, query: np.ndarray):
+        """Asymmetric distance computation: the query stays in float32."""
+        m, _, sub_dim = self.codebooks.shape
+        # table[j, c] = dot(query sub-vector j, centroid c of codebook j)
+        table = np.einsum("jcd,jd->jc", self.codebooks, query.reshape(m, sub_dim)).astype(np.float32)
+        columns = np.arange(m)
+        return lambda codes: table[columns, codes].sum(axis=1)
+
+    def arrays(self) -> Dict[str, np.ndarray]:
+        return {"codebooks": self.codebooks}
+
+    @classmethod
+    def from_arrays(cls, arrays: Dict[str, np.ndarray]) -> "ProductQuantizer":
+        return cls(arrays["codebooks"])
+
+
+QUANTIZERS = {"int8": ScalarQuantizer, "pq": ProductQuantizer}
+
+
+def _quantization_error(quantizer, vectors: np.ndarray) -> float:
+    """Mean squared distance between (up to a block of) ``vectors`` and their decoded codes."""
+    block = np.asarray(vectors[:SCORE_BLOCK_ROWS], dtype=np.float32)
+    if not len(block):
+        return 0.0
+    return float(((block - quantizer.decode(quantizer.encode(block))) ** 2).sum(axis=1).mean())
+
+
+def _allocate_codes(storage_path: Optional[str], quantizer, num_vectors: int) -> np.ndarray:
+    """Preallocated code matrix: a ``.npy`` memmap under ``storage_path`` (published by ``_publish``), or in memory."""
+    shape = (num_vectors, quantizer.code_bytes)
+    if storage_path is None:
+        return np.empty(shape, dtype=quantizer.code_dtype)
+
+    quant_path = os.path.join(storage_path, QUANT_DIRNAME)
+    os.makedirs(quant_path, exist_ok=True)
+    return np.lib.format.open_memmap(
+        os.path.join(quant_path, CODES_FILENAME + ".tmp"), mode="w+", dtype=quantizer.code_dtype, shape=shape
+    )
+
+
+class QuantizedIndex:
+    """Quantized codes of every row of an embedding matrix."""
+
+    def __init__(
+        self,
+        quantizer,
+        codes: np.ndarray,
+        num_vectors: int,
+        trained_vectors: Optional[int] = None,
+        error: Optional[float] = None,
+    ):
+        self.quantizer = quantizer
+        self.codes = codes
+        self.num_vectors = num_vectors
+        # Rows the quantizer was trained for and its error on them; None for
+        # indexes saved before these were recorded
+        self.trained_vectors = trained_vectors
+        self.error = error
+
+    @property
+    def mode(self) -> str:
+        return self.quantizer.mode
+
+    @property
+    def nbytes(self) -> int:
+        """Size of the codes (what a query scans)."""
+        return self.codes.nbytes
+
+    @classmethod
+    def build(
+        cls,
+        matrix: EmbeddingMatrix,
+        mode: str = "int8",
+        pq_subvectors: int = 0,
+        train_sample: int = 100000,
+        seed: int = 0,
+        storage_path: Optional[str] = None,
+    ) -> "QuantizedIndex":
+        """Train the quantizer on (a sample of) ``matrix`` and encode every row.
+
+        With ``storage_path`` the codes are encoded straight into the saved
+        (memory-mapped) codes file, which is then published with the
+        quantizer, instead of being held in memory.
+        """
+        if mode not in QUANTIZERS:
+            raise ValueError(f"Unsupported quantization mode: {mode}")
+
+        vectors = matrix.vectors
+        num_vectors = vectors.shape[0]
+        rng = np.random.default_rng(seed)
+        if num_vectors > train_sample:
+            sample = np.asarray(vectors[np.sort(rng.choice(num_vectors, train_sample, replace=False))])
+        else:
+            sample = vectors
+        # The error on rows the quantizer was not trained on is what new rows
+        # are compared against in ``extend``
+        held_out = rng.random(len(sample)) < HOLDOUT_SHARE
+        if held_out.any() and not held_out.all():
+            sample = np.asarray(sample)
+            quantizer = QUANTIZERS[mode].train(sample[~held_out], subvectors=pq_subvectors, seed=seed)
+            error = _quantization_error(quantizer, sample[held_out])
+        else:
+            quantizer = QUANTIZERS[mode].train(sample, subvectors=pq_subvectors, seed=seed)
+            error = _quantization_error(quantizer, sample)
+
+        codes = _allocate_codes(storage_path, quantizer, num_vectors)
+        for start in range(0, num_vectors, SCORE_BLOCK_ROWS):
+            end = min(start + SCORE_BLOCK_ROWS, num_vectors)
+            codes[start:end] = quantizer.encode(vectors[start:end])
+
+        quantized = cls(quantizer, codes, num_vectors, trained_vectors=num_vectors, error=error)
+        if storage_path is not None:
+            quantized._publish(storage_path)
+        return quantized
+
+    def extend(
+        self,
+        matrix: EmbeddingMatrix,
+        storage_path: str,
+        max_changed: float,
+        max_drift: float,
+    ) -> Optional["QuantizedIndex"]:
+        """Save to ``storage_path`` the codes of ``matrix``, encoding only the rows after ``num_vectors``.
+
+        The first ``num_vectors`` rows of ``matrix`` must be the rows these
+        codes were built from; their codes are copied block by block. Returns
+        None (and writes nothing) when the quantizer should be retrained
+        instead: when the rows added or deleted since training exceed
+        ``max_changed`` of the matrix, or when the new rows quantize with more
+        than ``max_drift`` (relative) extra error than the training rows.
+        """
+        vectors = matrix.vectors
+        num_vectors = vectors.shape[0]
+        if self.trained_vectors is None or self.error is None or num_vectors < self.num_vectors:
+            return None
+
+        deleted = 0 if matrix.deleted is None else len(matrix.deleted)
+        if abs(num_vectors - self.trained_vectors) + deleted > max_changed * num_vectors:
+            return None
+        new_rows = vectors[self.num_vectors:]
+        if len(new_rows) and _quantization_error(self.quantizer, new_rows) > self.error * (1.0 + max_drift):
+            return None
+
+        codes = _allocate_codes(storage_path, self.quantizer, num_vectors)
+        for start in range(0, self.num_vectors, SCORE_BLOCK_ROWS):
+            end = min(start + SCORE_BLOCK_ROWS, self.num_vectors)
+            codes[start:end] = self.codes[start:end]
+        for start in range(self.num_vectors, num_vectors, SCORE_BLOCK_ROWS):
+            end = min(start + SCORE_BLOCK_ROWS, num_vectors)
+            codes[start:end] = self.quantizer.encode(vectors[start:end])
+
+        extended = QuantizedIndex(
+            self.quantizer, codes, num_vectors, trained_vectors=self.trained_vectors, error=self.error
+        )
+        extended._publish(storage_path)
+        return extended
+
+    def matches(self, matrix: EmbeddingMatrix) -> bool:
+        """Whether these codes were built over the current rows of ``matrix``."""
+        return self.num_vectors == matrix.vectors.shape[0] and self.codes.shape[0] == self.num_vectors
+
+    def approximate_scores(self, query: np.ndarray, rows: Optional[np.ndarray] = None) -> np.ndarray:
+        """Dot products of ``query`` with the decoded rows (all, or ``rows``)."""
+        score = self.quantizer.scorer(normalize(query))
+        if rows is not None:
+            return score(self.codes[rows])
+
+        scores = np.empty(self.num_vectors, dtype=np.float32)
+        for start in range(0, self.num_vectors, SCORE_BLOCK_ROWS):
+            block = np.asarray(self.codes[start:start + SCORE_BLOCK_ROWS])
+            scores[start:start + len(block)] = score(block)
+        return scores
+
+    def search(
+        self,
+        matrix: EmbeddingMatrix,
+        query: np.ndarray,
+        top_k: int,
+        rerank: int,
+        rows: Optional[np.ndarray] = None,
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """Top-k by code scores over all rows (or ``rows``), re-ranked exactly.
+
+        The best ``max(rerank, top_k)`` candidates are re-scored on their
+        float rows; returned scores are exact cosine similarities. With
+        ``rerank=0`` no float row is read and the code scores are returned.
+        """
+        scores = self.approximate_scores(query, rows)
+        deleted = matrix.deleted
+        if deleted is not None:
+            if rows is None:
+                scores[deleted] = -np.inf
+            else:
+                scores[np.isin(rows, deleted)] = -np.inf
+
+        if rerank <= 0:
+            best = top_k_rows(scores, top_k)
+            return (best if rows is None else np.asarray(rows)[best]), scores[best]
+
+        best = top_k_rows(scores, max(rerank, top_k))
+        candidates = best if rows is None else np.asarray(rows)[best]
+        return matrix.search_rows(candidates, query, top_k)
+
+    # ------------------------------------------------------------------ #
+    # Persistence
+    # ------------------------------------------------------------------ #
+
+    @staticmethod
+    def exists(storage_path: str) -> bool:
+        return os.path.exists(os.path.join(storage_path, QUANT_DIRNAME, META_FILENAME))
+
+    @staticmethod
+    def remove(storage_path: str) -> None:
+        quant_path = os.path.join(storage_path, QUANT_DIRNAME)
+        if os.path.exists(quant_path):
+            shutil.rmtree(quant_path)
+
+    @staticmethod
+    def read_mode(storage_path: str) -> Optional[str]:
+        """Quantization mode recorded for a saved index; None if there is none."""
+        try:
+            with open(os.path.join(storage_path, QUANT_DIRNAME, META_FILENAME), "r", encoding="utf-8") as f:
+                return json.load(f).get("mode")
+        except FileNotFoundError:
+            return None
+
+    def save(self, storage_path: str) -> None:
+        """Write the codes to ``<storage_path>/quant``; metadata goes last."""
+        quant_path = os.path.join(storage_path, QUANT_DIRNAME)
+        os.makedirs(quant_path, exist_ok=True)
+
+        np.save(os.path.join(quant_path, CODES_FILENAME), self.codes)
+        self._save_quantizer(quant_path)
+
+    def _publish(self, storage_path: str) -> None:
+        """Publish codes encoded into the file from ``_allocate_codes``, then the quantizer."""
+        quant_path = os.path.join(storage_path, QUANT_DIRNAME)
+        codes_path = os.path.join(quant_path, CODES_FILENAME)
+        self.codes.flush()
+        os.replace(codes_path + ".tmp", codes_path)
+        self.codes = np.load(codes_path, mmap_mode="r")
+        self._save_quantizer(quant_path)
+
+    def _save_quantizer(self, quant_path: str) -> None:
+        """Write the quantizer arrays and, last, the metadata."""
+        arrays = self.quantizer.arrays()
+        for name, array in arrays.items():
+            np.save(os.path.join(quant_path, f"quant_{name}.npy"), array)
+
+        meta_path = os.path.join(quant_path, META_FILENAME)
+        with open(meta_path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump({
+                "format": QUANT_FORMAT,
+                "mode": self.mode,
+                "num_vectors": self.num_vectors,
+                "code_bytes": int(self.codes.shape[1]),
+                "arrays": sorted(arrays),
+                "trained_vectors": self.trained_vectors,
+                "error": self.error,
+            }, f)
+        os.replace(meta_path + ".tmp", meta_path)
+
+    @classmethod
+    def load(cls, storage_path: str) -> "QuantizedIndex":
+        """Open saved codes; the code matrix is memory-mapped."""
+        quant_path = os.path.join(storage_path, QUANT_DIRNAME)
+        with open(os.path.join(quant_path, META_FILENAME), "r", encoding="utf-8") as f:
+            meta = json.load(f)
+
+        if meta.get("format") != QUANT_FORMAT or meta.get("mode") not in QUANTIZERS:
+            raise ValueError(f"Unsupported quantized index in {storage_path}")
+
+        arrays = {name: np.load(os.path.join(quant_path, f"quant_{name}.npy")) for name in meta["arrays"]}
+        return cls(
+            QUANTIZERS[meta["mode"]].from_arrays(arrays),
+            np.load(os.path.join(quant_path, CODES_FILENAME), mmap_mode="r"),
+            meta["num_vectors"],
+            trained_vectors=meta.get("trained_vectors"),
+            error=meta.get("error"),
+        )
@@ -1,118 +1,1218 @@
 import os
-from typing import List, Optional
-from llama_index.core import VectorStoreIndex, SimpleDirectoryReader, Settings
-from llama_index.llms.ollama import Ollama
-from llama_index.embeddings.ollama import OllamaEmbedding
+import time
+import asyncio
+import shutil
+import logging
+import threading
+import weakref
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, AsyncIterator, Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+from llama_index.core import VectorStoreIndex, Settings, load_index_from_storage
 from llama_index.core.storage.storage_context import StorageContext
+from llama_index.core.query_engine import RetrieverQueryEngine
 from llama_index.core.storage.index_store import SimpleIndexStore
 from llama_index.core.storage.vector_store import SimpleVectorStore
 from llama_index.core.storage.docstore import SimpleDocumentStore
+from llama_index.core.schema import MetadataMode, QueryBundle
 from app.core.config import settings
+from app.core.metrics import metrics, record_stage, span
+from app.services import index_versions
+from app.services.index_manifest import diff_manifest, index_version, load_manifest, save_manifest
+from app.services.vector_store import MmapVectorStore
+from app.services.node_store import MmapDocumentStore
+from app.services.retrieval import (
+    BM25Retriever,
+    FederatedRetriever,
+    HybridRetriever,
+    MatrixRetriever,
+    matrix_from_index,
+)
+from app.services.ann import IVFIndex
+from app.services.quantization import QuantizedIndex
+from app.services.bm25 import BM25Index
+from app.services.index_cache import IndexCache, estimate_index_bytes
+from app.services.ollama_client import AsyncOllama
+from app.services.ollama_pool import configure_pool
+from app.services.embeddings import BatchedOllamaEmbedding
+from app.services.parsing import DocumentParser
+from app.services.ingestion import IngestionPipeline
+from app.services.embedding_cache import CachedEmbedding, get_embedding_cache, model_key
+from app.services.concurrency import ConcurrencyLimiter, QueueFullError
+from app.services.response_cache import CachedResponse, ResponseCache
+
+logger = logging.getLogger(__name__)
+
+class IndexingCancelled(Exception):
+    """Indexação interrompida a pedido; o último checkpoint foi salvo"""
 
 class RAGService:
     def __init__(self):
         self.setup_llm()
-        self.indexes = {}
+        self.indexes = IndexCache(
+            max_entries=settings.index_cache_max_entries,
+            max_bytes=settings.index_cache_max_bytes,
+            on_evict=self._release_collection
+        )
+        # Estruturas derivadas, por diretório da versão do índice
+        self.matrices = {}
+        self.ann_indexes = {}
+        self.quantized = {}
+        self.bm25_indexes = {}
+        
+        # Versão publicada em cache por coleção e versão de cada índice
+        # carregado; versões antigas ficam no disco enquanto houver consultas
+        # usando um índice delas
+        self.versions: Dict[str, str] = {}
+        self._versions_checked: Dict[str, float] = {}
+        self._index_paths = weakref.WeakKeyDictionary()
+        self.version_refs = index_versions.VersionRefs()
+        self._swap_lock = threading.Lock()
+        
+        # Caminho assíncrono: limite de gerações simultâneas e pool próprio
+        # para carregar índices sem ocupar o threadpool das requisições
+        self.limiter = ConcurrencyLimiter(
+            max_concurrent=settings.llm_max_concurrency,
+            max_queue=settings.llm_max_queue,
+            queue_timeout=settings.llm_queue_timeout
+        )
+        self._load_executor = ThreadPoolExecutor(
+            max_workers=settings.index_load_workers,
+            thread_name_prefix="index-load"
+        )
+        
+        # Respostas já geradas, por versão do índice de cada coleção
+        self.responses = None
+        if settings.response_cache_enabled:
+            self.responses = ResponseCache(
+                max_entries=settings.response_cache_max_entries,
+                ttl=settings.response_cache_ttl,
+                semantic_threshold=settings.response_cache_semantic_threshold
+            )
+        
+        self._register_metrics()
+    
+    def _register_metrics(self):
+        """Expor uso dos caches, tamanho dos índices e fila do LLM em /metrics"""
+        metrics.gauge(
+            "docuchat_index_cache_entries", "Collection indexes loaded in memory.",
+            fn=lambda: self.indexes.stats()["entries"]
+        )
+        metrics.gauge(
+            "docuchat_index_cache_bytes", "Estimated memory of the loaded indexes.",
+            fn=lambda: self.indexes.current_bytes
+        )
+        metrics.counter(
+            "docuchat_cache_hits_total", "Cache lookups answered from the cache.", ("cache",),
+            fn=self._cache_hits
+        )
+        metrics.counter(
+            "docuchat_cache_misses_total", "Cache lookups that missed.", ("cache",),
+            fn=self._cache_misses
+        )
+        metrics.gauge(
+            "docuchat_index_vectors", "Vectors in each loaded collection index.", ("collection",),
+            fn=lambda: {
+                name: len(self.matrices[path]) for name, path in list(self.versions.items())
+                if self.matrices.get(path) is not None
+            }
+        )
+        metrics.gauge(
+            "docuchat_llm_requests", "Generations running or waiting for a slot.", ("state",),
+            fn=lambda: {
+                "active": self.limiter.stats()["active"],
+                "waiting": self.limiter.stats()["waiting"],
+            }
+        )
+        if self.responses is not None:
+            metrics.gauge(
+                "docuchat_response_cache_entries", "Answers kept in the response cache.",
+                fn=lambda: self.responses.stats()["entries"]
+            )
+    
+    def _cache_hits(self) -> Dict[str, float]:
+        hits = {"index": self.indexes.hits}
+        if self.responses is not None:
+            stats = self.responses.stats()
+            hits["response"] = stats["exact_hits"] + stats["semantic_hits"]
+        if settings.embedding_cache_enabled:
+            hits["embedding"] = get_embedding_cache(settings.embedding_cache_path).stats()["hits"]
+        return hits
+    
+    def _cache_misses(self) -> Dict[str, float]:
+        misses = {"index": self.indexes.misses}
+        if self.responses is not None:
+            misses["response"] = self.responses.stats()["misses"]
+        if settings.embedding_cache_enabled:
+            misses["embedding"] = get_embedding_cache(settings.embedding_cache_path).stats()["misses"]
+        return misses
     
     def setup_llm(self):
         """Configurar LLM e embeddings com Ollama"""
-        Settings.llm = Ollama(
+        configure_pool(settings.ollama_max_connections)
+        Settings.llm = AsyncOllama(
             model=settings.DEFAULT_LLM_MODEL,
             base_url=settings.OLLAMA_BASE_URL,
-            request_timeout=120.0
+            request_timeout=120.0,
+            keep_alive=settings.ollama_keep_alive
         )
-        Settings.embed_model = OllamaEmbedding(
+        embed_model = BatchedOllamaEmbedding(
             model_name=settings.DEFAULT_EMBED_MODEL,
-            base_url=settings.OLLAMA_BASE_URL
+            base_url=settings.OLLAMA_BASE_URL,
+            batch_size=settings.embed_batch_size,
+            max_concurrency=settings.embed_concurrency,
+            max_retries=settings.embed_max_retries,
+            keep_alive=settings.ollama_keep_alive
         )
+        
+        if settings.embedding_cache_enabled:
+            # Chunks já embedados (em qualquer coleção) vêm do cache em disco;
+            # vetores de um modelo de embedding anterior são descartados
+            cache = get_embedding_cache(settings.embedding_cache_path, settings.embedding_cache_max_bytes)
+            cache.retain_model(model_key(embed_model))
+            embed_model = CachedEmbedding(embed_model, cache)
+        
+        Settings.embed_model = embed_model
     
-    def create_collection_index(self, collection_name: str, documents_path: str) -> bool:
-        """Criar índice para uma coleção de documentos"""
+    def create_collection_index(
+        self,
+        collection_name: str,
+        documents_path: str,
+        incremental: bool = True,
+        progress: Optional[Callable[[int, int, int], None]] = None,
+        should_cancel: Optional[Callable[[], bool]] = None,
+        checkpoint_every: int = 0
+    ) -> bool:
+        """Criar ou atualizar o índice de uma coleção de documentos
+
+        No modo incremental apenas arquivos novos ou alterados (segundo o
+        manifesto de hashes) são lidos e embedados, e os nós de arquivos
+        removidos são apagados do índice.
+
+        ``progress(arquivos_feitos, total_arquivos, chunks_embedados)`` é
+        chamado após cada lote embedado. A cada ``checkpoint_every`` arquivos
+        (ou ``ingest_checkpoint_chunks`` chunks) o índice e o manifesto
+        parcial são persistidos entre dois arquivos, de modo que uma nova
+        execução incremental continua de onde a anterior parou. Se
+        ``should_cancel()`` retornar verdadeiro, um checkpoint é gravado e
+        IndexingCancelled é levantada.
+
+        Cada build grava uma nova versão do índice (ver index_versions),
+        partindo de uma cópia própria da versão publicada, e só a publica no
+        fim; até lá as consultas seguem na versão anterior, sem bloqueio.
+        """
         try:
             if not os.path.exists(documents_path):
                 return False
             
-            # Carregar documentos
-            documents = SimpleDirectoryReader(documents_path).load_data()
+            root = os.path.join(settings.INDEX_STORAGE_PATH, collection_name)
             
-            if not documents:
-                return False
+            # Nova versão, ou a de um build interrompido com checkpoint
+            version = index_versions.begin(root, resume=incremental)
+            storage_path = index_versions.version_path(root, version)
             
-            # Adicionar metadados
-            for doc in documents:
-                doc.metadata["collection"] = collection_name
+            # Índice existente só é reaproveitado se houver manifesto: o do
+            # checkpoint da versão em construção ou uma cópia da publicada
+            # (nunca o índice em cache, que atende consultas)
+            with span("index_load"):
+                manifest, base_path = {}, None
+                if incremental:
+                    base_path = storage_path
+                    manifest = load_manifest(base_path)
+                    if not manifest:
+                        base_path = index_versions.resolve(root)
+                        manifest = load_manifest(base_path) if base_path else {}
+                index = self._load_index_from(base_path) if manifest else None
+            if index is None:
+                manifest = {}
+            resumed = index is not None and base_path == storage_path
+            from_published = index is not None and not resumed
             
-            # Criar índice
-            index = VectorStoreIndex.from_documents(documents)
+            with span("index_diff"):
+                diff = diff_manifest(documents_path, manifest)
             
-            # Salvar índice
-            storage_path = os.path.join(settings.INDEX_STORAGE_PATH, collection_name)
-            index.storage_context.persist(persist_dir=storage_path)
+            if not diff.entries or (index is not None and not diff.has_changes and not resumed):
+                if not resumed:
+                    shutil.rmtree(storage_path, ignore_errors=True)
+                return bool(diff.entries)
+            
+            if index is not None and not self._restore_vectors(index, base_path, storage_path):
+                # Base sem vetores nem códigos: reconstruir do zero
+                logger.warning("Vetores da coleção %s não podem ser restaurados; reconstruindo", collection_name)
+                index, manifest, resumed, from_published = None, {}, False, False
+                diff = diff_manifest(documents_path, manifest)
+            
+            if index is None:
+                index = VectorStoreIndex(
+                    nodes=[],
+                    storage_context=self._new_storage_context(storage_path)
+                )
+            
+            # Remover nós de arquivos alterados ou removidos
+            removed_node_ids: List[str] = []
+            for name in diff.changed + diff.removed:
+                for doc_id in manifest[name].get("doc_ids", []):
+                    ref_doc_info = index.docstore.get_ref_doc_info(doc_id)
+                    if ref_doc_info is not None:
+                        removed_node_ids.extend(ref_doc_info.node_ids)
+                    index.delete_ref_doc(doc_id, delete_from_docstore=True)
+            added_node_ids: List[str] = []
+            
+            files = {}
+            for name in diff.unchanged:
+                files[name] = dict(diff.entries[name], doc_ids=manifest[name].get("doc_ids", []))
+            
+            def checkpoint():
+                # O manifesto vem depois do índice: só lista o que já foi salvo
+                index.storage_context.persist(persist_dir=storage_path)
+                save_manifest(storage_path, files)
+            
+            # Pipeline em fluxo (leitura -> chunks -> embeddings) com filas
+            # limitadas: só alguns lotes ficam em memória, qualquer que seja o
+            # tamanho da coleção. Arquivos são lidos em processos paralelos;
+            # falhas e timeouts de um arquivo não interrompem os demais (ele
+            # fica fora do manifesto e é tentado de novo na próxima indexação)
+            pending = diff.added + diff.changed
+            parser = DocumentParser(workers=settings.parse_workers, timeout=settings.parse_timeout)
+            pipeline = IngestionPipeline(
+                parser=parser,
+                transformations=Settings.transformations,
+                embed_model=Settings.embed_model,
+                batch_size=Settings.embed_model.embed_batch_size,
+                queue_size=settings.ingest_queue_size,
+                metadata={"collection": collection_name}
+            )
+            
+            done = chunks = 0
+            files_since_checkpoint = chunks_since_checkpoint = 0
+            ingest_started = time.perf_counter()
+            batches = pipeline.run([os.path.join(documents_path, name) for name in pending])
+            try:
+                for batch in batches:
+                    if batch.nodes:
+                        index.insert_nodes(batch.nodes)
+                        added_node_ids.extend(node.node_id for node in batch.nodes)
+                    chunks += len(batch.nodes)
+                    chunks_since_checkpoint += len(batch.nodes)
+                    
+                    for result in batch.files:
+                        name = os.path.basename(result.path)
+                        if result.ok:
+                            for doc in result.documents:
+                                index.docstore.set_document_hash(doc.doc_id, doc.hash)
+                            files[name] = dict(diff.entries[name], doc_ids=[doc.doc_id for doc in result.documents])
+                        else:
+                            logger.warning("Erro ao ler %s: %s", name, result.error)
+                    done += len(batch.files)
+                    files_since_checkpoint += len(batch.files)
+                    
+                    if progress:
+                        progress(done, len(pending), chunks)
+                    
+                    if should_cancel and should_cancel():
+                        # Desfazer o arquivo gravado pela metade antes do checkpoint
+                        for doc_id in batch.open_doc_ids:
+                            index.delete_ref_doc(doc_id, delete_from_docstore=True)
+                        checkpoint()
+                        raise IndexingCancelled(collection_name)
+                    
+                    # Checkpoint só entre arquivos, para o manifesto bater com o índice
+                    if not batch.open_doc_ids and (
+                        (checkpoint_every and files_since_checkpoint >= checkpoint_every)
+                        or chunks_since_checkpoint >= settings.ingest_checkpoint_chunks
+                    ) and done < len(pending):
+                        checkpoint()
+                        files_since_checkpoint = chunks_since_checkpoint = 0
+            finally:
+                batches.close()
+                # Leitura, chunking e embeddings correm juntos no pipeline
+                record_stage("index_ingest", time.perf_counter() - ingest_started)
             
-            # Cache do índice
-            self.indexes[collection_name] = index
+            for extension, stats in parser.stats().items():
+                logger.info(
+                    "Leitura %s: %d arquivos (%d com erro), %.1f arquivos/s, %.1f MB/s",
+                    extension, stats["files"], stats["failed"], stats["files_per_sec"], stats["mb_per_sec"]
+                )
+            
+            if not files:
+                return False
+            
+            # Salvar índice e, por último, o manifesto
+            with span("index_persist"):
+                index.storage_context.persist(persist_dir=storage_path)
+                if isinstance(index.docstore, MmapDocumentStore):
+                    # Juntar as tabelas gravadas pelos checkpoints
+                    index.docstore.compact()
+            matrix = matrix_from_index(index)
+            # IVF e códigos da versão publicada valem para as linhas que não
+            # mudaram de posição; só as novas são atribuídas/codificadas
+            stable_rows = 0
+            if from_published and isinstance(index.vector_store, MmapVectorStore):
+                stable_rows = index.vector_store.stable_rows
+            with span("index_ann"):
+                previous_ann = self._load_ann_index(base_path) if stable_rows else None
+                if previous_ann is not None and previous_ann.num_vectors != stable_rows:
+                    previous_ann = None
+                ann = self._build_ann_index(matrix, storage_path, previous_ann)
+            with span("index_quantize"):
+                previous_quantized = self._load_quantized_index(base_path) if stable_rows else None
+                if previous_quantized is not None and previous_quantized.num_vectors != stable_rows:
+                    previous_quantized = None
+                quantized = self._build_quantized_index(matrix, storage_path, previous_quantized)
+            if (
+                quantized is not None
+                and not settings.quantization_keep_vectors
+                and isinstance(index.vector_store, MmapVectorStore)
+            ):
+                # Só os códigos ficam no disco; consultas não fazem re-rank
+                index.vector_store.drop_vectors()
+                matrix = matrix_from_index(index)
+            with span("index_bm25"):
+                # Partindo da versão publicada, só os nós alterados mudam no BM25
+                previous = None
+                if from_published:
+                    previous = self._load_bm25_index(base_path)
+                bm25 = self._build_bm25_index(
+                    index, storage_path, previous, removed_node_ids, added_node_ids
+                )
+            save_manifest(storage_path, files)
+            
+            # Publicar a versão e trocar o índice em cache; consultas em
+            # andamento terminam na versão anterior
+            index_versions.commit(root, version)
+            with self._swap_lock:
+                self.matrices[storage_path] = matrix
+                self.ann_indexes[storage_path] = ann
+                self.quantized[storage_path] = quantized
+                self.bm25_indexes[storage_path] = bm25
+                self._track_index(collection_name, version, storage_path, index)
+                self._cache_index(collection_name, index)
+                self._release_collection(collection_name, keep=storage_path)
+            
+            # Respostas da versão anterior deixam de valer
+            if self.responses is not None:
+                self.responses.invalidate(collection_name)
+            self._prune_versions(collection_name)
             return True
             
+        except IndexingCancelled:
+            raise
         except Exception as e:
-            print(f"Erro ao criar índice: {e}")
+            logger.exception("Erro ao criar índice da coleção %s", collection_name)
+            return False
+    
+    def _build_ann_index(
+        self,
+        matrix,
+        storage_path: str,
+        previous: Optional[IVFIndex] = None
+    ) -> Optional[IVFIndex]:
+        """(Re)construir o índice IVF de coleções grandes após a persistência
+
+        Com ``previous`` (o IVF da versão de onde o build partiu, sobre as
+        primeiras linhas de ``matrix``) os centróides são reaproveitados e só
+        as linhas novas são atribuídas, até que mudanças ou deriva passem dos
+        limites de ``index_retrain_*``.
+        """
+        if settings.ann_enabled and matrix is not None and len(matrix) >= settings.ann_min_vectors:
+            ann = None
+            if previous is not None and settings.ann_nlist in (0, previous.nlist):
+                ann = previous.extend(
+                    matrix,
+                    max_changed=settings.index_retrain_changed_ratio,
+                    max_drift=settings.index_retrain_drift
+                )
+            if ann is None:
+                ann = IVFIndex.build(matrix, nlist=settings.ann_nlist or None)
+            ann.save(storage_path)
+            return ann
+        
+        IVFIndex.remove(storage_path)
+        return None
+    
+    def _build_quantized_index(
+        self,
+        matrix,
+        storage_path: str,
+        previous: Optional[QuantizedIndex] = None
+    ) -> Optional[QuantizedIndex]:
+        """(Re)construir os códigos quantizados (int8 ou PQ) dos vetores
+
+        O modo fica registrado nos metadados em ``quant/``; consultas usam
+        os códigos que estiverem no disco, qualquer que seja a configuração.
+        Com ``previous`` no mesmo modo, o quantizador é reaproveitado e só
+        as linhas novas são codificadas (ver ``_build_ann_index``).
+        """
+        if settings.vector_quantization != "none" and matrix is not None and len(matrix):
+            quantized = None
+            if (
+                previous is not None
+                and previous.mode == settings.vector_quantization
+                and (
+                    previous.mode != "pq"
+                    or settings.quantization_pq_subvectors in (0, previous.quantizer.subvectors)
+                )
+            ):
+                quantized = previous.extend(
+                    matrix,
+                    storage_path,
+                    max_changed=settings.index_retrain_changed_ratio,
+                    max_drift=settings.index_retrain_drift
+                )
+            if quantized is None:
+                quantized = QuantizedIndex.build(
+                    matrix,
+                    mode=settings.vector_quantization,
+                    pq_subvectors=settings.quantization_pq_subvectors,
+                    storage_path=storage_path
+                )
+            return quantized
+        
+        QuantizedIndex.remove(storage_path)
+        return None
+    
+    def _restore_vectors(self, index: VectorStoreIndex, base_path: str, storage_path: str) -> bool:
+        """Recriar, a partir dos códigos, os vetores descartados da base (coleções só com códigos)
+
+        Os vetores decodificados são gravados na versão em construção, não na
+        base. False se a base não tem os códigos de todas as linhas.
+        """
+        vector_store = index.vector_store
+        if not isinstance(vector_store, MmapVectorStore) or vector_store.has_vectors:
+            return True
+        
+        quantized = self._load_quantized_index(base_path)
+        if quantized is None or quantized.num_vectors != vector_store.stable_rows:
             return False
+        
+        codes, quantizer = quantized.codes, quantized.quantizer
+        vector_store.restore_vectors(
+            storage_path,
+            lambda start, end: quantizer.decode(codes[start:end])
+        )
+        return True
+    
+    def _load_ann_index(self, storage_path: str) -> Optional[IVFIndex]:
+        """IVF salvo em ``storage_path`` (o do cache, se houver); None se não existir"""
+        ann = self.ann_indexes.get(storage_path)
+        if ann is not None or not IVFIndex.exists(storage_path):
+            return ann
+        try:
+            return IVFIndex.load(storage_path)
+        except ValueError:
+            return None
+    
+    def _load_quantized_index(self, storage_path: str) -> Optional[QuantizedIndex]:
+        """Códigos salvos em ``storage_path`` (os do cache, se houver); None se não existirem"""
+        quantized = self.quantized.get(storage_path)
+        if quantized is not None or not QuantizedIndex.exists(storage_path):
+            return quantized
+        try:
+            return QuantizedIndex.load(storage_path)
+        except ValueError:
+            return None
+    
+    def _build_bm25_index(
+        self,
+        index: VectorStoreIndex,
+        storage_path: str,
+        previous: Optional[BM25Index] = None,
+        removed_node_ids: Sequence[str] = (),
+        added_node_ids: Sequence[str] = ()
+    ) -> Optional[BM25Index]:
+        """Construir o índice de palavras-chave (BM25), ou atualizar ``previous``
+
+        Com ``previous`` (o BM25 da versão de onde o build partiu) só os nós
+        removidos e adicionados mudam; sem ele todos os nós são lidos, um a
+        um, do docstore.
+        """
+        if not settings.bm25_enabled:
+            BM25Index.remove(storage_path)
+            return None
+        
+        if previous is not None and (previous.k1, previous.b) == (settings.bm25_k1, settings.bm25_b):
+            bm25 = previous.update(removed_node_ids, self._node_texts(index, added_node_ids))
+        else:
+            bm25 = BM25Index.build(self._node_texts(index), k1=settings.bm25_k1, b=settings.bm25_b)
+        bm25.save(storage_path)
+        return bm25
+    
+    def _load_bm25_index(self, storage_path: str) -> Optional[BM25Index]:
+        """BM25 salvo em ``storage_path`` (o do cache, se houver); None se não existir"""
+        bm25 = self.bm25_indexes.get(storage_path)
+        if bm25 is not None or not BM25Index.exists(storage_path):
+            return bm25
+        try:
+            return BM25Index.load(storage_path)
+        except ValueError:
+            return None
+    
+    @staticmethod
+    def _node_texts(
+        index: VectorStoreIndex,
+        node_ids: Optional[Sequence[str]] = None
+    ) -> Iterator[Tuple[str, str]]:
+        """(id, texto) dos nós (todos ou ``node_ids``), decodificados um de cada vez"""
+        docstore = index.docstore
+        if node_ids is not None:
+            nodes = ((node_id, docstore.get_node(node_id)) for node_id in node_ids)
+        elif isinstance(docstore, MmapDocumentStore):
+            nodes = docstore.iter_nodes()
+        else:
+            nodes = docstore.docs.items()
+        for node_id, node in nodes:
+            yield node_id, node.get_content(metadata_mode=MetadataMode.EMBED)
+    
+    def _new_storage_context(self, storage_path: str) -> StorageContext:
+        """Criar storage context vazio com os backends de vetores e nós configurados"""
+        # Evitar que arquivos binários antigos tenham precedência no load
+        vector_store = None
+        if settings.vector_store_backend == "mmap":
+            vector_store = MmapVectorStore(dtype=settings.vector_store_dtype)
+        else:
+            MmapVectorStore.remove(storage_path)
+        
+        docstore = None
+        if settings.docstore_backend == "mmap":
+            docstore = MmapDocumentStore()
+        else:
+            MmapDocumentStore.remove(storage_path)
+        
+        return StorageContext.from_defaults(vector_store=vector_store, docstore=docstore)
+    
+    @staticmethod
+    def _load_index_from(storage_path: str) -> VectorStoreIndex:
+        """Carregar um índice persistido (vetores e nós via mmap, se houver)
+
+        Arquivos mapeados ficam no page cache do sistema, compartilhados por
+        todos os processos (workers) que carregam a mesma versão.
+        """
+        vector_store = None
+        if MmapVectorStore.exists(storage_path):
+            vector_store = MmapVectorStore.from_persist_dir(storage_path)
+        
+        docstore = None
+        if MmapDocumentStore.exists(storage_path):
+            docstore = MmapDocumentStore.from_persist_dir(storage_path)
+        
+        storage_context = StorageContext.from_defaults(
+            persist_dir=storage_path,
+            vector_store=vector_store,
+            docstore=docstore
+        )
+        return load_index_from_storage(storage_context)
     
     def load_collection_index(self, collection_name: str) -> Optional[VectorStoreIndex]:
-        """Carregar índice de uma coleção"""
+        """Carregar índice de uma coleção (a versão publicada)"""
         try:
-            if collection_name in self.indexes:
-                return self.indexes[collection_name]
+            index = self.indexes.get(collection_name)
+            if index is not None:
+                if not self._version_changed(collection_name):
+                    return index
+                # Reindexada por outro processo: trocar pela versão publicada
+                self.invalidate_collection(collection_name)
             
-            storage_path = os.path.join(settings.INDEX_STORAGE_PATH, collection_name)
-            
-            if not os.path.exists(storage_path):
+            root = os.path.join(settings.INDEX_STORAGE_PATH, collection_name)
+            version = index_versions.current_version(root)
+            if version is None:
                 return None
-            
-            # Carregar contexto de storage
-            storage_context = StorageContext.from_defaults(persist_dir=storage_path)
+            storage_path = index_versions.version_path(root, version)
             
             # Carregar índice
-            index = VectorStoreIndex.from_storage(storage_context)
-            self.indexes[collection_name] = index
+            with span("load_index"):
+                index = self._load_index_from(storage_path)
+            with self._swap_lock:
+                # Uma versão mais nova publicada durante o load tem precedência
+                # (peek: a consulta já contou como miss acima)
+                cached = self.indexes.peek(collection_name)
+                if cached is not None:
+                    return cached
+                self._track_index(collection_name, version, storage_path, index)
+                self._cache_index(collection_name, index)
             return index
             
         except Exception as e:
-            print(f"Erro ao carregar índice: {e}")
+            logger.exception("Erro ao carregar índice da coleção %s", collection_name)
             return None
     
+    def _version_changed(self, collection_name: str) -> bool:
+        """Verificar (no máximo a cada ``index_version_check_interval`` s) se
+        outro processo publicou uma nova versão do índice em cache
+
+        Com vários workers, só o que submeteu a indexação é avisado pelo job;
+        os demais percebem a troca pelo ponteiro da versão publicada.
+        """
+        interval = settings.index_version_check_interval
+        if interval <= 0:
+            return False
+        
+        now = time.monotonic()
+        if now - self._versions_checked.get(collection_name, 0.0) < interval:
+            return False
+        self._versions_checked[collection_name] = now
+        
+        root = os.path.join(settings.INDEX_STORAGE_PATH, collection_name)
+        current = index_versions.resolve(root)
+        return current is None or os.path.abspath(current) != os.path.abspath(self.versions.get(collection_name, ""))
+    
+    def is_collection_indexed(self, collection_name: str) -> bool:
+        """Verificar pelo disco se a coleção tem índice, sem carregá-lo"""
+        if collection_name in self.indexes:
+            return True
+        
+        root = os.path.join(settings.INDEX_STORAGE_PATH, collection_name)
+        return index_versions.current_version(root) is not None
+    
+    def _track_index(self, collection_name: str, version: str, storage_path: str, index: VectorStoreIndex):
+        """Registrar a versão de um índice carregado como a atual da coleção"""
+        self._index_paths[index] = storage_path
+        self.version_refs.track(collection_name, version, index)
+        self.versions[collection_name] = storage_path
+        self._versions_checked[collection_name] = time.monotonic()
+    
+    def _cache_index(self, collection_name: str, index: VectorStoreIndex):
+        """Guardar índice no cache LRU com o tamanho estimado em memória"""
+        storage_path = self._index_paths[index]
+        if storage_path not in self.matrices:
+            self.matrices[storage_path] = matrix_from_index(index)
+        matrix = self.matrices[storage_path]
+        
+        size = estimate_index_bytes(storage_path)
+        if matrix is not None:
+            size += matrix.resident_bytes
+        
+        self.indexes.put(collection_name, index, size)
+    
+    def invalidate_collection(self, collection_name: str):
+        """Descartar o índice em memória (ex.: reindexado por outro processo)"""
+        with self._swap_lock:
+            self.indexes.pop(collection_name)
+            self._release_collection(collection_name)
+        if self.responses is not None:
+            self.responses.invalidate(collection_name)
+        self._prune_versions(collection_name)
+    
+    def _release_collection(self, collection_name: str, keep: Optional[str] = None):
+        """Liberar estruturas derivadas de versões da coleção fora do cache
+
+        ``keep`` é o diretório da versão que continua em uso; sem ele, a
+        coleção inteira saiu do cache.
+        """
+        if keep is None:
+            self.versions.pop(collection_name, None)
+        
+        root = os.path.join(os.path.join(settings.INDEX_STORAGE_PATH, collection_name), "")
+        for derived in (self.matrices, self.ann_indexes, self.quantized, self.bm25_indexes):
+            for path in list(derived):
+                if path != keep and (path + os.sep).startswith(root):
+                    derived.pop(path, None)
+    
+    def _prune_versions(self, collection_name: str):
+        """Apagar do disco versões antigas que nenhuma consulta usa mais"""
+        root = os.path.join(settings.INDEX_STORAGE_PATH, collection_name)
+        try:
+            removed = index_versions.prune(
+                root,
+                keep=settings.index_versions_keep,
+                in_use=self.version_refs.in_use(collection_name)
+            )
+        except OSError:
+            logger.exception("Erro ao remover versões antigas da coleção %s", collection_name)
+            return
+        if removed:
+            logger.info("Versões removidas da coleção %s: %s", collection_name, ", ".join(v or "legada" for v in removed))
+    
+    def get_collection_retriever(
+        self,
+        collection_name: str,
+        index: VectorStoreIndex,
+        top_k: int = 3
+    ) -> Optional[MatrixRetriever]:
+        """Retriever vetorizado; usa o índice IVF e os códigos quantizados, se houver"""
+        storage_path, shared = self._index_version_path(collection_name, index)
+        matrices = self.matrices if shared else {}
+        if storage_path not in matrices:
+            matrices[storage_path] = matrix_from_index(index)
+        
+        matrix = matrices[storage_path]
+        if matrix is None:
+            return None
+        
+        ann = None
+        if settings.ann_enabled and len(matrix) >= settings.ann_min_vectors and storage_path is not None:
+            ann_indexes = self.ann_indexes if shared else {}
+            if storage_path not in ann_indexes:
+                if IVFIndex.exists(storage_path):
+                    ann_indexes[storage_path] = IVFIndex.load(storage_path)
+                else:
+                    ann_indexes[storage_path] = None
+            
+            ann = ann_indexes[storage_path]
+            if ann is not None and not ann.matches(matrix):
+                ann = None
+        
+        quantized = None
+        if storage_path is not None:
+            quantized_indexes = self.quantized if shared else {}
+            if storage_path not in quantized_indexes:
+                if QuantizedIndex.exists(storage_path):
+                    quantized_indexes[storage_path] = QuantizedIndex.load(storage_path)
+                else:
+                    quantized_indexes[storage_path] = None
+            
+            quantized = quantized_indexes[storage_path]
+            if quantized is not None and not quantized.matches(matrix):
+                quantized = None
+        if quantized is None and not self._has_vectors(index):
+            logger.warning("Coleção %s sem vetores float nem códigos válidos", collection_name)
+            return None
+        
+        return MatrixRetriever(
+            index,
+            matrix,
+            similarity_top_k=top_k,
+            ann=ann,
+            nprobe=settings.ann_nprobe,
+            quantized=quantized,
+            # Sem vetores float (só códigos) não há re-rank
+            rerank=settings.quantization_rerank if self._has_vectors(index) else 0
+        )
+    
+    @staticmethod
+    def _has_vectors(index: VectorStoreIndex) -> bool:
+        """Se a coleção guarda os vetores float (e não só os códigos quantizados)"""
+        vector_store = index.vector_store
+        return not isinstance(vector_store, MmapVectorStore) or vector_store.has_vectors
+    
+    def get_keyword_retriever(
+        self,
+        collection_name: str,
+        index: VectorStoreIndex,
+        top_k: int = 3
+    ) -> Optional[BM25Retriever]:
+        """Retriever BM25; None se a coleção não tem índice de palavras-chave"""
+        storage_path, shared = self._index_version_path(collection_name, index)
+        if storage_path is None:
+            return None
+        
+        bm25_indexes = self.bm25_indexes if shared else {}
+        if storage_path not in bm25_indexes:
+            if BM25Index.exists(storage_path):
+                bm25_indexes[storage_path] = BM25Index.load(storage_path)
+            else:
+                bm25_indexes[storage_path] = None
+        
+        bm25 = bm25_indexes[storage_path]
+        if bm25 is None:
+            return None
+        return BM25Retriever(index, bm25, similarity_top_k=top_k)
+    
+    def _index_version_path(self, collection_name: str, index: VectorStoreIndex) -> Tuple[Optional[str], bool]:
+        """Diretório da versão de ``index`` e se ela é a atual da coleção
+
+        Estruturas derivadas só são compartilhadas (e guardadas) para a
+        versão atual; uma consulta que começou antes de uma troca de versão
+        termina com as da sua própria versão, montadas só para ela.
+        """
+        storage_path = self._index_paths.get(index)
+        return storage_path, storage_path is not None and self.versions.get(collection_name) == storage_path
+    
+    def search_collection(
+        self,
+        collection_name: str,
+        query: str,
+        top_k: int = 5,
+        mode: str = "vector"
+    ) -> Optional[Dict[str, Any]]:
+        """Buscar os trechos mais relevantes, sem gerar resposta com o LLM
+
+        ``mode`` é "vector", "keyword" (BM25) ou "hybrid" (fusão dos dois por
+        reciprocal rank fusion). Sem índice BM25 (coleção indexada antes dele
+        existir), a busca cai para "vector". None se a coleção não está
+        indexada.
+        """
+        index = self.load_collection_index(collection_name)
+        if not index:
+            return None
+        
+        keyword = None
+        if mode != "vector":
+            candidates = top_k if mode == "keyword" else max(top_k, settings.hybrid_candidates)
+            keyword = self.get_keyword_retriever(collection_name, index, candidates)
+            if keyword is None:
+                mode = "vector"
+        
+        if mode == "keyword":
+            retriever = keyword
+        else:
+            candidates = top_k if mode == "vector" else max(top_k, settings.hybrid_candidates)
+            retriever = (
+                self.get_collection_retriever(collection_name, index, candidates)
+                or index.as_retriever(similarity_top_k=candidates)
+            )
+            if mode == "hybrid":
+                retriever = HybridRetriever(
+                    [retriever, keyword],
+                    similarity_top_k=top_k,
+                    rrf_k=settings.hybrid_rrf_k
+                )
+        
+        nodes = retriever.retrieve(query)
+        return {
+            "mode": mode,
+            "sources": [self._format_source(node) for node in nodes]
+        }
+    
+    def _build_query_engine(
+        self,
+        collection_name: str,
+        index: VectorStoreIndex,
+        top_k: int,
+        streaming: bool = False
+    ):
+        """Montar query engine com o retriever vetorizado, se disponível"""
+        retriever = self.get_collection_retriever(collection_name, index, top_k)
+        
+        if retriever:
+            return RetrieverQueryEngine.from_args(retriever, streaming=streaming)
+        return index.as_query_engine(similarity_top_k=top_k, streaming=streaming)
+    
+    @staticmethod
+    def _format_source(node) -> Dict[str, Any]:
+        """Converter um nó recuperado em dicionário serializável"""
+        return {
+            "text": node.text,
+            "score": node.score,
+            "metadata": node.metadata
+        }
+    
+    def _response_scope(self, collection_name: str, top_k: int) -> Optional[tuple]:
+        """Escopo do cache de respostas; muda a cada reindexação da coleção"""
+        if self.responses is None:
+            return None
+        
+        storage_path = index_versions.resolve(os.path.join(settings.INDEX_STORAGE_PATH, collection_name))
+        version = index_version(storage_path) if storage_path else None
+        if version is None:
+            return None
+        return (collection_name, version, top_k, settings.DEFAULT_LLM_MODEL)
+    
+    def _lookup_response(
+        self,
+        scope: Optional[tuple],
+        query: str
+    ) -> Tuple[QueryBundle, Optional[CachedResponse]]:
+        """Procurar resposta em cache pelo texto exato e, se ativo, por semelhança
+
+        O embedding calculado para a busca semântica fica no QueryBundle e é
+        reaproveitado pelo retriever quando não há resposta em cache.
+        """
+        query_bundle = QueryBundle(query_str=query)
+        if scope is None:
+            return query_bundle, None
+        
+        cached = self.responses.get(scope, query)
+        if cached is None and self.responses.semantic:
+            self._embed_query(query_bundle)
+            cached = self.responses.get_similar(scope, query_bundle.embedding)
+        return query_bundle, cached
+    
+    @staticmethod
+    def _embed_query(query_bundle: QueryBundle):
+        """Calcular o embedding da consulta uma única vez (reaproveitado pelos retrievers)"""
+        if query_bundle.embedding is None:
+            with span("embed"):
+                query_bundle.embedding = Settings.embed_model.get_agg_embedding_from_queries(
+                    query_bundle.embedding_strs
+                )
+    
+    def _run_query(self, query_engine: RetrieverQueryEngine, query_bundle: QueryBundle):
+        """Executar a consulta medindo embedding, recuperação e geração em separado"""
+        self._embed_query(query_bundle)
+        with span("retrieve"):
+            nodes = query_engine.retrieve(query_bundle)
+        with span("generate"):
+            return query_engine.synthesize(query_bundle, nodes)
+    
+    async def _arun_query(
+        self,
+        query_engine: RetrieverQueryEngine,
+        query_bundle: QueryBundle,
+        streaming: bool = False
+    ):
+        """Versão assíncrona de _run_query"""
+        await asyncio.to_thread(self._embed_query, query_bundle)
+        with span("retrieve"):
+            nodes = await query_engine.aretrieve(query_bundle)
+        if streaming:
+            # A geração é medida por quem consome os tokens
+            return await query_engine.asynthesize(query_bundle, nodes)
+        with span("generate"):
+            return await query_engine.asynthesize(query_bundle, nodes)
+    
+    def _store_response(
+        self,
+        scope: Optional[tuple],
+        query_bundle: QueryBundle,
+        text: str,
+        source_nodes: List[Any],
+        started: float
+    ):
+        """Guardar uma resposta gerada com sucesso e o tempo que ela custou"""
+        if scope is None:
+            return
+        
+        self.responses.put(
+            scope,
+            query_bundle.query_str,
+            text,
+            [self._format_source(node) for node in source_nodes],
+            latency=time.perf_counter() - started,
+            embedding=query_bundle.embedding
+        )
+    
     def query_collection(self, collection_name: str, query: str, top_k: int = 3) -> str:
         """Fazer consulta em uma coleção"""
         try:
+            started = time.perf_counter()
+            scope = self._response_scope(collection_name, top_k)
+            query_bundle, cached = self._lookup_response(scope, query)
+            if cached:
+                return cached.response
+            
             index = self.load_collection_index(collection_name)
             
             if not index:
                 return "Coleção não encontrada ou não indexada."
             
-            query_engine = index.as_query_engine(similarity_top_k=top_k)
-            response = query_engine.query(query)
+            query_engine = self._build_query_engine(collection_name, index, top_k)
+            response = self._run_query(query_engine, query_bundle)
             
+            self._store_response(scope, query_bundle, str(response), response.source_nodes, started)
             return str(response)
             
         except Exception as e:
-            print(f"Erro na consulta: {e}")
+            logger.exception("Erro na consulta")
             return f"Erro ao processar consulta: {str(e)}"
     
+    async def _aload_collection_index(self, collection_name: str) -> Optional[VectorStoreIndex]:
+        """Carregar índice no pool dedicado, sem bloquear o event loop"""
+        loop = asyncio.get_running_loop()
+        # Copiar o contexto para os tempos entrarem no Server-Timing da requisição
+        return await loop.run_in_executor(
+            self._load_executor, contextvars.copy_context().run,
+            self.load_collection_index, collection_name
+        )
+    
+    async def apreload_collection(self, collection_name: str) -> bool:
+        """Carregar o índice e as estruturas de busca (matriz, IVF, BM25)
+
+        Usado no aquecimento da inicialização; False se não está indexada.
+        """
+        index = await self._aload_collection_index(collection_name)
+        if index is None:
+            return False
+        
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(
+            self._load_executor, self.get_collection_retriever, collection_name, index
+        )
+        await loop.run_in_executor(
+            self._load_executor, self.get_keyword_retriever, collection_name, index
+        )
+        return True
+    
+    async def aquery_collection(self, collection_name: str, query: str, top_k: int = 3) -> str:
+        """Fazer consulta assíncrona em uma coleção
+
+        Levanta QueueFullError quando não há vaga para gerar a resposta.
+        """
+        return await self.aquery_collections([collection_name], query, top_k)
+    
+    async def aquery_collections(self, collection_names: List[str], query: str, top_k: int = 3) -> str:
+        """Fazer consulta assíncrona em uma ou mais coleções
+
+        Com várias coleções, a recuperação roda em paralelo em todos os
+        índices, os candidatos são unidos num top-k global por score e há uma
+        única geração com o LLM sobre o contexto unido.
+
+        Levanta QueueFullError quando não há vaga para gerar a resposta.
+        """
+        try:
+            started = time.perf_counter()
+            scope = self._query_scope(collection_names, top_k)
+            query_bundle, cached = await asyncio.to_thread(self._lookup_response, scope, query)
+            if cached:
+                return cached.response
+            
+            indexes = await self._aload_collection_indexes(collection_names)
+            
+            missing = [name for name, index in zip(collection_names, indexes) if not index]
+            if missing:
+                return self._not_indexed_message(collection_names, missing)
+            
+            async with self.limiter.slot():
+                query_engine = self._build_collections_query_engine(collection_names, indexes, top_k)
+                response = await self._arun_query(query_engine, query_bundle)
+            
+            self._store_response(scope, query_bundle, str(response), response.source_nodes, started)
+            return str(response)
+            
+        except QueueFullError:
+            raise
+        except Exception as e:
+            logger.exception("Erro na consulta")
+            return f"Erro ao processar consulta: {str(e)}"
+    
+    def _query_scope(self, collection_names: List[str], top_k: int) -> Optional[tuple]:
+        """Escopo do cache de respostas para uma ou mais coleções"""
+        scopes = [self._response_scope(name, top_k) for name in collection_names]
+        if any(scope is None for scope in scopes):
+            return None
+        if len(scopes) == 1:
+            return scopes[0]
+        return (
+            tuple(collection_names),
+            tuple(scope[1] for scope in scopes),
+            top_k,
+            settings.DEFAULT_LLM_MODEL
+        )
+    
+    async def _aload_collection_indexes(self, collection_names: List[str]) -> List[Optional[VectorStoreIndex]]:
+        """Carregar os índices de várias coleções em paralelo"""
+        return await asyncio.gather(*(self._aload_collection_index(name) for name in collection_names))
+    
+    @staticmethod
+    def _not_indexed_message(collection_names: List[str], missing: List[str]) -> str:
+        if len(collection_names) == 1:
+            return "Coleção não encontrada ou não indexada."
+        return f"Coleções não encontradas ou não indexadas: {', '.join(missing)}."
+    
+    def _build_collections_query_engine(
+        self,
+        collection_names: List[str],
+        indexes: List[VectorStoreIndex],
+        top_k: int,
+        streaming: bool = False
+    ):
+        """Query engine de uma coleção ou, com várias, sobre o top-k global delas"""
+        if len(collection_names) == 1:
+            return self._build_query_engine(collection_names[0], indexes[0], top_k, streaming=streaming)
+        
+        retrievers = [
+            self.get_collection_retriever(name, index, top_k)
+            or index.as_retriever(similarity_top_k=top_k)
+            for name, index in zip(collection_names, indexes)
+        ]
+        retriever = FederatedRetriever(retrievers, similarity_top_k=top_k)
+        return RetrieverQueryEngine.from_args(retriever, streaming=streaming)
+    
+    async def astream_query_collection(
+        self,
+        collection_name: str,
+        query: str,
+        top_k: int = 3
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """Consulta em streaming: eventos "sources", "token"... e "done"
+
+        A vaga no limitador é obtida antes de devolver o gerador, para que
+        QueueFullError possa virar 429 antes de a resposta começar. Respostas
+        em cache não ocupam vaga.
+        """
+        return await self.astream_query_collections([collection_name], query, top_k)
+    
+    async def astream_query_collections(
+        self,
+        collection_names: List[str],
+        query: str,
+        top_k: int = 3
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """Consulta em streaming sobre uma ou mais coleções (ver aquery_collections)"""
+        started = time.perf_counter()
+        scope = self._query_scope(collection_names, top_k)
+        query_bundle, cached = await asyncio.to_thread(self._lookup_response, scope, query)
+        if cached:
+            return self._cached_events(cached)
+        
+        indexes = await self._aload_collection_indexes(collection_names)
+        slot_started = await self.limiter.acquire()
+        # A vaga é liberada quando o stream termina, é fechado ou descartado,
+        # mesmo que o gerador nunca chegue a ser iterado
+        return self.limiter.stream(
+            slot_started,
+            self._stream_events(collection_names, indexes, query_bundle, top_k, scope, started)
+        )
+    
+    @staticmethod
+    async def _cached_events(cached: CachedResponse) -> AsyncIterator[Dict[str, Any]]:
+        """Repetir uma resposta em cache no formato dos eventos de streaming"""
+        yield {"type": "sources", "sources": cached.sources}
+        yield {"type": "token", "text": cached.response}
+        yield {"type": "done", "cached": True}
+    
+    async def _stream_events(
+        self,
+        collection_names: List[str],
+        indexes: List[Optional[VectorStoreIndex]],
+        query_bundle: QueryBundle,
+        top_k: int,
+        scope: Optional[tuple],
+        started: float
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """Gerar os eventos da consulta (a vaga é do SlotStream que o envolve)
+
+        A recuperação acontece antes do primeiro evento; os tokens do LLM são
+        repassados à medida que o Ollama os gera. Falhas viram um evento
+        "error" em vez de exceção, pois a resposta HTTP já começou.
+        """
+        try:
+            missing = [name for name, index in zip(collection_names, indexes) if not index]
+            if missing:
+                yield {"type": "error", "message": self._not_indexed_message(collection_names, missing)}
+                return
+            
+            query_engine = self._build_collections_query_engine(
+                collection_names, indexes, top_k, streaming=True
+            )
+            response = await self._arun_query(query_engine, query_bundle, streaming=True)
+            
+            yield {
+                "type": "sources",
+                "sources": [self._format_source(node) for node in response.source_nodes]
+            }
+            
+            tokens = []
+            generate_started = time.perf_counter()
+            async for token in response.async_response_gen():
+                if not tokens:
+                    record_stage("first_token", time.perf_counter() - generate_started)
+                tokens.append(token)
+                yield {"type": "token", "text": token}
+            record_stage("generate", time.perf_counter() - generate_started)
+            
+            # Só respostas completas vão para o cache
+            self._store_response(scope, query_bundle, "".join(tokens), response.source_nodes, started)
+            yield {"type": "done"}
+            
+        except Exception as e:
+            logger.exception("Erro na consulta em streaming")
+            yield {"type": "error", "message": f"Erro ao processar consulta: {str(e)}"}
+    
     def delete_collection_index(self, collection_name: str) -> bool:
         """Deletar índice de uma coleção"""
         try:
             storage_path = os.path.join(settings.INDEX_STORAGE_PATH, collection_name)
             
+            # Consultas em andamento terminam com os arquivos já abertos
             if os.path.exists(storage_path):
-                import shutil
                 shutil.rmtree(storage_path)
             
-            if collection_name in self.indexes:
-                del self.indexes[collection_name]
+            self.invalidate_collection(collection_name)
             
             return True
             
         except Exception as e:
-            print(f"Erro ao deletar índice: {e}")
+            logger.exception("Erro ao deletar índice da coleção %s", collection_name)
             return False
 
 # Instância global
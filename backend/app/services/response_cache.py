@@ -0,0 +1,170 @@
+"""Cache of generated answers for repeated questions.
+
+Answers are keyed by a scope, (collection, index version, top_k, LLM model),
+plus the normalized query text; answers over several collections use tuples
+of names and versions. The index version changes whenever the
+collection is re-indexed, so stale answers are never served even when the
+index was rebuilt by another process; ``invalidate`` additionally drops a
+collection's entries eagerly.
+
+With ``semantic_threshold`` > 0 a second tier compares the query embedding
+with those of cached questions in the same scope and reuses the answer of
+the closest one when its cosine similarity reaches the threshold.
+"""
+
+import re
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Dict, Hashable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from app.services.embedding_matrix import normalize
+
+
+def normalize_query(query: str) -> str:
+    """Case-folded, whitespace-collapsed query without surrounding punctuation."""
+    text = " ".join(unicodedata.normalize("NFC", query).casefold().split())
+    return re.sub(r"^\W+|\W+$", "", text)
+
+
+@dataclass
+class CachedResponse:
+    response: str
+    sources: List[Dict[str, Any]]
+    latency: float
+    created: float
+    embedding: Optional[np.ndarray] = None
+
+
+class ResponseCache:
+    """Thread-safe LRU of answers with an optional semantic-match tier.
+
+    ``ttl`` of 0 keeps entries until they are evicted or invalidated.
+    """
+
+    def __init__(self, max_entries: int = 1024, ttl: float = 0, semantic_threshold: float = 0.0):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.semantic_threshold = semantic_threshold
+        self._entries: "OrderedDict[Tuple[Hashable, str], CachedResponse]" = OrderedDict()
+        # Per scope: (keys, normalized embedding matrix), rebuilt lazily
+        self._matrices: Dict[Hashable, Tuple[List[Tuple[Hashable, str]], np.ndarray]] = {}
+        self._lock = threading.Lock()
+        self.exact_hits = 0
+        self.semantic_hits = 0
+        self.misses = 0
+        self.saved_seconds = 0.0
+
+    @property
+    def semantic(self) -> bool:
+        return self.semantic_threshold > 0
+
+    def _expired(self, entry: CachedResponse) -> bool:
+        return bool(self.ttl) and time.time() - entry.created > self.ttl
+
+    def _hit(self, key: Tuple[Hashable, str], entry: CachedResponse, semantic: bool) -> CachedResponse:
+        self._entries.move_to_end(key)
+        if semantic:
+            self.semantic_hits += 1
+        else:
+            self.exact_hits += 1
+        self.saved_seconds += entry.latency
+        return entry
+
+    def _drop(self, key: Tuple[Hashable, str]) -> None:
+        if self._entries.pop(key, None) is not None:
+            self._matrices.pop(key[0], None)
+
+    def get(self, scope: Hashable, query: str) -> Optional[CachedResponse]:
+        """Exact tier; counts a miss only when there is no semantic tier."""
+        key = (scope, normalize_query(query))
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and self._expired(entry):
+                self._drop(key)
+                entry = None
+            if entry is not None:
+                return self._hit(key, entry, semantic=False)
+            if not self.semantic:
+                self.misses += 1
+            return None
+
+    def get_similar(self, scope: Hashable, embedding: Sequence[float]) -> Optional[CachedResponse]:
+        """Semantic tier: closest cached question of ``scope`` above the threshold."""
+        query = normalize(np.asarray(embedding, dtype=np.float32))
+        with self._lock:
+            if scope not in self._matrices:
+                keys = [
+                    key for key, entry in self._entries.items()
+                    if key[0] == scope and entry.embedding is not None and not self._expired(entry)
+                ]
+                matrix = np.vstack([self._entries[key].embedding for key in keys]) if keys else None
+                self._matrices[scope] = (keys, matrix)
+
+            keys, matrix = self._matrices[scope]
+            if matrix is not None and matrix.shape[1] == query.shape[0]:
+                scores = matrix @ query
+                best = int(np.argmax(scores))
+                entry = self._entries.get(keys[best])
+                if scores[best] >= self.semantic_threshold and entry is not None and not self._expired(entry):
+                    return self._hit(keys[best], entry, semantic=True)
+
+            self.misses += 1
+            return None
+
+    def put(
+        self,
+        scope: Hashable,
+        query: str,
+        response: str,
+        sources: List[Dict[str, Any]],
+        latency: float,
+        embedding: Optional[Sequence[float]] = None,
+    ) -> None:
+        key = (scope, normalize_query(query))
+        if embedding is not None:
+            embedding = normalize(np.asarray(embedding, dtype=np.float32))
+        entry = CachedResponse(response, sources, latency, time.time(), embedding)
+
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            self._matrices.pop(scope, None)
+            while self.max_entries and len(self._entries) > self.max_entries:
+                old_key, _ = self._entries.popitem(last=False)
+                self._matrices.pop(old_key[0], None)
+
+    def invalidate(self, collection_name: str) -> int:
+        """Drop every entry involving a collection.
+
+        Scopes start with the collection name, or with a tuple of names for
+        answers over several collections.
+        """
+        def involves(scope) -> bool:
+            names = scope[0] if isinstance(scope[0], tuple) else (scope[0],)
+            return collection_name in names
+
+        with self._lock:
+            keys = [key for key in self._entries if involves(key[0])]
+            for key in keys:
+                self._drop(key)
+            return len(keys)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            hits = self.exact_hits + self.semantic_hits
+            lookups = hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "semantic_threshold": self.semantic_threshold,
+                "exact_hits": self.exact_hits,
+                "semantic_hits": self.semantic_hits,
+                "misses": self.misses,
+                "hit_rate": hits / lookups if lookups else 0.0,
+                "saved_seconds": self.saved_seconds,
+            }
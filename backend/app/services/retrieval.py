@@ -0,0 +1,246 @@
+"""Retrievers that search a collection's embedding matrix directly.
+
+``MatrixRetriever`` replaces the default ``VectorIndexRetriever`` in
+``RAGService.query_collection``: instead of letting the vector store score
+nodes one by one, it searches an ``EmbeddingMatrix`` built once per loaded
+collection and fetches only the winning nodes from the docstore. For large
+collections an ``IVFIndex`` can be attached, in which case only the probed
+inverted lists are scored. With a ``QuantizedIndex`` attached, rows are
+scored on their compressed codes and only the best candidates re-ranked on
+the float vectors.
+
+``BM25Retriever`` ranks nodes by keyword score instead, and
+``HybridRetriever`` fuses the rankings of several retrievers with reciprocal
+rank fusion. ``FederatedRetriever`` merges the results of several
+collections into one global top-k.
+"""
+
+import asyncio
+from typing import List, Optional, Sequence
+
+import numpy as np
+from llama_index.core import Settings, VectorStoreIndex
+from llama_index.core.base.base_retriever import BaseRetriever
+from llama_index.core.base.embeddings.base import BaseEmbedding
+from llama_index.core.schema import BaseNode, NodeWithScore, QueryBundle
+from llama_index.core.vector_stores import SimpleVectorStore
+
+from app.services.ann import IVFIndex
+from app.services.bm25 import BM25Index, reciprocal_rank_fusion
+from app.services.embedding_matrix import EmbeddingMatrix
+from app.services.quantization import QuantizedIndex
+from app.services.vector_store import MmapVectorStore
+
+
+def matrix_from_index(index: VectorStoreIndex) -> Optional[EmbeddingMatrix]:
+    """Build the searchable matrix of an index's vector store.
+
+    The mmap store is wrapped without copying; a JSON SimpleVectorStore is
+    converted once into a normalized float32 matrix. Returns None for other
+    stores or an empty index.
+    """
+    vector_store = index.vector_store
+
+    if isinstance(vector_store, MmapVectorStore):
+        return vector_store.as_matrix()
+
+    if isinstance(vector_store, SimpleVectorStore):
+        embedding_dict = vector_store.data.embedding_dict
+        if not embedding_dict:
+            return None
+        node_ids = list(embedding_dict)
+        vectors = np.asarray([embedding_dict[node_id] for node_id in node_ids], dtype=np.float32)
+        return EmbeddingMatrix(vectors, node_ids)
+
+    return None
+
+
+class MatrixRetriever(BaseRetriever):
+    """Top-k retriever backed by a vectorized ``EmbeddingMatrix`` search.
+
+    With ``ann`` set, queries go through the IVF index probing ``nprobe``
+    lists instead of scoring every row. With ``quantized`` set, the rows (all
+    or the probed ones) are scored on their codes and the ``rerank`` best
+    re-scored exactly.
+    """
+
+    def __init__(
+        self,
+        index: VectorStoreIndex,
+        matrix: EmbeddingMatrix,
+        similarity_top_k: int = 3,
+        embed_model: Optional[BaseEmbedding] = None,
+        ann: Optional[IVFIndex] = None,
+        nprobe: int = 8,
+        quantized: Optional[QuantizedIndex] = None,
+        rerank: int = 100,
+    ) -> None:
+        self._index = index
+        self._matrix = matrix
+        self._similarity_top_k = similarity_top_k
+        self._ann = ann
+        self._nprobe = nprobe
+        self._quantized = quantized
+        self._rerank = rerank
+        self._embed_model = embed_model or Settings.embed_model
+        super().__init__()
+
+    def _query_embedding(self, query_bundle: QueryBundle) -> List[float]:
+        if query_bundle.embedding is None:
+            query_bundle.embedding = self._embed_model.get_agg_embedding_from_queries(
+                query_bundle.embedding_strs
+            )
+        return query_bundle.embedding
+
+    def _to_nodes(self, rows: np.ndarray, scores: np.ndarray) -> List[NodeWithScore]:
+        nodes = self._index.docstore.get_nodes(self._matrix.node_ids(rows))
+        return [
+            NodeWithScore(node=node, score=float(score))
+            for node, score in zip(nodes, scores)
+        ]
+
+    def _retrieve(self, query_bundle: QueryBundle) -> List[NodeWithScore]:
+        query_embedding = np.asarray(self._query_embedding(query_bundle), dtype=np.float32)
+        return self._to_nodes(*self._search(query_embedding))
+
+    async def _aretrieve(self, query_bundle: QueryBundle) -> List[NodeWithScore]:
+        # Query embedding and scoring are blocking; keep them off the event loop
+        return await asyncio.to_thread(self._retrieve, query_bundle)
+
+    def _search(self, query_embedding: np.ndarray):
+        top_k = self._similarity_top_k
+        if self._quantized is not None:
+            rows = self._ann.candidates(query_embedding, self._nprobe) if self._ann is not None else None
+            return self._quantized.search(self._matrix, query_embedding, top_k, self._rerank, rows=rows)
+        if self._ann is not None:
+            return self._ann.search(self._matrix, query_embedding, top_k, self._nprobe)
+        return self._matrix.search(query_embedding, top_k)
+
+    def retrieve_batch(self, queries: Sequence[str]) -> List[List[NodeWithScore]]:
+        """Retrieve for several queries, scoring them in one matrix product."""
+        if not queries:
+            return []
+
+        embeddings = np.asarray(
+            [self._embed_model.get_query_embedding(query) for query in queries],
+            dtype=np.float32,
+        )
+        if self._ann is not None or self._quantized is not None:
+            results = [self._search(embedding) for embedding in embeddings]
+        else:
+            results = self._matrix.search_batch(embeddings, self._similarity_top_k)
+        return [self._to_nodes(rows, scores) for rows, scores in results]
+
+
+def _existing_nodes(index: VectorStoreIndex, node_ids: Sequence[str]) -> List[Optional[BaseNode]]:
+    """Docstore nodes for ``node_ids``; None for ids no longer in the index."""
+    docstore = index.docstore
+    return [
+        node if isinstance(node, BaseNode) else None
+        for node in (docstore.get_document(node_id, raise_error=False) for node_id in node_ids)
+    ]
+
+
+class BM25Retriever(BaseRetriever):
+    """Top-k retriever by BM25 keyword score; no query embedding needed."""
+
+    def __init__(self, index: VectorStoreIndex, bm25: BM25Index, similarity_top_k: int = 3) -> None:
+        self._index = index
+        self._bm25 = bm25
+        self._similarity_top_k = similarity_top_k
+        super().__init__()
+
+    def _retrieve(self, query_bundle: QueryBundle) -> List[NodeWithScore]:
+        node_ids, scores = self._bm25.search(query_bundle.query_str, self._similarity_top_k)
+        # The keyword index is rebuilt with the collection; skip nodes removed since
+        return [
+            NodeWithScore(node=node, score=float(score))
+            for node, score in zip(_existing_nodes(self._index, node_ids), scores)
+            if node is not None
+        ]
+
+
+class HybridRetriever(BaseRetriever):
+    """Reciprocal rank fusion of several retrievers (e.g. vector + BM25).
+
+    Each retriever should return more candidates than ``similarity_top_k``;
+    the fused score of a node is the sum of ``1 / (rrf_k + rank)`` over the
+    rankings it appears in.
+    """
+
+    def __init__(
+        self,
+        retrievers: Sequence[BaseRetriever],
+        similarity_top_k: int = 3,
+        rrf_k: int = 60,
+    ) -> None:
+        self._retrievers = list(retrievers)
+        self._similarity_top_k = similarity_top_k
+        self._rrf_k = rrf_k
+        super().__init__()
+
+    def _fuse(self, results: Sequence[List[NodeWithScore]]) -> List[NodeWithScore]:
+        nodes = {}
+        for result in results:
+            for node_with_score in result:
+                nodes.setdefault(node_with_score.node.node_id, node_with_score.node)
+
+        fused = reciprocal_rank_fusion(
+            [[node_with_score.node.node_id for node_with_score in result] for result in results],
+            k=self._rrf_k,
+        )
+        return [
+            NodeWithScore(node=nodes[node_id], score=score)
+            for node_id, score in fused[:self._similarity_top_k]
+        ]
+
+    def _retrieve(self, query_bundle: QueryBundle) -> List[NodeWithScore]:
+        return self._fuse([retriever.retrieve(query_bundle) for retriever in self._retrievers])
+
+    async def _aretrieve(self, query_bundle: QueryBundle) -> List[NodeWithScore]:
+        results = await asyncio.gather(*(retriever.aretrieve(query_bundle) for retriever in self._retrievers))
+        return self._fuse(results)
+
+
+class FederatedRetriever(BaseRetriever):
+    """Global top-k over the retrievers of several collections.
+
+    The query is embedded once and shared by every retriever, which then run
+    concurrently on the async path. All collections use the same embedding
+    model, so their cosine scores are comparable and results are merged by
+    score.
+    """
+
+    def __init__(
+        self,
+        retrievers: Sequence[BaseRetriever],
+        similarity_top_k: int = 3,
+        embed_model: Optional[BaseEmbedding] = None,
+    ) -> None:
+        self._retrievers = list(retrievers)
+        self._similarity_top_k = similarity_top_k
+        self._embed_model = embed_model or Settings.embed_model
+        super().__init__()
+
+    def _embed(self, query_bundle: QueryBundle) -> None:
+        if query_bundle.embedding is None:
+            query_bundle.embedding = self._embed_model.get_agg_embedding_from_queries(
+                query_bundle.embedding_strs
+            )
+
+    def _merge(self, results: Sequence[List[NodeWithScore]]) -> List[NodeWithScore]:
+        nodes = [node_with_score for result in results for node_with_score in result]
+        nodes.sort(
+            key=lambda node_with_score: node_with_score.score if node_with_score.score is not None else float("-inf"),
+            reverse=True,
+        )
+        return nodes[:self._similarity_top_k]
+
+    def _retrieve(self, query_bundle: QueryBundle) -> List[NodeWithScore]:
+        self._embed(query_bundle)
+        return self._merge([retriever.retrieve(query_bundle) for retriever in self._retrievers])
+
+    async def _aretrieve(self, query_bundle: QueryBundle) -> List[NodeWithScore]:
+        await asyncio.to_thread(self._embed, query_bundle)
+        results = await asyncio.gather(*(retriever.aretrieve(query_bundle) for retriever in self._retrievers))
+        return self._merge(results)
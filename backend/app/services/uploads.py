@@ -0,0 +1,83 @@
+"""Streaming storage of uploaded files.
+
+Uploads are copied in fixed-size chunks into a hidden temporary file in the
+destination directory, hashing and counting bytes in the same pass, and are
+renamed into place only once complete. Memory use per upload is bounded by
+the chunk size and a failed or oversized upload never leaves a partial file
+under its final name. The per-file size limit is checked while copying, i.e.
+after the server has spooled the multipart body; requests are rejected
+earlier, from their Content-Length, by the API's upload size middleware. Hidden
+files are ignored by the collection indexer, so an in-progress upload is
+never indexed.
+"""
+
+import hashlib
+import os
+import uuid
+from dataclasses import dataclass
+
+import aiofiles
+import aiofiles.os
+from fastapi import UploadFile
+
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+
+
+class UploadTooLarge(Exception):
+    """The upload exceeded the configured maximum size."""
+
+    def __init__(self, filename: str, max_size: int):
+        super().__init__(f"{filename} exceeds the maximum upload size of {max_size} bytes")
+        self.filename = filename
+        self.max_size = max_size
+
+
+@dataclass
+class StagedUpload:
+    """A fully received upload waiting in its temporary file."""
+
+    temp_path: str
+    size: int
+    sha256: str
+
+    async def commit(self, final_path: str) -> str:
+        """Atomically move the upload to ``final_path``."""
+        await aiofiles.os.replace(self.temp_path, final_path)
+        return final_path
+
+    async def discard(self) -> None:
+        if os.path.exists(self.temp_path):
+            await aiofiles.os.remove(self.temp_path)
+
+
+async def stage_upload(
+    upload: UploadFile,
+    directory: str,
+    max_size: int = 0,
+    chunk_size: int = UPLOAD_CHUNK_SIZE,
+) -> StagedUpload:
+    """Stream ``upload`` to a temporary file in ``directory``; ``max_size`` 0 = unlimited.
+
+    The content hash is known before the file gets its final name, so the
+    caller can still discard it (e.g. as a duplicate).
+    """
+    temp_path = os.path.join(directory, f".upload-{uuid.uuid4().hex}.tmp")
+    digest = hashlib.sha256()
+    size = 0
+
+    try:
+        async with aiofiles.open(temp_path, "wb") as out:
+            while chunk := await upload.read(chunk_size):
+                size += len(chunk)
+                if max_size and size > max_size:
+                    raise UploadTooLarge(upload.filename or "", max_size)
+                digest.update(chunk)
+                await out.write(chunk)
+            await out.flush()
+            os.fsync(out.fileno())
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+    return StagedUpload(temp_path=temp_path, size=size, sha256=digest.hexdigest())
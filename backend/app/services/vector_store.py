@@ -0,0 +1,485 @@
+"""Memory-mapped binary vector store for collection indexes.
+
+Embeddings are kept as one contiguous, L2-normalized float32 (or float16)
+matrix in ``vectors.bin`` and opened with ``numpy.memmap``, so loading a
+collection does not parse anything and the OS page cache shares the pages
+between worker processes. Node ids live in ``vectors.ids`` (one JSON record per
+row) addressed through the ``vectors.offsets`` int64 array, which is also
+memory-mapped, so ids are only decoded for the rows a query returns.
+
+Storage is append-only: persisting into the directory the store was loaded
+from appends the new rows and then atomically rewrites ``vectors.meta.json``,
+which holds the committed row count. Rows beyond that count (left over by a
+crash) are ignored and truncated by the next append. Persisting into another
+directory (a new index version) hard-links the files there and appends the
+same way: the previous version only reads up to its own count, so sharing
+the files is safe. Deleted rows are tombstoned in the metadata and dropped,
+by rewriting the files, once they make up a large share of them.
+
+A collection that keeps only quantized codes drops the float vectors after
+its build (``drop_vectors``): ``vectors.bin`` then holds only the rows from
+``vectors_start`` on (none, until rows are appended again), and a build
+based on such a store first restores the missing rows from the codes
+(``restore_vectors``).
+"""
+
+import json
+import os
+import shutil
+from typing import Any, Callable, Dict, List, Optional
+
+import numpy as np
+from llama_index.core.bridge.pydantic import PrivateAttr
+from llama_index.core.schema import BaseNode
+from llama_index.core.vector_stores.types import (
+    BasePydanticVectorStore,
+    VectorStoreQuery,
+    VectorStoreQueryResult,
+)
+
+from app.services.embedding_matrix import EmbeddingMatrix, normalize
+
+VECTORS_FILENAME = "vectors.bin"
+IDS_FILENAME = "vectors.ids"
+OFFSETS_FILENAME = "vectors.offsets"
+META_FILENAME = "vectors.meta.json"
+STORE_FORMAT = 1
+SUPPORTED_DTYPES = ("float32", "float16")
+
+# Share of tombstoned rows above which persist rewrites the files
+COMPACTION_RATIO = 0.25
+# Rows copied per block when the files are rewritten
+WRITE_BLOCK_ROWS = 65536
+DATA_FILENAMES = (VECTORS_FILENAME, IDS_FILENAME, OFFSETS_FILENAME)
+
+
+class MmapVectorStore(BasePydanticVectorStore):
+    """Vector store persisted as a memory-mapped embedding matrix."""
+
+    stores_text: bool = False
+    dtype: str = "float32"
+
+    _persist_dir: Optional[str] = PrivateAttr(default=None)
+    _dim: Optional[int] = PrivateAttr(default=None)
+    _count: int = PrivateAttr(default=0)
+    _ids_bytes: int = PrivateAttr(default=0)
+    _matrix: Optional[np.ndarray] = PrivateAttr(default=None)
+    _ids: Optional[np.ndarray] = PrivateAttr(default=None)
+    _offsets: Optional[np.ndarray] = PrivateAttr(default=None)
+    _deleted: set = PrivateAttr(default_factory=set)
+    _rows_by_ref: Optional[Dict[str, List[int]]] = PrivateAttr(default=None)
+    _pending_vectors: List[np.ndarray] = PrivateAttr(default_factory=list)
+    _pending_records: List[tuple] = PrivateAttr(default_factory=list)
+    _matrix_view: Optional[EmbeddingMatrix] = PrivateAttr(default=None)
+    _stable_rows: int = PrivateAttr(default=0)
+    _vectors_start: int = PrivateAttr(default=0)
+
+    def __init__(self, dtype: str = "float32", **kwargs: Any) -> None:
+        if dtype not in SUPPORTED_DTYPES:
+            raise ValueError(f"Unsupported vector dtype: {dtype}")
+        super().__init__(dtype=dtype, **kwargs)
+
+    @classmethod
+    def class_name(cls) -> str:
+        return "MmapVectorStore"
+
+    @staticmethod
+    def exists(persist_dir: str) -> bool:
+        """Check whether ``persist_dir`` holds a persisted mmap store."""
+        return os.path.exists(os.path.join(persist_dir, META_FILENAME))
+
+    @staticmethod
+    def remove(persist_dir: str) -> None:
+        """Remove the mmap store files from ``persist_dir``, if any."""
+        for filename in (META_FILENAME, VECTORS_FILENAME, IDS_FILENAME, OFFSETS_FILENAME):
+            path = os.path.join(persist_dir, filename)
+            if os.path.exists(path):
+                os.remove(path)
+
+    @classmethod
+    def from_persist_dir(cls, persist_dir: str) -> "MmapVectorStore":
+        """Open a persisted store; only the metadata file is actually read."""
+        with open(os.path.join(persist_dir, META_FILENAME), "r", encoding="utf-8") as f:
+            meta = json.load(f)
+
+        if meta.get("format") != STORE_FORMAT:
+            raise ValueError(f"Unsupported vector store format in {persist_dir}")
+
+        store = cls(dtype=meta["dtype"])
+        store._persist_dir = os.path.abspath(persist_dir)
+        store._dim = meta["dim"]
+        store._count = meta["count"]
+        store._ids_bytes = meta["ids_bytes"]
+        store._deleted = set(meta.get("deleted", []))
+        store._vectors_start = meta.get("vectors_start", 0)
+        store._stable_rows = store._count
+        store._map_files()
+        return store
+
+    @property
+    def client(self) -> Any:
+        return None
+
+    @property
+    def dim(self) -> Optional[int]:
+        return self._dim
+
+    @property
+    def num_vectors(self) -> int:
+        """Number of live (non-deleted) rows, persisted or pending."""
+        return self._count + len(self._pending_records) - len(self._deleted)
+
+    @property
+    def stable_rows(self) -> int:
+        """Leading rows still at the row number they had when the store was opened.
+
+        Row numbers only change when the files are rewritten; indexes built
+        over the opened rows (IVF lists, quantized codes) stay valid for
+        these rows and only need the rows after them.
+        """
+        return self._stable_rows
+
+    @property
+    def has_vectors(self) -> bool:
+        """Whether every row has its float vector (see ``drop_vectors``)."""
+        return self._vectors_start == 0
+
+    # ------------------------------------------------------------------ #
+    # Writing
+    # ------------------------------------------------------------------ #
+
+    def add(self, nodes: List[BaseNode], **add_kwargs: Any) -> List[str]:
+        """Add nodes with embeddings; rows stay in memory until persisted."""
+        if not nodes:
+            return []
+
+        self.add_embeddings(
+            [node.node_id for node in nodes],
+            [node.ref_doc_id for node in nodes],
+            np.asarray([node.get_embedding() for node in nodes], dtype=np.float32),
+        )
+        return [node.node_id for node in nodes]
+
+    def add_embeddings(
+        self,
+        node_ids: List[str],
+        ref_doc_ids: List[Optional[str]],
+        embeddings: np.ndarray,
+    ) -> None:
+        """Add raw embedding rows for the given node ids."""
+        embeddings = np.atleast_2d(np.asarray(embeddings, dtype=np.float32))
+        if self._dim is None:
+            self._dim = embeddings.shape[1]
+        elif embeddings.shape[1] != self._dim:
+            raise ValueError(
+                f"Embedding dimension {embeddings.shape[1]} does not match store dimension {self._dim}"
+            )
+
+        self._matrix_view = None
+        start = self._count + len(self._pending_records)
+        self._pending_vectors.append(normalize(embeddings).astype(self.dtype))
+        self._pending_records.extend(zip(node_ids, ref_doc_ids))
+
+        if self._rows_by_ref is not None:
+            for row, ref_doc_id in enumerate(ref_doc_ids, start):
+                self._rows_by_ref.setdefault(ref_doc_id, []).append(row)
+
+    def delete(self, ref_doc_id: str, **delete_kwargs: Any) -> None:
+        """Tombstone every row that belongs to ``ref_doc_id``."""
+        rows = self._get_rows_by_ref().pop(ref_doc_id, [])
+        self._deleted.update(rows)
+        self._matrix_view = None
+
+    def persist(self, persist_path: str, fs: Optional[Any] = None) -> None:
+        """Persist into the directory of ``persist_path``.
+
+        StorageContext passes the path of the JSON file a SimpleVectorStore
+        would write; only its directory is used.
+        """
+        persist_dir = os.path.abspath(os.path.dirname(persist_path))
+        os.makedirs(persist_dir, exist_ok=True)
+
+        total = self._count + len(self._pending_records)
+        if self._persist_dir is None or len(self._deleted) > COMPACTION_RATIO * total:
+            self._write_full(persist_dir)
+        else:
+            if persist_dir != self._persist_dir:
+                self._link_files(persist_dir)
+            self._append_pending()
+
+        self._persist_dir = persist_dir
+        self._map_files()
+
+    def _append_pending(self) -> None:
+        if not self._pending_records:
+            self._write_meta(self._persist_dir)
+            return
+
+        offsets = [self._ids_bytes]
+        records = bytearray()
+        for record in self._pending_records:
+            records += (json.dumps(record) + "\n").encode("utf-8")
+            offsets.append(self._ids_bytes + len(records))
+
+        vector_size = self._dim * np.dtype(self.dtype).itemsize
+        self._append_file(
+            VECTORS_FILENAME,
+            (self._count - self._vectors_start) * vector_size,
+            np.concatenate(self._pending_vectors).tobytes(),
+        )
+        self._append_file(IDS_FILENAME, self._ids_bytes, bytes(records))
+        # The offsets array has count + 1 entries; the last one is rewritten
+        self._append_file(OFFSETS_FILENAME, self._count * 8, np.asarray(offsets, dtype=np.int64).tobytes())
+
+        self._count += len(self._pending_records)
+        self._ids_bytes = offsets[-1]
+        self._pending_vectors = []
+        self._pending_records = []
+        self._write_meta(self._persist_dir)
+
+    def drop_vectors(self) -> None:
+        """Delete the float vectors of the persisted rows, keeping their ids.
+
+        For collections searched on quantized codes alone. Only this
+        directory's link to ``vectors.bin`` is removed, so versions sharing
+        the file keep their vectors.
+        """
+        if self._pending_records:
+            raise ValueError("Persist pending rows before dropping the vectors")
+        path = os.path.join(self._persist_dir, VECTORS_FILENAME)
+        if os.path.exists(path):
+            os.remove(path)
+        self._vectors_start = self._count
+        self._write_meta(self._persist_dir)
+        self._map_files()
+
+    def restore_vectors(self, persist_dir: str, decode: Callable[[int, int], np.ndarray]) -> None:
+        """Give the rows without float vectors ``decode(start, end)`` as vectors, in ``persist_dir``.
+
+        The restored ``vectors.bin`` is written there (never into the
+        directory the store was opened from), block by block, and the store
+        continues from ``persist_dir`` like after a persist.
+        """
+        if self.has_vectors:
+            return
+        if self._pending_records:
+            raise ValueError("Restore the vectors before adding rows")
+
+        persist_dir = os.path.abspath(persist_dir)
+        os.makedirs(persist_dir, exist_ok=True)
+        tmp_path = os.path.join(persist_dir, VECTORS_FILENAME + ".tmp")
+        with open(tmp_path, "wb") as f:
+            for start in range(0, self._vectors_start, WRITE_BLOCK_ROWS):
+                end = min(start + WRITE_BLOCK_ROWS, self._vectors_start)
+                f.write(normalize(decode(start, end)).astype(self.dtype).tobytes())
+            stored = self._count - self._vectors_start
+            for start in range(0, stored, WRITE_BLOCK_ROWS):
+                f.write(np.asarray(self._matrix[start:start + WRITE_BLOCK_ROWS]).tobytes())
+            f.flush()
+            os.fsync(f.fileno())
+
+        if persist_dir != self._persist_dir:
+            self._link_files(persist_dir)
+        os.replace(tmp_path, os.path.join(persist_dir, VECTORS_FILENAME))
+        self._vectors_start = 0
+        self._write_meta(persist_dir)
+        self._map_files()
+
+    def _link_files(self, persist_dir: str) -> None:
+        """Hard-link the data files into ``persist_dir``; copy if linking fails."""
+        for filename in DATA_FILENAMES:
+            source = os.path.join(self._persist_dir, filename)
+            target = os.path.join(persist_dir, filename)
+            if os.path.exists(target):
+                os.remove(target)
+            if not os.path.exists(source):
+                continue
+            try:
+                os.link(source, target)
+            except OSError:
+                shutil.copyfile(source, target)
+        self._persist_dir = persist_dir
+
+    def _append_file(self, filename: str, committed_size: int, data: bytes) -> None:
+        path = os.path.join(self._persist_dir, filename)
+        with open(path, "r+b" if os.path.exists(path) else "w+b") as f:
+            # Drop uncommitted bytes left by an interrupted write
+            f.truncate(committed_size)
+            f.seek(committed_size)
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+
+    def _write_full(self, persist_dir: str) -> None:
+        if not self.has_vectors:
+            raise ValueError("Float vectors were dropped; restore_vectors before rewriting the store")
+        keep = np.asarray(
+            [row for row in range(self._count + len(self._pending_records)) if row not in self._deleted],
+            dtype=np.int64,
+        )
+
+        # Rows are copied block by block, never the whole matrix at once
+        vectors_path = os.path.join(persist_dir, VECTORS_FILENAME + ".tmp")
+        ids_path = os.path.join(persist_dir, IDS_FILENAME + ".tmp")
+        offsets = np.zeros(len(keep) + 1, dtype=np.int64)
+        ids_bytes = 0
+        pending = np.concatenate(self._pending_vectors) if self._pending_vectors else None
+        with open(vectors_path, "wb") as vectors_file, open(ids_path, "wb") as ids_file:
+            for start in range(0, len(keep), WRITE_BLOCK_ROWS):
+                block = keep[start:start + WRITE_BLOCK_ROWS]
+                vectors_file.write(self._vectors(block, pending).astype(self.dtype).tobytes())
+                records = bytearray()
+                for i, row in enumerate(block, start + 1):
+                    records += (json.dumps(self._record(int(row))) + "\n").encode("utf-8")
+                    offsets[i] = ids_bytes + len(records)
+                ids_file.write(records)
+                ids_bytes += len(records)
+            for f in (vectors_file, ids_file):
+                f.flush()
+                os.fsync(f.fileno())
+
+        offsets_path = os.path.join(persist_dir, OFFSETS_FILENAME + ".tmp")
+        with open(offsets_path, "wb") as f:
+            f.write(offsets.tobytes())
+            f.flush()
+            os.fsync(f.fileno())
+        for filename in DATA_FILENAMES:
+            os.replace(os.path.join(persist_dir, filename + ".tmp"), os.path.join(persist_dir, filename))
+
+        self._count = len(keep)
+        self._ids_bytes = ids_bytes
+        self._deleted = set()
+        self._rows_by_ref = None
+        self._pending_vectors = []
+        self._pending_records = []
+        self._stable_rows = 0
+        self._write_meta(persist_dir)
+
+    def _vectors(self, rows: np.ndarray, pending: Optional[np.ndarray]) -> np.ndarray:
+        """Vectors of ascending ``rows``, persisted or from the ``pending`` rows."""
+        persisted = rows[rows < self._count]
+        parts = [self._matrix[persisted]] if len(persisted) else []
+        pending_rows = rows[rows >= self._count] - self._count
+        if len(pending_rows):
+            parts.append(pending[pending_rows])
+        if not parts:
+            return np.empty((0, self._dim or 0), dtype=self.dtype)
+        return np.concatenate(parts) if len(parts) > 1 else parts[0]
+
+    def _write_meta(self, persist_dir: str) -> None:
+        meta = {
+            "format": STORE_FORMAT,
+            "dim": self._dim,
+            "dtype": self.dtype,
+            "count": self._count,
+            "ids_bytes": self._ids_bytes,
+            "normalized": True,
+            "deleted": sorted(self._deleted),
+            "vectors_start": self._vectors_start,
+        }
+        meta_path = os.path.join(persist_dir, META_FILENAME)
+        tmp_path = meta_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(meta, f)
+        os.replace(tmp_path, meta_path)
+
+    # ------------------------------------------------------------------ #
+    # Reading
+    # ------------------------------------------------------------------ #
+
+    def _map_files(self) -> None:
+        self._matrix_view = None
+        if not self._count:
+            self._matrix = self._ids = self._offsets = None
+            return
+
+        stored = self._count - self._vectors_start
+        self._matrix = np.memmap(
+            os.path.join(self._persist_dir, VECTORS_FILENAME),
+            dtype=self.dtype,
+            mode="r",
+            shape=(stored, self._dim),
+        ) if stored else None
+        self._ids = np.memmap(
+            os.path.join(self._persist_dir, IDS_FILENAME),
+            dtype=np.uint8,
+            mode="r",
+            shape=(self._ids_bytes,),
+        )
+        self._offsets = np.memmap(
+            os.path.join(self._persist_dir, OFFSETS_FILENAME),
+            dtype=np.int64,
+            mode="r",
+            shape=(self._count + 1,),
+        )
+
+    def _record(self, row: int) -> tuple:
+        if row >= self._count:
+            return tuple(self._pending_records[row - self._count])
+        start, end = self._offsets[row], self._offsets[row + 1]
+        return tuple(json.loads(self._ids[start:end].tobytes()))
+
+    def node_id(self, row: int) -> str:
+        """Return the node id stored at ``row``."""
+        return self._record(row)[0]
+
+    def _get_rows_by_ref(self) -> Dict[str, List[int]]:
+        if self._rows_by_ref is None:
+            rows_by_ref: Dict[str, List[int]] = {}
+            for row in range(self._count + len(self._pending_records)):
+                if row not in self._deleted:
+                    rows_by_ref.setdefault(self._record(row)[1], []).append(row)
+            self._rows_by_ref = rows_by_ref
+        return self._rows_by_ref
+
+    def _all_vectors(self) -> Optional[np.ndarray]:
+        parts = []
+        if self._matrix is not None:
+            parts.append(self._matrix)
+        parts.extend(self._pending_vectors)
+        if not parts:
+            return None
+        if len(parts) == 1:
+            return parts[0]
+        return np.concatenate(parts)
+
+    def as_matrix(self) -> Optional[EmbeddingMatrix]:
+        """Searchable view of the stored vectors (no copy once persisted).
+
+        Without float vectors (see ``drop_vectors``) the view only maps rows
+        to node ids: its rows read as zeros and take no memory, so it can
+        only be searched through quantized codes, without re-rank.
+        """
+        if self._matrix_view is None:
+            if not self.has_vectors:
+                vectors = np.broadcast_to(np.zeros(self._dim, dtype=self.dtype), (self._count, self._dim))
+            else:
+                vectors = self._all_vectors()
+            if vectors is not None:
+                self._matrix_view = EmbeddingMatrix(
+                    vectors, self.node_id, deleted=self._deleted, normalized=True
+                )
+        return self._matrix_view
+
+    def query(self, query: VectorStoreQuery, **kwargs: Any) -> VectorStoreQueryResult:
+        """Return the rows most similar (cosine) to the query embedding."""
+        if query.filters is not None:
+            raise ValueError("MmapVectorStore does not support metadata filters")
+
+        # Without float vectors only the quantized codes can be searched
+        matrix = self.as_matrix() if self.has_vectors else None
+        if matrix is None or query.query_embedding is None:
+            return VectorStoreQueryResult(similarities=[], ids=[])
+
+        query_vector = np.asarray(query.query_embedding, dtype=np.float32)
+        if query.node_ids is not None:
+            allowed = set(query.node_ids)
+            rows = [row for row in range(matrix.vectors.shape[0]) if self.node_id(row) in allowed]
+            rows, scores = matrix.search_rows(rows, query_vector, query.similarity_top_k)
+        else:
+            rows, scores = matrix.search(query_vector, query.similarity_top_k)
+
+        return VectorStoreQueryResult(
+            similarities=[float(score) for score in scores],
+            ids=matrix.node_ids(rows),
+        )
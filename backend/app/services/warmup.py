@@ -0,0 +1,205 @@
+"""Startup warm-up of hot collections and the Ollama models.
+
+After a deploy, the first query against each collection pays for loading its
+index from disk, and the first generation for Ollama loading the model. The
+``Warmup`` task, started in the background by ``app.main``, preloads the
+configured collections (or the most recently used ones, remembered across
+restarts in a small JSON file, saved periodically and at shutdown) together
+with their search structures, and
+sends one request per model to Ollama with ``keep_alive`` so the models stay
+loaded. ``ready`` only turns true once this is done (or ``timeout`` expired),
+which ``/health/ready`` exposes to the load balancer; ``/health`` stays a
+plain liveness check.
+"""
+
+import asyncio
+import json
+import logging
+import os
+import tempfile
+import time
+from typing import Any, Dict, List, Optional
+
+import httpx
+
+from app.core.config import settings
+from app.services.lazy import LazyObject, rag_service
+from app.services.ollama_pool import get_async_client
+
+logger = logging.getLogger(__name__)
+
+# Names remembered in the recent-collections file
+MAX_RECENT = 32
+
+
+class Warmup:
+    """Background preload of indexes and Ollama models, with readiness state."""
+
+    def __init__(
+        self,
+        rag: LazyObject,
+        base_url: str,
+        llm_model: str,
+        embed_model: str,
+        recent_path: str,
+        collections: Optional[List[str]] = None,
+        max_collections: int = 4,
+        keep_alive: Optional[str] = None,
+        timeout: float = 300.0,
+    ):
+        self.rag = rag
+        self.base_url = base_url
+        self.llm_model = llm_model
+        self.embed_model = embed_model
+        self.recent_path = recent_path
+        self.collections = collections or []
+        self.max_collections = max_collections
+        self.keep_alive = keep_alive
+        self.timeout = timeout
+        self.state = "pending"
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self.loaded: List[str] = []
+        self.errors: Dict[str, str] = {}
+        self._saved_recent: Optional[List[str]] = None
+
+    @property
+    def ready(self) -> bool:
+        return self.state in ("ready", "timed_out", "disabled")
+
+    # ------------------------------------------------------------------ #
+    # Most recently used collections
+    # ------------------------------------------------------------------ #
+
+    def load_recent(self) -> List[str]:
+        try:
+            with open(self.recent_path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            return []
+
+    def save_recent(self, if_changed: bool = False) -> None:
+        """Remember the collections in memory, most recently used first.
+
+        Every worker process merges its collections into the same file, each
+        through its own temporary file, so concurrent saves never interleave.
+        """
+        in_memory = self.rag.indexes.keys() if self.rag.loaded else []
+        if if_changed and in_memory == self._saved_recent:
+            return
+        recent = list(dict.fromkeys(in_memory + self.load_recent()))[:MAX_RECENT]
+
+        directory = os.path.dirname(self.recent_path) or "."
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".recent-", suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump(recent, f)
+            os.replace(tmp_path, self.recent_path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        self._saved_recent = in_memory
+
+    async def save_recent_periodically(self, interval: float) -> None:
+        """Save the recent collections every ``interval`` seconds when they changed.
+
+        A crashed or killed process then loses at most ``interval`` seconds
+        of history instead of everything since startup.
+        """
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await asyncio.to_thread(self.save_recent, True)
+            except OSError:
+                logger.exception("Could not save the recent collections to %s", self.recent_path)
+
+    def targets(self) -> List[str]:
+        if self.collections:
+            return list(self.collections)
+        return [
+            name for name in self.load_recent()
+            if self.rag.is_collection_indexed(name)
+        ][:self.max_collections]
+
+    # ------------------------------------------------------------------ #
+    # Warm-up
+    # ------------------------------------------------------------------ #
+
+    def disable(self) -> None:
+        self.state = "disabled"
+
+    async def run(self) -> None:
+        self.state = "warming"
+        self.started_at = time.time()
+        try:
+            await asyncio.wait_for(
+                asyncio.gather(self._warm_collections(), self._warm_models()),
+                timeout=self.timeout or None,
+            )
+            self.state = "ready"
+        except asyncio.TimeoutError:
+            self.state = "timed_out"
+        finally:
+            self.finished_at = time.time()
+
+    async def _warm_collections(self) -> None:
+        # Build the RAG service (LlamaIndex imports, model clients) off the event loop
+        await asyncio.to_thread(self.rag.resolve)
+        await asyncio.gather(*(self._warm_collection(name) for name in self.targets()))
+
+    async def _warm_collection(self, name: str) -> None:
+        try:
+            if await self.rag.apreload_collection(name):
+                self.loaded.append(name)
+            else:
+                self.errors[name] = "not indexed"
+        except Exception as e:
+            self.errors[name] = f"{type(e).__name__}: {e}"
+
+    async def _warm_models(self) -> None:
+        keep_alive = {"keep_alive": self.keep_alive} if self.keep_alive is not None else {}
+        # An empty prompt/input makes Ollama load the model without generating
+        await asyncio.gather(
+            self._post("llm", "/api/generate", {"model": self.llm_model, "prompt": "", **keep_alive}),
+            self._post("embed", "/api/embed", {"model": self.embed_model, "input": "", **keep_alive},
+                       fallback=("/api/embeddings", {"model": self.embed_model, "prompt": "", **keep_alive})),
+        )
+
+    async def _post(self, name: str, path: str, payload: Dict[str, Any], fallback=None) -> None:
+        try:
+            response = await get_async_client().post(f"{self.base_url}{path}", json=payload, timeout=self.timeout)
+            if response.status_code == 404 and fallback:
+                # Older Ollama without /api/embed
+                path, payload = fallback
+                response = await get_async_client().post(f"{self.base_url}{path}", json=payload, timeout=self.timeout)
+            response.raise_for_status()
+        except httpx.HTTPError as e:
+            self.errors[f"ollama:{name}"] = f"{type(e).__name__}: {e}"
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            "ready": self.ready,
+            "state": self.state,
+            "collections": self.loaded,
+            "errors": self.errors,
+            "seconds": (
+                (self.finished_at or time.time()) - self.started_at
+                if self.started_at else 0.0
+            ),
+        }
+
+
+# Global warm-up instance
+warmup = Warmup(
+    rag_service,
+    base_url=settings.OLLAMA_BASE_URL,
+    llm_model=settings.DEFAULT_LLM_MODEL,
+    embed_model=settings.DEFAULT_EMBED_MODEL,
+    recent_path=settings.recent_collections_path,
+    collections=settings.warmup_collections,
+    max_collections=settings.warmup_max_collections,
+    keep_alive=settings.ollama_keep_alive,
+    timeout=settings.warmup_timeout,
+)
@@ -0,0 +1,84 @@
+"""Recall@k and latency evaluation of the IVF index against exact search.
+
+Generates clustered synthetic embeddings (a Gaussian mixture, closer to real
+text embeddings than uniform noise), builds an ``IVFIndex`` and reports, for
+each ``nprobe``, the mean recall@k against brute-force ``EmbeddingMatrix``
+search together with per-query latency.
+
+Usage (from the ``backend`` directory)::
+
+    python -m benchmarks.bench_ann --chunks 1000000 --dim 384 --nprobe 1 4 16 64
+"""
+
+import argparse
+import json
+import time
+
+import numpy as np
+
+from app.services.ann import IVFIndex
+from app.services.embedding_matrix import EmbeddingMatrix
+
+
+def clustered_embeddings(count: int, dim: int, clusters: int, rng: np.random.Generator) -> np.ndarray:
+    centers = rng.standard_normal((clusters, dim), dtype=np.float32)
+    labels = rng.integers(0, clusters, size=count)
+    noise = rng.standard_normal((count, dim), dtype=np.float32) * 0.6
+    return centers[labels] + noise
+
+
+def run(chunks: int, dim: int, top_k: int, queries: int, nprobes, nlist: int, seed: int) -> dict:
+    rng = np.random.default_rng(seed)
+    vectors = clustered_embeddings(chunks + queries, dim, max(16, chunks // 2000), rng)
+    matrix = EmbeddingMatrix(vectors[:chunks], [str(i) for i in range(chunks)])
+    query_vectors = vectors[chunks:]
+
+    start = time.perf_counter()
+    ivf = IVFIndex.build(matrix, nlist=nlist or None, seed=seed)
+    build_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    exact = [set(matrix.search(q, top_k)[0].tolist()) for q in query_vectors]
+    exact_ms = (time.perf_counter() - start) * 1000 / queries
+
+    results = []
+    for nprobe in nprobes:
+        start = time.perf_counter()
+        found = [ivf.search(matrix, q, top_k, nprobe)[0] for q in query_vectors]
+        elapsed_ms = (time.perf_counter() - start) * 1000 / queries
+        recall = np.mean([len(truth & set(rows.tolist())) / top_k for truth, rows in zip(exact, found)])
+        results.append({
+            "nprobe": nprobe,
+            "recall_at_k": float(recall),
+            "ms_per_query": elapsed_ms,
+            "speedup": exact_ms / elapsed_ms,
+        })
+
+    return {
+        "chunks": chunks,
+        "dim": dim,
+        "top_k": top_k,
+        "nlist": ivf.nlist,
+        "build_seconds": build_seconds,
+        "exact_ms_per_query": exact_ms,
+        "ivf": results,
+    }
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--chunks", type=int, default=200000)
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--top-k", type=int, default=10)
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("--nlist", type=int, default=0, help="0 = sqrt(chunks)")
+    parser.add_argument("--nprobe", type=int, nargs="+", default=[1, 4, 8, 16, 32, 64])
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    result = run(args.chunks, args.dim, args.top_k, args.queries, args.nprobe, args.nlist, args.seed)
+    print(json.dumps(result, indent=2))
+
+
+if __name__ == "__main__":
+    main()
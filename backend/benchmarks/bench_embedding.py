@@ -0,0 +1,87 @@
+"""Embedding throughput versus batch size and concurrency.
+
+Runs ``BatchedOllamaEmbedding`` against the local fake Ollama server (see
+``benchmarks.fake_ollama``) for every combination of batch size and number
+of requests in flight and reports chunks per second. The first row, batch 1
+and concurrency 1 on the per-text endpoint, matches the previous
+``OllamaEmbedding`` behaviour.
+
+Usage (from the ``backend`` directory)::
+
+    python -m benchmarks.bench_embedding --chunks 2000 --batch-size 1 8 32 64 --concurrency 1 2 4 8
+
+Pass ``--url`` to measure a real Ollama server instead of the fake one.
+"""
+
+import argparse
+import json
+import time
+
+from app.services.embeddings import BatchedOllamaEmbedding
+from benchmarks.fake_ollama import serve
+
+
+def measure(url: str, model: str, texts, batch_size: int, concurrency: int, legacy: bool = False) -> dict:
+    embed_model = BatchedOllamaEmbedding(
+        model_name=model,
+        base_url=url,
+        batch_size=batch_size,
+        max_concurrency=concurrency,
+        legacy_endpoint=legacy,
+    )
+
+    start = time.perf_counter()
+    embeddings = embed_model.get_text_embedding_batch(texts)
+    elapsed = time.perf_counter() - start
+    assert len(embeddings) == len(texts)
+
+    stats = embed_model.stats()
+    return {
+        "batch_size": batch_size,
+        "concurrency": concurrency,
+        "endpoint": "/api/embeddings" if legacy else "/api/embed",
+        "seconds": elapsed,
+        "chunks_per_sec": len(texts) / elapsed,
+        "requests": stats["requests"],
+        "retries": stats["retries"],
+    }
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--chunks", type=int, default=2000)
+    parser.add_argument("--batch-size", type=int, nargs="+", default=[1, 8, 32, 64])
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--url", help="real Ollama server (default: start the fake one)")
+    parser.add_argument("--model", default="nomic-embed-text")
+    parser.add_argument("--request-latency", type=float, default=0.02)
+    parser.add_argument("--item-latency", type=float, default=0.001)
+    parser.add_argument("--parallel", type=int, default=4, help="fake server parallelism")
+    parser.add_argument("--failure-rate", type=float, default=0.0)
+    args = parser.parse_args(argv)
+
+    server = None
+    url = args.url
+    if url is None:
+        server = serve(
+            request_latency=args.request_latency,
+            item_latency=args.item_latency,
+            parallel=args.parallel,
+            failure_rate=args.failure_rate,
+        )
+        url = server.url
+
+    texts = [f"chunk {i}: " + "lorem ipsum dolor sit amet " * 20 for i in range(args.chunks)]
+    results = [measure(url, args.model, texts, 1, 1, legacy=True)]
+    for batch_size in args.batch_size:
+        for concurrency in args.concurrency:
+            results.append(measure(url, args.model, texts, batch_size, concurrency))
+
+    if server is not None:
+        server.shutdown()
+
+    print(json.dumps({"chunks": args.chunks, "url": url, "results": results}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
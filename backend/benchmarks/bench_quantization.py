@@ -0,0 +1,142 @@
+"""Memory and recall@k of quantized vector codes against exact search.
+
+Uses the clustered synthetic embeddings of ``bench_ann`` and reports, side by
+side for float32, float16, int8 and product-quantized storage: the bytes a
+query scans per vector and in total, the compression against float32, the
+recall@k of scoring on the codes alone and after the exact re-rank of
+``--rerank`` candidates on float32 or float16 rows, and per-query latency.
+
+Codes are saved to a temporary directory, and ``disk_bytes`` reports what a
+collection keeps on disk in each setup. With float32 or float16 re-rank rows
+that is the vectors plus the codes. With ``codes_only``
+(``quantization_keep_vectors=False``) it is the codes alone, with no re-rank.
+
+Usage (from the ``backend`` directory)::
+
+    python -m benchmarks.bench_quantization --chunks 1000000 --dim 384 --rerank 50 100 200
+    python -m benchmarks.bench_quantization --pq-subvectors 48 96
+"""
+
+import argparse
+import json
+import os
+import shutil
+import tempfile
+import time
+
+import numpy as np
+
+from app.services.embedding_matrix import EmbeddingMatrix, normalize, top_k_rows
+from app.services.quantization import QuantizedIndex
+from benchmarks.bench_ann import clustered_embeddings
+
+
+def recall(exact, found, top_k: int) -> float:
+    return float(np.mean([len(truth & set(rows.tolist())) / top_k for truth, rows in zip(exact, found)]))
+
+
+def directory_bytes(path: str) -> int:
+    return sum(os.path.getsize(os.path.join(root, name)) for root, _, names in os.walk(path) for name in names)
+
+
+def timed(search, queries: np.ndarray):
+    start = time.perf_counter()
+    found = [search(query) for query in queries]
+    return found, (time.perf_counter() - start) * 1000 / len(queries)
+
+
+def run(chunks: int, dim: int, top_k: int, queries: int, reranks, pq_subvectors, seed: int) -> dict:
+    rng = np.random.default_rng(seed)
+    vectors = normalize(clustered_embeddings(chunks + queries, dim, max(16, chunks // 2000), rng))
+    query_vectors = vectors[chunks:]
+    matrix = EmbeddingMatrix(vectors[:chunks], [str(i) for i in range(chunks)], normalized=True)
+    float32_bytes = matrix.nbytes
+
+    found, exact_ms = timed(lambda q: matrix.search(q, top_k)[0], query_vectors)
+    exact = [set(rows.tolist()) for rows in found]
+
+    def row(mode: str, nbytes: int, disk_bytes, **extra) -> dict:
+        # nbytes: what a query scans
+        return dict({
+            "mode": mode,
+            "bytes_per_vector": nbytes / chunks,
+            "scanned_bytes": nbytes,
+            "compression": float32_bytes / nbytes,
+            "disk_bytes": disk_bytes,
+        }, **extra)
+
+    results = [row("float32", float32_bytes, float32_bytes, recall_at_k=1.0, ms_per_query=exact_ms)]
+
+    half = EmbeddingMatrix(matrix.vectors.astype(np.float16), matrix.node_ids(range(chunks)), normalized=True)
+    float16_bytes = half.nbytes
+    found, ms = timed(lambda q: half.search(q, top_k)[0], query_vectors)
+    results.append(row("float16", float16_bytes, float16_bytes, recall_at_k=recall(exact, found, top_k), ms_per_query=ms))
+
+    configurations = [("int8", 0)] + [("pq", m) for m in pq_subvectors]
+    for mode, subvectors in configurations:
+        storage_path = tempfile.mkdtemp(prefix="bench_quantization_")
+        start = time.perf_counter()
+        quantized = QuantizedIndex.build(
+            matrix, mode=mode, pq_subvectors=subvectors, seed=seed, storage_path=storage_path
+        )
+        build_seconds = time.perf_counter() - start
+        codes_disk_bytes = directory_bytes(storage_path)
+
+        # Ranking on the codes alone, then with the exact re-rank
+        found, ms = timed(lambda q: top_k_rows(quantized.approximate_scores(q), top_k), query_vectors)
+        reranked = []
+        for rerank in reranks:
+            for dtype, rows in (("float32", matrix), ("float16", half)):
+                found_reranked, ms_reranked = timed(
+                    lambda q: quantized.search(rows, q, top_k, rerank)[0], query_vectors
+                )
+                reranked.append({
+                    "rerank": rerank,
+                    "rerank_dtype": dtype,
+                    "recall_at_k": recall(exact, found_reranked, top_k),
+                    "ms_per_query": ms_reranked,
+                })
+
+        name = mode if mode == "int8" else f"pq{quantized.codes.shape[1]}"
+        results.append(row(
+            name,
+            quantized.nbytes,
+            {
+                "float32_rerank": float32_bytes + codes_disk_bytes,
+                "float16_rerank": float16_bytes + codes_disk_bytes,
+                "codes_only": codes_disk_bytes,
+            },
+            build_seconds=build_seconds,
+            recall_at_k=recall(exact, found, top_k),
+            ms_per_query=ms,
+            reranked=reranked,
+        ))
+        del quantized
+        shutil.rmtree(storage_path, ignore_errors=True)
+
+    return {
+        "chunks": chunks,
+        "dim": dim,
+        "top_k": top_k,
+        "queries": queries,
+        "modes": results,
+    }
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--chunks", type=int, default=200000)
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--top-k", type=int, default=10)
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("--rerank", type=int, nargs="+", default=[20, 50, 100, 200])
+    parser.add_argument("--pq-subvectors", type=int, nargs="+", default=[0], help="0 = dim / 8")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    result = run(args.chunks, args.dim, args.top_k, args.queries, args.rerank, args.pq_subvectors, args.seed)
+    print(json.dumps(result, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+"""Benchmark: vectorized matrix search vs. the SimpleVectorStore query path.
+
+Builds a synthetic collection of random embeddings and times top-k retrieval
+through ``SimpleVectorStore.query`` (what ``index.as_query_engine`` uses
+today) against ``EmbeddingMatrix.search`` and batched
+``EmbeddingMatrix.search_batch``. No Ollama or network access is needed.
+
+Usage (from the ``backend`` directory)::
+
+    python -m benchmarks.bench_retrieval --chunks 200000 --dim 768
+"""
+
+import argparse
+import json
+import time
+
+import numpy as np
+from llama_index.core.schema import TextNode
+from llama_index.core.vector_stores import SimpleVectorStore
+from llama_index.core.vector_stores.types import VectorStoreQuery
+
+from app.services.embedding_matrix import EmbeddingMatrix
+
+
+def _time_per_query(fn, queries, repeat: int) -> float:
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for query in queries:
+            fn(query)
+    return (time.perf_counter() - start) / (repeat * len(queries))
+
+
+def run(chunks: int, dim: int, top_k: int, queries: int, batch: int, repeat: int, seed: int) -> dict:
+    rng = np.random.default_rng(seed)
+    vectors = rng.standard_normal((chunks, dim), dtype=np.float32)
+    query_vectors = rng.standard_normal((queries, dim), dtype=np.float32)
+    node_ids = [f"node-{i}" for i in range(chunks)]
+
+    store = SimpleVectorStore()
+    store.add([
+        TextNode(id_=node_id, text="", embedding=vector.tolist())
+        for node_id, vector in zip(node_ids, vectors)
+    ])
+
+    start = time.perf_counter()
+    matrix = EmbeddingMatrix(vectors, node_ids)
+    build_seconds = time.perf_counter() - start
+
+    simple_seconds = _time_per_query(
+        lambda q: store.query(VectorStoreQuery(query_embedding=q.tolist(), similarity_top_k=top_k)),
+        query_vectors,
+        repeat,
+    )
+    matrix_seconds = _time_per_query(lambda q: matrix.search(q, top_k), query_vectors, repeat)
+
+    batches = [query_vectors[i:i + batch] for i in range(0, queries, batch)]
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for queries_batch in batches:
+            matrix.search_batch(queries_batch, top_k)
+    batch_seconds = (time.perf_counter() - start) / (repeat * queries)
+
+    # Both paths must return the same ranking
+    expected = store.query(VectorStoreQuery(query_embedding=query_vectors[0].tolist(), similarity_top_k=top_k))
+    rows, _ = matrix.search(query_vectors[0], top_k)
+    agree = expected.ids == matrix.node_ids(rows)
+
+    return {
+        "chunks": chunks,
+        "dim": dim,
+        "top_k": top_k,
+        "matrix_build_ms": build_seconds * 1000,
+        "simple_vector_store_ms_per_query": simple_seconds * 1000,
+        "matrix_search_ms_per_query": matrix_seconds * 1000,
+        "matrix_batch_ms_per_query": batch_seconds * 1000,
+        "batch_size": batch,
+        "speedup": simple_seconds / matrix_seconds,
+        "results_match": agree,
+    }
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--chunks", type=int, default=50000)
+    parser.add_argument("--dim", type=int, default=768)
+    parser.add_argument("--top-k", type=int, default=3)
+    parser.add_argument("--queries", type=int, default=32)
+    parser.add_argument("--batch", type=int, default=16)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    result = run(args.chunks, args.dim, args.top_k, args.queries, args.batch, args.repeat, args.seed)
+    print(json.dumps(result, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,419 @@
+"""Reproducible end-to-end benchmark suite, without network or real models.
+
+Starts the fake Ollama server (``benchmarks.fake_ollama``), points the app at
+it and at a scratch working directory, writes a synthetic corpus
+(``benchmarks.corpus``) and runs the selected scenarios against the real
+``RAGService``:
+
+- ``index_build``: ``create_collection_index`` over the corpus (parse, chunk,
+  embed, persist, ANN and BM25 build).
+- ``load_cold``: ``load_collection_index`` plus the search structures after
+  dropping the collection from memory (the OS page cache may still be warm).
+- ``load_warm``: ``load_collection_index`` served from the index cache.
+- ``retrieval``: ``search_collection`` latency in vector, keyword and hybrid
+  mode, with hit rate of the queried chunk.
+- ``chat``: ``aquery_collections`` with N concurrent clients (response cache
+  off, so every request retrieves and generates).
+- ``upload``: ``POST /collections/{id}/documents`` throughput.
+
+The results, together with the parameters, git commit and machine, are
+written as one JSON document; ``--compare`` prints the relative change of
+every number against an earlier run. Pass ``--workdir`` to keep the corpus
+and the index between runs.
+
+Usage (from the ``backend`` directory)::
+
+    python -m benchmarks.bench_suite --size 1k --output results-1k.json
+    python -m benchmarks.bench_suite --size 100k --workdir /tmp/docuchat-bench \\
+        --scenarios index_build retrieval chat --clients 1 8 32 --compare results-1k.json
+"""
+
+import argparse
+import asyncio
+import datetime
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Any, Dict, List, Sequence
+
+import numpy as np
+
+from benchmarks.corpus import SIZES, chunk_code, chunk_texts, make_queries, write_corpus
+from benchmarks.fake_ollama import serve
+
+SCENARIOS = ("index_build", "load_cold", "load_warm", "retrieval", "chat", "upload")
+COLLECTION = "bench"
+UPLOAD_COLLECTION = "bench-upload"
+
+
+def latency_summary(samples: Sequence[float]) -> Dict[str, float]:
+    """Percentiles in milliseconds of latencies given in seconds."""
+    values = np.asarray(samples, dtype=np.float64) * 1000
+    return {
+        "count": len(values),
+        "mean_ms": float(values.mean()),
+        "p50_ms": float(np.percentile(values, 50)),
+        "p95_ms": float(np.percentile(values, 95)),
+        "p99_ms": float(np.percentile(values, 99)),
+        "max_ms": float(values.max()),
+    }
+
+
+def directory_bytes(path: str) -> int:
+    return sum(
+        os.path.getsize(os.path.join(root, name))
+        for root, _, names in os.walk(path)
+        for name in names
+    )
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True,
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return ""
+
+
+def configure(workdir: str, url: str) -> None:
+    """Point the app at the fake server and the scratch directory.
+
+    Must run before anything else under ``app`` is imported: the settings are
+    read once, and their relative paths resolve against the working directory.
+    Fields of ``Settings`` are set through the environment; the attributes the
+    services read that ``Settings`` does not declare (``OLLAMA_BASE_URL``,
+    ``INDEX_STORAGE_PATH``...) cannot be, so they are set on the instance.
+    """
+    os.makedirs(workdir, exist_ok=True)
+    os.chdir(workdir)
+    os.environ.update(
+        ollama_base_url=url,
+        default_model="bench-llm",
+        vector_store_path=os.path.join(workdir, "vector_store"),
+        embedding_cache_path=os.path.join(workdir, "embedding_cache.sqlite3"),
+        recent_collections_path=os.path.join(workdir, "recent_collections.json"),
+        upload_path=os.path.join(workdir, "uploads"),
+        warmup_enabled="false",
+        response_cache_enabled="false",
+        embedding_cache_enabled="false",
+    )
+
+    from app.core.config import settings
+
+    overrides = {
+        "OLLAMA_BASE_URL": url,
+        "DEFAULT_LLM_MODEL": "bench-llm",
+        "DEFAULT_EMBED_MODEL": "bench-embed",
+        "DOCUMENTS_PATH": os.path.join(workdir, "documents"),
+        "INDEX_STORAGE_PATH": os.path.join(workdir, "indexes"),
+    }
+    for name, value in overrides.items():
+        # Bypass validation: these are not declared fields
+        object.__setattr__(settings, name, value)
+
+
+class Suite:
+    def __init__(self, args: argparse.Namespace):
+        # Imported here, after configure()
+        from app.core.config import settings
+        from app.services.rag_service import rag_service
+
+        self.args = args
+        self.settings = settings
+        self.rag = rag_service
+        self.queries = make_queries(args.queries, args.chunks, words_per_chunk=args.words_per_chunk, seed=args.seed)
+        self.documents_path = os.path.join(settings.DOCUMENTS_PATH, COLLECTION)
+
+    def ensure_index(self) -> None:
+        if not self.rag.is_collection_indexed(COLLECTION) and not self.index_build()["ok"]:
+            raise RuntimeError("Building the benchmark index failed; see the log above")
+
+    # ------------------------------------------------------------------ #
+    # Scenarios
+    # ------------------------------------------------------------------ #
+
+    def index_build(self) -> Dict[str, Any]:
+        from app.services import index_versions
+
+        args = self.args
+        start = time.perf_counter()
+        paths = write_corpus(
+            self.documents_path, args.chunks, args.chunks_per_file, args.words_per_chunk, args.seed
+        )
+        corpus_seconds = time.perf_counter() - start
+
+        start = time.perf_counter()
+        ok = self.rag.create_collection_index(COLLECTION, self.documents_path, incremental=False)
+        seconds = time.perf_counter() - start
+
+        index = self.rag.load_collection_index(COLLECTION)
+        nodes = len(index.docstore.docs) if index is not None else 0
+        return {
+            "ok": ok,
+            "files": len(paths),
+            "corpus_bytes": sum(os.path.getsize(path) for path in paths),
+            "corpus_seconds": corpus_seconds,
+            "nodes": nodes,
+            "seconds": seconds,
+            "nodes_per_sec": nodes / seconds if seconds else 0.0,
+            # Published version only; older ones may still be on disk
+            "index_bytes": directory_bytes(index_versions.resolve(
+                os.path.join(self.settings.INDEX_STORAGE_PATH, COLLECTION)
+            ) or ""),
+        }
+
+    def _load(self) -> None:
+        index = self.rag.load_collection_index(COLLECTION)
+        self.rag.get_collection_retriever(COLLECTION, index)
+        self.rag.get_keyword_retriever(COLLECTION, index)
+
+    def load_cold(self) -> Dict[str, Any]:
+        self.ensure_index()
+        samples = []
+        for _ in range(self.args.repeat):
+            self.rag.invalidate_collection(COLLECTION)
+            start = time.perf_counter()
+            self._load()
+            samples.append(time.perf_counter() - start)
+        return latency_summary(samples)
+
+    def load_warm(self) -> Dict[str, Any]:
+        self.ensure_index()
+        self._load()
+        samples = []
+        for _ in range(self.args.repeat * 10):
+            start = time.perf_counter()
+            self._load()
+            samples.append(time.perf_counter() - start)
+        return latency_summary(samples)
+
+    def retrieval(self) -> Dict[str, Any]:
+        self.ensure_index()
+        self._load()
+        results = {}
+        for mode in ("vector", "keyword", "hybrid"):
+            samples, hits = [], 0
+            start = time.perf_counter()
+            for query, chunk in self.queries:
+                query_start = time.perf_counter()
+                found = self.rag.search_collection(COLLECTION, query, self.args.top_k, mode)
+                samples.append(time.perf_counter() - query_start)
+                # Deterministic embeddings carry no meaning; only keyword modes can find the chunk
+                hits += any(chunk_code(chunk) in source["text"] for source in found["sources"])
+            elapsed = time.perf_counter() - start
+            results[mode] = dict(
+                latency_summary(samples),
+                queries_per_sec=len(samples) / elapsed,
+                hit_rate=hits / len(samples),
+                effective_mode=found["mode"],
+            )
+        return results
+
+    def chat(self) -> Dict[str, Any]:
+        self.ensure_index()
+        self._load()
+        return asyncio.run(self._chat())
+
+    async def _chat(self) -> Dict[str, Any]:
+        from app.services.concurrency import QueueFullError
+        from app.services.ollama_pool import close_async_client
+
+        async def client(number: int, latencies: List[float], errors: List[str]) -> None:
+            for i in range(self.args.queries_per_client):
+                query, _ = self.queries[(number * self.args.queries_per_client + i) % len(self.queries)]
+                start = time.perf_counter()
+                try:
+                    answer = await self.rag.aquery_collections([COLLECTION], query, self.args.top_k)
+                except QueueFullError:
+                    errors.append("queue_full")
+                    continue
+                if answer.startswith("Erro"):
+                    errors.append(answer)
+                    continue
+                latencies.append(time.perf_counter() - start)
+
+        results = {}
+        try:
+            for clients in self.args.clients:
+                latencies, errors = [], []
+                start = time.perf_counter()
+                await asyncio.gather(*(client(number, latencies, errors) for number in range(clients)))
+                elapsed = time.perf_counter() - start
+                results[f"{clients}_clients"] = dict(
+                    latency_summary(latencies) if latencies else {"count": 0},
+                    answers_per_sec=len(latencies) / elapsed,
+                    errors=len(errors),
+                    first_error=errors[0] if errors else None,
+                )
+        finally:
+            await close_async_client()
+        return results
+
+    def upload(self) -> Dict[str, Any]:
+        from fastapi import FastAPI
+        from fastapi.testclient import TestClient
+        from app.api.collections import router
+        from app.models.database import Base, engine
+
+        Base.metadata.create_all(bind=engine)
+        app = FastAPI()
+        app.include_router(router)
+        client = TestClient(app)
+
+        # Start from an empty collection, also when the workdir is reused
+        for collection in client.get("/collections/").json():
+            if collection["name"] == UPLOAD_COLLECTION:
+                client.delete(f"/collections/{collection['id']}").raise_for_status()
+        response = client.post("/collections/", params={"name": UPLOAD_COLLECTION})
+        response.raise_for_status()
+        collection_id = response.json()["id"]
+
+        args = self.args
+        files = [text.encode("utf-8") for text in chunk_texts(args.upload_files, args.words_per_chunk, args.seed)]
+        samples = []
+        start = time.perf_counter()
+        for offset in range(0, len(files), args.upload_batch):
+            batch = files[offset:offset + args.upload_batch]
+            request_start = time.perf_counter()
+            response = client.post(
+                f"/collections/{collection_id}/documents",
+                files=[
+                    ("files", (f"upload_{offset + i:06d}.txt", data, "text/plain"))
+                    for i, data in enumerate(batch)
+                ],
+            )
+            response.raise_for_status()
+            samples.append(time.perf_counter() - request_start)
+        elapsed = time.perf_counter() - start
+
+        total_bytes = sum(len(data) for data in files)
+        return dict(
+            latency_summary(samples),
+            files=len(files),
+            files_per_request=args.upload_batch,
+            files_per_sec=len(files) / elapsed,
+            mb_per_sec=total_bytes / elapsed / 1e6,
+        )
+
+
+def flatten(data: Any, prefix: str = "") -> Dict[str, float]:
+    """Numeric leaves of nested dicts, keyed by dotted path."""
+    if isinstance(data, dict):
+        values = {}
+        for key, value in data.items():
+            values.update(flatten(value, f"{prefix}.{key}" if prefix else key))
+        return values
+    if isinstance(data, (int, float)) and not isinstance(data, bool):
+        return {prefix: float(data)}
+    return {}
+
+
+def compare(previous: Dict[str, Any], current: Dict[str, Any]) -> str:
+    """Table of every number present in both runs, with its relative change."""
+    old, new = flatten(previous["scenarios"]), flatten(current["scenarios"])
+    lines = [f"{'metric':60} {'before':>14} {'after':>14} {'change':>9}"]
+    for key in sorted(old.keys() & new.keys()):
+        change = f"{(new[key] - old[key]) / old[key] * 100:+8.1f}%" if old[key] else "      n/a"
+        lines.append(f"{key:60} {old[key]:14.4f} {new[key]:14.4f} {change}")
+    return "\n".join(lines)
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--scenarios", nargs="+", choices=SCENARIOS, default=list(SCENARIOS))
+    parser.add_argument("--size", choices=SIZES, default="1k", help="corpus size in chunks")
+    parser.add_argument("--chunks", type=int, help="corpus size in chunks (overrides --size)")
+    parser.add_argument("--chunks-per-file", type=int, default=100)
+    parser.add_argument("--words-per-chunk", type=int, default=600)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--workdir", help="keep corpus and index here (default: a temporary directory)")
+    parser.add_argument("--output", help="write the JSON results here (default: stdout)")
+    parser.add_argument("--compare", help="earlier results JSON to compare against")
+    parser.add_argument("--repeat", type=int, default=5, help="cold loads measured")
+    parser.add_argument("--queries", type=int, default=200, help="distinct queries")
+    parser.add_argument("--top-k", type=int, default=5)
+    parser.add_argument("--clients", type=int, nargs="+", default=[1, 4, 16], help="concurrent chat clients")
+    parser.add_argument("--queries-per-client", type=int, default=10)
+    parser.add_argument("--upload-files", type=int, default=200)
+    parser.add_argument("--upload-batch", type=int, default=20, help="files per upload request")
+    # Fake Ollama
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--request-latency", type=float, default=0.005)
+    parser.add_argument("--item-latency", type=float, default=0.0005)
+    parser.add_argument("--parallel", type=int, default=4)
+    parser.add_argument("--first-token-latency", type=float, default=0.05)
+    parser.add_argument("--token-latency", type=float, default=0.01)
+    parser.add_argument("--tokens", type=int, default=64)
+    args = parser.parse_args(argv)
+    args.chunks = args.chunks or SIZES[args.size]
+
+    output = os.path.abspath(args.output) if args.output else None
+    previous = None
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            previous = json.load(f)
+
+    server = serve(
+        dim=args.dim,
+        request_latency=args.request_latency,
+        item_latency=args.item_latency,
+        parallel=args.parallel,
+        first_token_latency=args.first_token_latency,
+        token_latency=args.token_latency,
+        tokens=args.tokens,
+        seed=args.seed,
+    )
+    temporary = None
+    workdir = args.workdir
+    if workdir is None:
+        temporary = tempfile.TemporaryDirectory(prefix="docuchat-bench-")
+        workdir = temporary.name
+    configure(os.path.abspath(workdir), server.url)
+
+    suite = Suite(args)
+    started_at = datetime.datetime.now(datetime.timezone.utc).isoformat()
+    scenarios = {}
+    for name in SCENARIOS:
+        if name in args.scenarios:
+            print(f"running {name}...", file=sys.stderr)
+            scenarios[name] = getattr(suite, name)()
+    server.shutdown()
+
+    results = {
+        "suite": "docuchat",
+        "started_at": started_at,
+        "git_commit": git_commit(),
+        "machine": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+        },
+        "parameters": {
+            key: value for key, value in vars(args).items()
+            if key not in ("workdir", "output", "compare")
+        },
+        "scenarios": scenarios,
+    }
+
+    text = json.dumps(results, indent=2)
+    if output:
+        with open(output, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+    if previous is not None:
+        print(compare(previous, results), file=sys.stderr)
+
+    if temporary is not None:
+        os.chdir("/")
+        temporary.cleanup()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+"""Deterministic synthetic corpora for the benchmark suite.
+
+Chunk text is drawn from a fixed pseudo-word vocabulary with a Zipf
+distribution, like natural language, so BM25 and the embeddings see a
+realistic mix of frequent and rare terms. Every chunk also carries a unique
+code (``KB-0000042``), which gives keyword queries a single right answer.
+Each chunk is generated from its own seed, so any chunk (and a query about
+it) can be rebuilt without generating the corpus again.
+
+Paragraphs are sized to roughly one node of the default sentence splitter
+(1024 tokens), so a corpus of N chunks indexes to about N nodes; the exact
+node count is reported by the index build.
+"""
+
+import json
+import os
+from functools import lru_cache
+from typing import Iterator, List, Tuple
+
+import numpy as np
+
+SIZES = {"1k": 1_000, "100k": 100_000, "1m": 1_000_000}
+
+SYLLABLES = (
+    "ba be bi bo bu da de di do du fa fe fi fo fu ga ge gi go gu la le li lo lu "
+    "ma me mi mo mu na ne ni no nu pa pe pi po pu ra re ri ro ru sa se si so su "
+    "ta te ti to tu va ve vi vo vu"
+).split()
+
+# Suffix of the parameters file written next to (not inside) the corpus
+# directory, which is indexed as is; a matching one means the corpus can be reused
+CORPUS_SUFFIX = ".corpus.json"
+
+
+@lru_cache(maxsize=4)
+def vocabulary(size: int = 20000, seed: int = 0) -> Tuple[str, ...]:
+    """Distinct pseudo-words of two to four syllables; index 0 is the most frequent."""
+    rng = np.random.default_rng(seed)
+    words = dict.fromkeys(
+        "".join(rng.choice(SYLLABLES, size=rng.integers(2, 5)))
+        for _ in range(size * 2)
+    )
+    return tuple(list(words)[:size])
+
+
+def chunk_code(index: int) -> str:
+    return f"KB-{index:07d}"
+
+
+def chunk_words(index: int, words_per_chunk: int = 600, seed: int = 0) -> List[str]:
+    """Words of chunk ``index``, including its unique code."""
+    vocab = vocabulary(seed=seed)
+    rng = np.random.default_rng([seed, index])
+    ranks = np.minimum(rng.zipf(1.2, size=words_per_chunk), len(vocab)) - 1
+    words = [vocab[rank] for rank in ranks]
+    words[int(rng.integers(0, len(words)))] = chunk_code(index)
+    return words
+
+
+def chunk_text(index: int, words_per_chunk: int = 600, seed: int = 0) -> str:
+    words = chunk_words(index, words_per_chunk, seed)
+    # Sentences of 15 words give the splitter natural boundaries
+    sentences = (" ".join(words[i:i + 15]) for i in range(0, len(words), 15))
+    return ". ".join(sentence[:1].upper() + sentence[1:] for sentence in sentences) + "."
+
+
+def chunk_texts(count: int, words_per_chunk: int = 600, seed: int = 0, start: int = 0) -> Iterator[str]:
+    for index in range(start, start + count):
+        yield chunk_text(index, words_per_chunk, seed)
+
+
+def write_corpus(
+    directory: str,
+    chunks: int,
+    chunks_per_file: int = 100,
+    words_per_chunk: int = 600,
+    seed: int = 0,
+) -> List[str]:
+    """Write ``chunks`` paragraphs as text files; reuses an identical existing corpus."""
+    parameters = {
+        "chunks": chunks,
+        "chunks_per_file": chunks_per_file,
+        "words_per_chunk": words_per_chunk,
+        "seed": seed,
+    }
+    files = (chunks + chunks_per_file - 1) // chunks_per_file
+    paths = [os.path.join(directory, f"corpus_{number:06d}.txt") for number in range(files)]
+
+    marker = os.path.normpath(directory) + CORPUS_SUFFIX
+    try:
+        with open(marker, "r", encoding="utf-8") as f:
+            if json.load(f) == parameters and all(os.path.exists(path) for path in paths):
+                return paths
+    except (FileNotFoundError, ValueError):
+        pass
+
+    os.makedirs(directory, exist_ok=True)
+    for entry in os.scandir(directory):
+        if entry.name.startswith("corpus_") and entry.is_file():
+            os.remove(entry.path)
+    for number, path in enumerate(paths):
+        start = number * chunks_per_file
+        count = min(chunks_per_file, chunks - start)
+        with open(path, "w", encoding="utf-8") as f:
+            # Three newlines: the sentence splitter's paragraph separator
+            f.write("\n\n\n".join(chunk_texts(count, words_per_chunk, seed, start)))
+
+    with open(marker, "w", encoding="utf-8") as f:
+        json.dump(parameters, f)
+    return paths
+
+
+def make_queries(
+    count: int,
+    chunks: int,
+    words: int = 6,
+    words_per_chunk: int = 600,
+    seed: int = 0,
+) -> List[Tuple[str, int]]:
+    """``(query, chunk index)`` pairs: a few words of a random chunk plus its code."""
+    rng = np.random.default_rng([seed, chunks, count])
+    queries = []
+    for index in rng.integers(0, chunks, size=count):
+        index = int(index)
+        text_words = chunk_words(index, words_per_chunk, seed)
+        picked = rng.choice(len(text_words), size=min(words, len(text_words)), replace=False)
+        queries.append((" ".join([text_words[i] for i in sorted(picked)] + [chunk_code(index)]), index))
+    return queries
@@ -0,0 +1,225 @@
+"""Local stand-in for the Ollama HTTP API.
+
+Serves ``/api/embed`` (batched) and ``/api/embeddings`` (one text) with
+deterministic pseudo-random embeddings, so embedding clients can be exercised
+and benchmarked without a model. Latency is simulated per request and per
+item, the number of requests processed at once is capped like Ollama's
+``OLLAMA_NUM_PARALLEL``, and a fraction of requests can fail with 503 to
+exercise retries.
+
+``/api/chat`` and ``/api/generate`` answer with deterministic text derived
+from the prompt, streamed or not, after ``first_token_latency`` and then
+``token_latency`` per token, and report token counts and durations like
+Ollama does in the final chunk.
+
+Usage (from the ``backend`` directory)::
+
+    python -m benchmarks.fake_ollama --port 11435 --request-latency 0.02
+"""
+
+import argparse
+import json
+import threading
+import time
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import List, Tuple
+
+import numpy as np
+
+WORDS = (
+    "the index answer document collection query model token vector chunk "
+    "server latency result context source search embedding cache request"
+).split()
+
+
+class FakeOllamaServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(
+        self,
+        address: Tuple[str, int],
+        dim: int = 384,
+        request_latency: float = 0.02,
+        item_latency: float = 0.001,
+        parallel: int = 4,
+        failure_rate: float = 0.0,
+        seed: int = 0,
+        first_token_latency: float = 0.05,
+        token_latency: float = 0.01,
+        tokens: int = 64,
+    ):
+        super().__init__(address, FakeOllamaHandler)
+        self.dim = dim
+        self.request_latency = request_latency
+        self.item_latency = item_latency
+        self.slots = threading.Semaphore(parallel)
+        # The LLM and the embedding model are separate models in Ollama
+        self.generate_slots = threading.Semaphore(parallel)
+        self.first_token_latency = first_token_latency
+        self.token_latency = token_latency
+        self.tokens = tokens
+        self.failure_rate = failure_rate
+        self.rng = np.random.default_rng(seed)
+        self.rng_lock = threading.Lock()
+        self.requests = 0
+
+    @property
+    def url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def embed(self, texts: List[str]) -> List[List[float]]:
+        """Deterministic unit vectors keyed by the text's CRC32."""
+        embeddings = []
+        for text in texts:
+            vector = np.random.default_rng(zlib.crc32(text.encode("utf-8"))).standard_normal(self.dim)
+            embeddings.append((vector / np.linalg.norm(vector)).tolist())
+        return embeddings
+
+    def answer(self, prompt: str) -> List[str]:
+        """Deterministic answer tokens for a prompt."""
+        rng = np.random.default_rng(zlib.crc32(prompt.encode("utf-8")))
+        return [f"{WORDS[i]} " for i in rng.integers(0, len(WORDS), size=self.tokens)]
+
+    def should_fail(self) -> bool:
+        with self.rng_lock:
+            self.requests += 1
+            return bool(self.failure_rate) and self.rng.random() < self.failure_rate
+
+
+class FakeOllamaHandler(BaseHTTPRequestHandler):
+    server: FakeOllamaServer
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, status: int, body: dict) -> None:
+        data = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        payload = json.loads(self.rfile.read(length) or b"{}")
+
+        if self.path in ("/api/chat", "/api/generate"):
+            self._generate(payload)
+            return
+
+        if self.path == "/api/embed":
+            texts = payload.get("input", [])
+            if isinstance(texts, str):
+                texts = [texts]
+        elif self.path == "/api/embeddings":
+            texts = [payload.get("prompt", "")]
+        else:
+            self._send_json(404, {"error": "not found"})
+            return
+
+        if self.server.should_fail():
+            self._send_json(503, {"error": "server busy"})
+            return
+
+        with self.server.slots:
+            time.sleep(self.server.request_latency + self.server.item_latency * len(texts))
+            embeddings = self.server.embed(texts)
+
+        if self.path == "/api/embed":
+            self._send_json(200, {"model": payload.get("model"), "embeddings": embeddings})
+        else:
+            self._send_json(200, {"embedding": embeddings[0]})
+
+    def _generate(self, payload: dict) -> None:
+        if self.path == "/api/chat":
+            prompt = "\n".join(message.get("content") or "" for message in payload.get("messages", []))
+        else:
+            prompt = payload.get("prompt", "")
+
+        if self.server.should_fail():
+            self._send_json(503, {"error": "server busy"})
+            return
+
+        # An empty prompt only loads the model (warm-up)
+        tokens = self.server.answer(prompt) if prompt else []
+        stream = payload.get("stream", True)
+        with self.server.generate_slots:
+            started = time.perf_counter()
+            time.sleep(self.server.first_token_latency)
+            if stream:
+                self.send_response(200)
+                self.send_header("Content-Type", "application/x-ndjson")
+                self.end_headers()
+                for token in tokens:
+                    self._write_line(self._chunk(payload, token, done=False))
+                    time.sleep(self.server.token_latency)
+            else:
+                time.sleep(self.server.token_latency * len(tokens))
+            elapsed_ns = int((time.perf_counter() - started) * 1e9)
+
+        final = self._chunk(payload, "" if stream else "".join(tokens), done=True)
+        final.update(
+            total_duration=elapsed_ns,
+            prompt_eval_count=len(prompt.split()),
+            eval_count=len(tokens),
+            eval_duration=max(1, int(self.server.token_latency * len(tokens) * 1e9)),
+        )
+        if stream:
+            self._write_line(final)
+        else:
+            self._send_json(200, final)
+
+    def _chunk(self, payload: dict, text: str, done: bool) -> dict:
+        chunk = {"model": payload.get("model"), "created_at": time.strftime("%Y-%m-%dT%H:%M:%SZ"), "done": done}
+        if self.path == "/api/chat":
+            chunk["message"] = {"role": "assistant", "content": text}
+        else:
+            chunk["response"] = text
+        return chunk
+
+    def _write_line(self, body: dict) -> None:
+        self.wfile.write(json.dumps(body).encode("utf-8") + b"\n")
+        self.wfile.flush()
+
+
+def serve(host: str = "127.0.0.1", port: int = 0, **options) -> FakeOllamaServer:
+    """Start a server on a background thread; ``port=0`` picks a free port."""
+    server = FakeOllamaServer((host, port), **options)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=11435)
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--request-latency", type=float, default=0.02, help="seconds per request")
+    parser.add_argument("--item-latency", type=float, default=0.001, help="seconds per embedded text")
+    parser.add_argument("--parallel", type=int, default=4, help="requests processed at once")
+    parser.add_argument("--failure-rate", type=float, default=0.0)
+    parser.add_argument("--first-token-latency", type=float, default=0.05, help="seconds before the first token")
+    parser.add_argument("--token-latency", type=float, default=0.01, help="seconds per generated token")
+    parser.add_argument("--tokens", type=int, default=64, help="tokens per answer")
+    args = parser.parse_args(argv)
+
+    server = FakeOllamaServer(
+        (args.host, args.port),
+        dim=args.dim,
+        request_latency=args.request_latency,
+        item_latency=args.item_latency,
+        parallel=args.parallel,
+        failure_rate=args.failure_rate,
+        first_token_latency=args.first_token_latency,
+        token_latency=args.token_latency,
+        tokens=args.tokens,
+    )
+    print(f"Fake Ollama listening on {server.url}")
+    server.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
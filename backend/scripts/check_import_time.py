@@ -0,0 +1,97 @@
+"""Check that importing the API stays fast and free of heavy dependencies.
+
+Imports ``app.main`` in a fresh interpreter (as a web worker does on boot)
+and fails if it takes longer than the budget or if it imports any module
+that must stay deferred until first use (LlamaIndex, torch, transformers).
+The slowest imports are listed to help find the culprit. Meant to run in CI
+next to the test suite.
+
+The probe runs in a scratch directory, so the SQLite database and data
+folders that importing ``app.main`` creates in the working directory do not
+land in the checkout.
+
+Usage (from the ``backend`` directory)::
+
+    python -m scripts.check_import_time
+    python -m scripts.check_import_time --budget 0.5 --module app.main
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+DEFERRED_PREFIXES = ("llama_index", "torch", "transformers", "sentence_transformers")
+
+PROBE = """
+import json, sys, time
+start = time.perf_counter()
+import {module}
+seconds = time.perf_counter() - start
+print(json.dumps({{"seconds": seconds, "modules": sorted(sys.modules)}}))
+"""
+
+
+def slowest_imports(stderr: str, count: int):
+    """Parse ``-X importtime`` output into the ``count`` largest cumulative times."""
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        fields = line[len("import time:"):].split("|")
+        # Skip the header line ("self [us] | cumulative | imported package")
+        if len(fields) != 3 or not fields[1].strip().isdigit():
+            continue
+        rows.append((int(fields[1]), fields[2].strip()))
+    return sorted(rows, reverse=True)[:count]
+
+
+def check(module: str, budget: float, top: int) -> bool:
+    env = dict(os.environ)
+    env["PYTHONPATH"] = os.pathsep.join(filter(None, [os.getcwd(), env.get("PYTHONPATH")]))
+    with tempfile.TemporaryDirectory() as workdir:
+        result = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", PROBE.format(module=module)],
+            capture_output=True,
+            text=True,
+            cwd=workdir,
+            env=env,
+        )
+    if result.returncode != 0:
+        print(result.stderr[-4000:], file=sys.stderr)
+        print(f"FAIL: importing {module} raised an error", file=sys.stderr)
+        return False
+
+    report = json.loads(result.stdout.strip().splitlines()[-1])
+    deferred = sorted({
+        name.split(".")[0] for name in report["modules"]
+        if name.startswith(DEFERRED_PREFIXES)
+    })
+
+    print(f"import {module}: {report['seconds']:.3f}s (budget {budget:.3f}s)")
+    for cumulative_us, name in slowest_imports(result.stderr, top):
+        print(f"  {cumulative_us / 1e6:8.3f}s  {name}")
+
+    ok = True
+    if report["seconds"] > budget:
+        print(f"FAIL: import took longer than {budget:.3f}s", file=sys.stderr)
+        ok = False
+    if deferred:
+        print(f"FAIL: imported at startup, should be deferred: {', '.join(deferred)}", file=sys.stderr)
+        ok = False
+    return ok
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--module", default="app.main")
+    parser.add_argument("--budget", type=float, default=1.0, help="seconds")
+    parser.add_argument("--top", type=int, default=10, help="slowest imports to list")
+    args = parser.parse_args(argv)
+    sys.exit(0 if check(args.module, args.budget, args.top) else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+"""Convert persisted collection indexes to the memory-mapped vector store.
+
+Reads the ``default__vector_store.json`` written by SimpleVectorStore in the
+published version of each ``INDEX_STORAGE_PATH/<collection>`` index and writes the binary
+``vectors.*`` files of MmapVectorStore next to it. With ``--docstore`` the
+``docstore.json`` is also converted to the ``nodes.*`` files of
+MmapDocumentStore. Keys and values are copied as they are, so node ids keep
+matching.
+
+Usage (from the ``backend`` directory)::
+
+    python -m scripts.migrate_vector_store --all --docstore
+    python -m scripts.migrate_vector_store manuals policies --dtype float16
+"""
+
+import argparse
+import json
+import os
+import sys
+
+import numpy as np
+
+from app.core.config import settings
+from app.services import index_versions
+from app.services.node_store import MmapDocumentStore, MmapKVStore
+from app.services.vector_store import MmapVectorStore
+
+LEGACY_FILENAME = "default__vector_store.json"
+DOCSTORE_FILENAME = "docstore.json"
+
+
+def migrate_collection(storage_path: str, dtype: str, keep_json: bool) -> int:
+    """Migrate one storage directory; returns the number of vectors written."""
+    legacy_path = os.path.join(storage_path, LEGACY_FILENAME)
+    with open(legacy_path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+
+    embedding_dict = data.get("embedding_dict", {})
+    ref_doc_ids = data.get("text_id_to_ref_doc_id", {})
+    node_ids = list(embedding_dict)
+
+    store = MmapVectorStore(dtype=dtype)
+    if node_ids:
+        store.add_embeddings(
+            node_ids,
+            [ref_doc_ids.get(node_id) for node_id in node_ids],
+            np.asarray([embedding_dict[node_id] for node_id in node_ids], dtype=np.float32),
+        )
+    store.persist(legacy_path)
+
+    if not keep_json:
+        os.remove(legacy_path)
+    return len(node_ids)
+
+
+def migrate_docstore(storage_path: str, keep_json: bool) -> int:
+    """Convert one docstore.json to the mmap node store; returns the number of nodes."""
+    docstore_path = os.path.join(storage_path, DOCSTORE_FILENAME)
+    with open(docstore_path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+
+    kvstore = MmapKVStore()
+    for collection, values in data.items():
+        for key, value in values.items():
+            kvstore.put(key, value, collection)
+    kvstore.persist(docstore_path)
+
+    if not keep_json:
+        os.remove(docstore_path)
+    return len(data.get("docstore/data", {}))
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("collections", nargs="*", help="collection names to migrate")
+    parser.add_argument("--all", action="store_true", help="migrate every collection")
+    parser.add_argument("--dtype", choices=["float32", "float16"], default=settings.vector_store_dtype)
+    parser.add_argument("--docstore", action="store_true", help="also convert the docstore to the mmap node store")
+    parser.add_argument("--keep-json", action="store_true", help="keep the JSON files that were converted")
+    args = parser.parse_args(argv)
+
+    if args.all:
+        names = sorted(os.listdir(settings.INDEX_STORAGE_PATH))
+    elif args.collections:
+        names = args.collections
+    else:
+        parser.error("pass collection names or --all")
+
+    failed = 0
+    for name in names:
+        storage_path = index_versions.resolve(os.path.join(settings.INDEX_STORAGE_PATH, name))
+        vectors = (
+            storage_path is not None
+            and os.path.exists(os.path.join(storage_path, LEGACY_FILENAME))
+            and not MmapVectorStore.exists(storage_path)
+        )
+        docstore = (
+            args.docstore
+            and storage_path is not None
+            and os.path.exists(os.path.join(storage_path, DOCSTORE_FILENAME))
+            and not MmapDocumentStore.exists(storage_path)
+        )
+        if not vectors and not docstore:
+            print(f"{name}: nada a migrar")
+            continue
+
+        try:
+            if vectors:
+                count = migrate_collection(storage_path, args.dtype, args.keep_json)
+                print(f"{name}: {count} vetores migrados ({args.dtype})")
+            if docstore:
+                count = migrate_docstore(storage_path, args.keep_json)
+                print(f"{name}: {count} nós migrados")
+        except Exception as e:
+            failed += 1
+            print(f"{name}: erro na migração: {e}")
+
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())